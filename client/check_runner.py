@@ -0,0 +1,58 @@
+"""Check the runner's cancel bookkeeping without a job server.
+
+A job cancelled while it is only queued must not stay marked as cancelled:
+if the server leases the same job id again later, the runner has to run it
+and report its status. Run from the client folder (runner.py reads
+config.json from the working directory):
+
+    python check_runner.py
+"""
+import sys
+
+sys.argv = [sys.argv[0]]  # runner.py parses the command line on import
+
+import runner  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, status_code, reply):
+        self.status_code = status_code
+        self.reply = reply
+        self.text = str(reply)
+
+    def json(self):
+        return self.reply
+
+
+def lease(job_id):
+    """Lease `job_id` through runner.lease_jobs with the server reply faked."""
+    runner.post_json = lambda url, payload, wait=0: FakeResponse(
+        200, {"jobs": [{"job_id": job_id, "parameters": {}}]})
+    runner.lease_jobs(1)
+
+
+def main():
+    reported = []
+    runner.update_status = lambda job_id, status, message, metrics=None: reported.append((job_id, status))
+    runner.run_command = [sys.executable, "-c", "pass"]
+    job_id = 7
+
+    lease(job_id)
+    runner.cancel_job(job_id)
+    assert not runner.job_queue, "cancelled job is still queued"
+    assert job_id not in runner.leased_jobs, "cancelled job is still leased"
+    assert job_id not in runner.cancelled_jobs, "queued job stays marked as cancelled"
+
+    # A stale mark from an earlier lease is cleared by the new one
+    runner.cancelled_jobs.add(job_id)
+    lease(job_id)
+    assert job_id not in runner.cancelled_jobs, "re-leased job is still marked as cancelled"
+
+    runner.run_job(runner.job_queue.popleft())
+    runner.release_job(job_id)
+    assert reported == [(job_id, "DONE")], f"re-leased job reported {reported}, expected DONE"
+    print("OK: a job cancelled while queued runs and reports DONE when leased again")
+
+
+if __name__ == "__main__":
+    main()
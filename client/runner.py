@@ -1,4 +1,5 @@
 import argparse
+import gzip
 import json
 import logging
 import os
@@ -9,8 +10,11 @@ import subprocess
 import sys
 import threading
 import time
+from collections import deque
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Check OS
 IS_WINDOWS = platform.system() == "Windows"
@@ -27,12 +31,21 @@ run_command = config["run_command"]  # list, e.g., ["python", "main.py"]
 machine_type = config["machine_type"]
 heartBitInterval = config["heartBitInterval"] - 0.3
 # seconds, added 300 ms to avoid exact timing issues which will tolerate network latency
+# extra jobs leased ahead of time so the next one starts as soon as the current exits
+# htc runs exactly one job per machine, so it never prefetches
+prefetch_jobs = config.get("prefetch_jobs", 0) if machine_type != "htc" else 0
+# seconds the server may hold a job request open until a job comes back (0: ask once and exit)
+long_poll_wait = config.get("long_poll_wait", 30)
 
 # --------------- Argument Parser ----------------
 parser = argparse.ArgumentParser()
 parser.add_argument("--process_id", type=int, default=0,
                     help="Give a process id for log tracking")
+parser.add_argument("--slots", type=int, default=1,
+                    help="Number of jobs this runner runs in parallel")
 args = parser.parse_args()
+# htc runs exactly one job per machine
+slots = max(1, args.slots) if machine_type != "htc" else 1
 
 # --------------- Logger Setup ----------------
 LOG_DIR = f"{expId}/logs"
@@ -44,7 +57,9 @@ log_path = os.path.join(LOG_DIR, f"runner_{runner_id}_{args.process_id}.log")
 
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s - %(levelname)s - %(message)s",
+    # With several slots, the thread name tells which slot logged a line
+    format="%(asctime)s - %(levelname)s - %(threadName)s - %(message)s" if slots > 1 else
+    "%(asctime)s - %(levelname)s - %(message)s",
     handlers=[
         logging.FileHandler(log_path),
         logging.StreamHandler()
@@ -60,25 +75,59 @@ else:
 
 REQUEST_JOB_URL = f"{base_url}/request_job"
 UPDATE_JOB_URL = f"{base_url}/update_job_status"
-PING_URL = f"{base_url}/ping"
-
-# Track the current child process
-current_proc = None
+PING_BATCH_URL = f"{base_url}/ping_batch"
+
+# A job may write its results here (inside --base_path) to report them with DONE
+METRICS_FILENAME = "metrics.json"
+# A job may keep a number between 0 and 1 here (inside --base_path) to report how far along it is
+PROGRESS_FILENAME = "progress.json"
+# Wait between requests while the server has no job yet but may add more (HTTP 503)
+NO_JOB_RETRY_WAIT = 30
+
+# Retries for requests that never reached the server (refused connections, 502/504 from the tunnel)
+HTTP_RETRIES = 5
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 60  # seconds, on top of the long-poll wait for /request_job
+# JSON bodies at least this large are sent gzip-compressed (e.g. status messages with stderr)
+COMPRESS_MIN_BYTES = 1024
+
+# Process of every running job, by job id
+running_procs = {}
+# Slots that have taken a job off the queue and not finished it yet
+busy_slots = 0
+# Set once no more jobs will be leased; slots exit when the queue is empty
+leasing_done = False
+
+# Jobs leased from the server but not started yet
+job_queue = deque()
+# Every job this runner holds a lease on (queued or running); kept alive by the heartbeat
+leased_jobs = set()
+leased_jobs_lock = threading.Lock()
+# Notified whenever jobs are queued, a slot frees up or leasing ends
+slots_changed = threading.Condition(leased_jobs_lock)
+# Jobs the server told us to stop because another copy of them finished first
+cancelled_jobs = set()
 
 # --------------- Cleanup Handler ----------------
 
 
-def cleanup(signum=None, frame=None):
-    global current_proc
-    if current_proc and current_proc.poll() is None:
-        logger.info(f"Terminating subprocess with PID {current_proc.pid}")
+def terminate_proc(proc):
+    if proc and proc.poll() is None:
+        logger.info(f"Terminating subprocess with PID {proc.pid}")
         try:
             if IS_WINDOWS:
-                current_proc.send_signal(signal.CTRL_BREAK_EVENT)
+                proc.send_signal(signal.CTRL_BREAK_EVENT)
             else:
-                os.killpg(os.getpgid(current_proc.pid), signal.SIGTERM)
+                os.killpg(os.getpgid(proc.pid), signal.SIGTERM)
         except Exception as e:
             logger.warning(f"Could not kill subprocess group: {e}")
+
+
+def cleanup(signum=None, frame=None):
+    with leased_jobs_lock:
+        procs = list(running_procs.values())
+    for proc in procs:
+        terminate_proc(proc)
     logger.info("Runner shutting down.")
     sys.exit(0)
 
@@ -86,33 +135,188 @@ def cleanup(signum=None, frame=None):
 signal.signal(signal.SIGINT, cleanup)
 signal.signal(signal.SIGTERM, cleanup)
 
+# --------------- HTTP Session ----------------
+
+
+def make_retry(status_retries):
+    """Retry connections that failed before the request was sent, with backoff.
+
+    With `status_retries`, also retry 502/504 replies from the tunnel, which
+    may have reached the server, so only for requests that are safe to repeat.
+    """
+    return Retry(total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0,
+                 status=HTTP_RETRIES if status_retries else 0,
+                 status_forcelist=(502, 504) if status_retries else (),
+                 allowed_methods=frozenset({"POST"}), backoff_factor=1, raise_on_status=False)
+
+
+def make_session():
+    """A keep-alive session that retries requests the server never received, with backoff."""
+    # One connection per slot reporting at once, plus the heartbeat request
+    adapter = HTTPAdapter(max_retries=make_retry(True), pool_connections=1, pool_maxsize=slots + 1)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    # Repeating a lease the server did receive would lease a second batch of jobs
+    session.mount(REQUEST_JOB_URL, HTTPAdapter(max_retries=make_retry(False),
+                                               pool_connections=1, pool_maxsize=1))
+    return session
+
+
+# Shared by the slots and the heartbeat thread, so all of them reuse open connections
+session = make_session()
+
+
+def post_json(url, payload, wait=0):
+    """POST `payload` as JSON over the shared session, gzipped if large."""
+    body = json.dumps(payload).encode("utf-8")
+    headers = {"Content-Type": "application/json"}
+    if len(body) >= COMPRESS_MIN_BYTES:
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return session.post(url, data=body, headers=headers,
+                        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT + wait))
+
 # --------------- Heartbeat Pinger ----------------
 
 
-def ping_job(job_id, stop_event):
+def read_progress(job_id):
+    """Load the fraction a job wrote to <base_path>/progress.json, if any."""
+    progress_path = os.path.join(job_base_path(job_id), PROGRESS_FILENAME)
+    try:
+        with open(progress_path, "r") as f:
+            progress = json.load(f)
+    except (OSError, ValueError):
+        return None  # not written yet, or caught mid-write
+    if isinstance(progress, bool) or not isinstance(progress, (int, float)):
+        return None
+    return min(max(float(progress), 0.0), 1.0)
+
+
+def ping_jobs(stop_event):
+    """Ping all leased jobs, including prefetched ones, in one request per interval."""
     while not stop_event.is_set():
-        try:
-            res = requests.post(PING_URL, json={"id": job_id})
-            if res.status_code == 200:
-                logger.info(f"Ping sent for job {job_id}")
-            else:
+        with leased_jobs_lock:
+            job_ids = sorted(leased_jobs)
+            running = list(running_procs)
+        if job_ids:
+            progress = {}
+            for job_id in running:
+                fraction = read_progress(job_id)
+                if fraction is not None:
+                    progress[str(job_id)] = fraction
+            try:
+                res = post_json(PING_BATCH_URL, {
+                                "requested_by": runner_id, "job_ids": job_ids, "progress": progress})
+                if res.status_code == 200:
+                    directives = res.json()["directives"]
+                    logger.info(f"Ping sent for jobs {job_ids}")
+                    for job_id in job_ids:
+                        directive = directives.get(str(job_id))
+                        if directive == "cancel":
+                            cancel_job(job_id)
+                        elif directive == "extend":
+                            logger.info(
+                                f"Lease of job {job_id} had expired and was renewed.")
+                else:
+                    logger.warning(
+                        f"Ping failed for jobs {job_ids}: HTTP {res.status_code} - {res.text}")
+            except Exception as e:
                 logger.warning(
-                    f"Ping failed for job {job_id}: HTTP {res.status_code} - {res.text}")
-        except Exception as e:
-            logger.warning(
-                f"Ping exception for job {job_id}: {type(e).__name__}: {e}")
-        time.sleep(heartBitInterval)
+                    f"Ping exception for jobs {job_ids}: {type(e).__name__}: {e}")
+        stop_event.wait(heartBitInterval)
+
+# --------------- Job Leasing ----------------
+
+
+def lease_jobs(count, wait=0):
+    """Lease up to `count` jobs in one request and queue them locally.
+
+    With `wait` > 0 the server holds the request open for up to that many
+    seconds until a job is available. Returns the HTTP status code of the
+    /request_job call and its JSON reply.
+    """
+    response = post_json(REQUEST_JOB_URL, {
+                         "requested_by": runner_id, "count": count, "wait": wait}, wait)
+    try:
+        reply = response.json()
+    except ValueError:
+        reply = {}
+    if response.status_code == 200:
+        jobs = reply["jobs"]
+        with slots_changed:
+            for job in jobs:
+                job_queue.append(job)
+                leased_jobs.add(job["job_id"])
+                cancelled_jobs.discard(job["job_id"])  # a new lease of a job cancelled earlier
+            slots_changed.notify_all()
+        logger.info(
+            f"Leased {len(jobs)} job(s): {[job['job_id'] for job in jobs]}")
+    elif response.status_code == 503:
+        logger.info("No job available yet; the server may add more.")
+    elif response.status_code != 404:
+        logger.error(
+            f"Failed to request job. Status: {response.status_code}, Msg: {response.text}")
+    return response.status_code, reply
+
+
+def release_job(job_id):
+    with leased_jobs_lock:
+        leased_jobs.discard(job_id)
+        cancelled_jobs.discard(job_id)
+
+
+def cancel_job(job_id):
+    """Stop a job that is no longer ours: finished by another runner, or handed to one."""
+    with leased_jobs_lock:
+        if job_id not in leased_jobs:
+            return  # already finished here
+        cancelled_jobs.add(job_id)
+        leased_jobs.discard(job_id)
+        queued = [job for job in job_queue if job["job_id"] == job_id]
+        for job in queued:
+            job_queue.remove(job)
+        if queued:
+            # It will never run, so release_job never clears the mark
+            cancelled_jobs.discard(job_id)
+        proc = running_procs.get(job_id)
+    if queued:
+        logger.info(f"Job {job_id} is no longer leased to us; dropped it from the queue.")
+    if proc:
+        logger.info(f"Job {job_id} is no longer leased to us; stopping it.")
+        terminate_proc(proc)
 
 # --------------- Job Status Update ----------------
 
 
-def update_status(job_id, status, message):
+def read_metrics(base_path):
+    """Load the metrics a job wrote to <base_path>/metrics.json, if any."""
+    metrics_path = os.path.join(base_path, METRICS_FILENAME)
+    if not os.path.exists(metrics_path):
+        return None
+    try:
+        with open(metrics_path, "r") as f:
+            metrics = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not read {metrics_path}: {type(e).__name__}: {e}")
+        return None
+    if not isinstance(metrics, dict):
+        logger.warning(f"Ignoring {metrics_path}: expected a JSON object")
+        return None
+    return metrics
+
+
+def update_status(job_id, status, message, metrics=None):
+    payload = {
+        "job_id": job_id,
+        "status": status,
+        "message": message,
+        "requested_by": runner_id
+    }
+    if metrics is not None:
+        payload["metrics"] = metrics
     try:
-        res = requests.post(UPDATE_JOB_URL, json={
-            "job_id": job_id,
-            "status": status,
-            "message": message
-        })
+        res = post_json(UPDATE_JOB_URL, payload)
         if res.status_code == 200:
             logger.info(
                 f"Job {job_id} status successfully updated to {status} on {runner_id}")
@@ -123,119 +327,212 @@ def update_status(job_id, status, message):
         logger.error(
             f"Error while updating job {job_id} status on {runner_id}: {type(e).__name__}: {e}")
 
-# --------------- Main Loop ----------------
+# --------------- Job Slots ----------------
 
 
-def main():
-    global current_proc
-    logger.info(f"Runner started as {runner_id}_{args.process_id}")
-    logger.info(f"Job Server URL: {job_server}:{port}")
-    logger.info(f"Heart bit interval set to {heartBitInterval} seconds")
+def job_base_path(job_id):
+    return os.path.join(os.path.expanduser("~"), "data", "raw", expId, str(job_id))
 
-    while True:
-        try:
-            logger.info("Requesting a new job...")
-            response = requests.post(REQUEST_JOB_URL, json={
-                                     "requested_by": runner_id})
 
-            if response.status_code == 404:
-                logger.info("No more jobs available. Runner exiting.")
-                break
+def run_job(job_info):
+    """Run one leased job to completion and report its status."""
+    job_id = job_info["job_id"]
+    params = job_info["parameters"]
 
-            if response.status_code != 200:
-                logger.error(
-                    f"Failed to request job. Status: {response.status_code}, Msg: {response.text}")
-                break
+    logger.info(
+        f"Job {job_id} assigned to {runner_id} with parameters: {params}")
 
-            logger.info("Job assigned successfully.")
-            # Parse job information
-            job_info = response.json()
-            job_id = job_info["job_id"]
-            params = job_info["parameters"]
+    # Build the command
+    cmd = list(run_command)
+    for key, value in params.items():
+        cmd.extend([f"--{key}", str(value)])
 
-            logger.info(
-                f"Job {job_id} assigned to {runner_id} with parameters: {params}")
+    base_path = job_base_path(job_id)
+    cmd.extend(["--base_path", base_path])
+    try:
+        os.remove(os.path.join(base_path, PROGRESS_FILENAME))  # left over from an earlier attempt
+    except OSError:
+        pass
+    logger.info(f"Executing command on {runner_id}: {' '.join(cmd)}")
+
+    # Run subprocess
+
+    if IS_WINDOWS:
+        proc = subprocess.Popen(cmd, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                text=True)
+    else:
+        proc = subprocess.Popen(cmd, preexec_fn=os.setsid,
+                                stdout=subprocess.PIPE,
+                                stderr=subprocess.PIPE,
+                                text=True)
+    with leased_jobs_lock:
+        if job_id in cancelled_jobs:  # cancelled between leaving the queue and starting
+            terminate_proc(proc)
+        running_procs[job_id] = proc
 
-            # Build the command
-            cmd = list(run_command)
-            for key, value in params.items():
-                cmd.extend([f"--{key}", str(value)])
+    try:
+        stdout, stderr = proc.communicate()
+    finally:
+        with leased_jobs_lock:
+            running_procs.pop(job_id, None)
+
+    if job_id in cancelled_jobs:
+        logger.info(f"Job {job_id} stopped: it is no longer leased to {runner_id}.")
+    elif proc.returncode == 0:
+        logger.info(f"Job {job_id} completed successfully.")
+        completion_message = f"Job execution completed successfully on {runner_id}."
+        update_status(job_id, "DONE", completion_message,
+                      read_metrics(base_path))
+    else:
+        # Log the full output for debugging
+        logger.error(
+            f"Job {job_id} failed with return code {proc.returncode}")
+        logger.error(f"STDOUT:\n{stdout}")
+        logger.error(f"STDERR:\n{stderr}")
+
+        # Create a cleaner error message for status update
+        error_message = f"Job execution failed on {runner_id}. Process exited with return code {proc.returncode}."
+
+        # Add specific error handling based on return code
+        if proc.returncode == -9:
+            error_message += " Process was killed (likely due to memory/time limits)."
+        elif proc.returncode == -1:
+            error_message += " Process was terminated by signal."
+        elif proc.returncode > 0:
+            error_message += f" Process exited with error code {proc.returncode}."
+
+        # Only add stderr if it contains actual error messages (not just INFO logs)
+        if stderr.strip() and any(keyword in stderr.lower() for keyword in ['error', 'exception', 'failed', 'fatal']):
+            error_message += f" Error details: {stderr}"
+        elif stdout.strip() and any(keyword in stdout.lower() for keyword in ['error', 'exception', 'failed', 'fatal']):
+            error_message += f" Error details: {stdout}"
+        else:
+            error_message += " Check logs for detailed output."
 
-            base_path = os.path.join(os.path.expanduser(
-                "~"), "data", "raw", expId, str(job_id))
-            cmd.extend(["--base_path", base_path])
-            logger.info(f"Executing command on {runner_id}: {' '.join(cmd)}")
+        update_status(job_id, "ABORTED", error_message)
 
-            # Start heartbeat thread
-            stop_event = threading.Event()
-            pinger_thread = threading.Thread(
-                target=ping_job, args=(job_id, stop_event))
-            pinger_thread.start()
 
-            # Run subprocess
+def stop_leasing():
+    """Lease no more jobs; slots finish the queued ones and exit."""
+    global leasing_done
+    with slots_changed:
+        leasing_done = True
+        slots_changed.notify_all()
 
-            if IS_WINDOWS:
-                current_proc = subprocess.Popen(cmd, creationflags=subprocess.CREATE_NEW_PROCESS_GROUP,
-                                                stdout=subprocess.PIPE,
-                                                stderr=subprocess.PIPE,
-                                                text=True)
-            else:
-                current_proc = subprocess.Popen(cmd, preexec_fn=os.setsid,
-                                                stdout=subprocess.PIPE,
-                                                stderr=subprocess.PIPE,
-                                                text=True)
 
-            stdout, stderr = current_proc.communicate()
+def run_slot():
+    """Take jobs off the shared queue and run them one at a time until leasing is done."""
+    global busy_slots
+    while True:
+        with slots_changed:
+            while not job_queue and not leasing_done:
+                slots_changed.wait()
+            if not job_queue:
+                return
+            job_info = job_queue.popleft()
+            busy_slots += 1
+            slots_changed.notify_all()  # the dispatcher may top up the prefetch queue
+
+        job_id = job_info["job_id"]
+        try:
+            run_job(job_info)
+        except Exception as e:
+            logger.exception(f"Unexpected error occurred: {str(e)}")
+            exception_message = f"Unexpected exception occurred on {runner_id} while processing job. Exception: {str(e)}"
+            update_status(job_id, "ABORTED", exception_message)
+            stop_leasing()
+        finally:
+            release_job(job_id)
+            with slots_changed:
+                busy_slots -= 1
+                slots_changed.notify_all()
 
-            # Stop heartbeat
-            stop_event.set()
-            pinger_thread.join()
+# --------------- Main Loop ----------------
 
-            if current_proc.returncode == 0:
-                logger.info(f"Job {job_id} completed successfully.")
-                completion_message = f"Job execution completed successfully on {runner_id}."
-                update_status(job_id, "DONE", completion_message)
-            else:
-                # Log the full output for debugging
-                logger.error(
-                    f"Job {job_id} failed with return code {current_proc.returncode}")
-                logger.error(f"STDOUT:\n{stdout}")
-                logger.error(f"STDERR:\n{stderr}")
-
-                # Create a cleaner error message for status update
-                error_message = f"Job execution failed on {runner_id}. Process exited with return code {current_proc.returncode}."
-
-                # Add specific error handling based on return code
-                if current_proc.returncode == -9:
-                    error_message += " Process was killed (likely due to memory/time limits)."
-                elif current_proc.returncode == -1:
-                    error_message += " Process was terminated by signal."
-                elif current_proc.returncode > 0:
-                    error_message += f" Process exited with error code {current_proc.returncode}."
-
-                # Only add stderr if it contains actual error messages (not just INFO logs)
-                if stderr.strip() and any(keyword in stderr.lower() for keyword in ['error', 'exception', 'failed', 'fatal']):
-                    error_message += f" Error details: {stderr}"
-                elif stdout.strip() and any(keyword in stdout.lower() for keyword in ['error', 'exception', 'failed', 'fatal']):
-                    error_message += f" Error details: {stdout}"
-                else:
-                    error_message += " Check logs for detailed output."
 
-                update_status(job_id, "ABORTED", error_message)
+def dispatch():
+    """Lease jobs for idle slots (plus prefetch) until the server has none left.
 
-            current_proc = None
-            time.sleep(5)  # Wait before next job request
+    Only a request for a slot with nothing queued waits on the server; a
+    prefetch top-up that finds nothing waits for a slot to free up instead.
+    """
+    prefetch_exhausted = False
+    while True:
+        with slots_changed:
+            while True:
+                if leasing_done:
+                    return
+                idle = slots - busy_slots
+                wanted = idle + prefetch_jobs * slots - len(job_queue)
+                starving = idle > len(job_queue)
+                if starving or (wanted > 0 and not prefetch_exhausted):
+                    break
+                slots_changed.wait()
+                prefetch_exhausted = False
 
+        try:
+            if starving:
+                logger.info("Requesting a new job...")
+            status_code, reply = lease_jobs(wanted, long_poll_wait if starving else 0)
         except Exception as e:
             logger.exception(f"Unexpected error occurred: {str(e)}")
-            # If we have a current job, update its status to ABORTED
-            if 'job_id' in locals():
-                exception_message = f"Unexpected exception occurred on {runner_id} while processing job. Exception: {str(e)}"
-                update_status(job_id, "ABORTED", exception_message)
-            break
-
-        if machine_type == "htc":
-            break
+            stop_leasing()
+            return
+
+        if status_code == 200:
+            if machine_type == "htc":
+                stop_leasing()
+            continue
+
+        if not starving:
+            # A top-up found nothing; ask again once a slot frees up
+            prefetch_exhausted = True
+            continue
+
+        if status_code == 404:
+            if long_poll_wait and reply.get("unfinished"):
+                # Running or failed jobs may still come back as PENDING
+                logger.info(f"No job available yet; {reply['unfinished']} job(s) unfinished.")
+                continue
+            logger.info("No more jobs available. Runner exiting.")
+            stop_leasing()
+            return
+
+        if status_code == 503:
+            time.sleep(NO_JOB_RETRY_WAIT)
+            continue
+
+        stop_leasing()
+        return
+
+
+def main():
+    logger.info(f"Runner started as {runner_id}_{args.process_id}")
+    logger.info(f"Job Server URL: {job_server}:{port}")
+    logger.info(f"Heart bit interval set to {heartBitInterval} seconds")
+    logger.info(f"Running {slots} job(s) at a time")
+    logger.info(f"Prefetching up to {prefetch_jobs} extra job(s) per slot")
+    logger.info(f"Waiting up to {long_poll_wait} seconds per job request")
+
+    # One heartbeat thread covers every running and prefetched job
+    stop_event = threading.Event()
+    pinger_thread = threading.Thread(
+        target=ping_jobs, args=(stop_event,), daemon=True)
+    pinger_thread.start()
+
+    slot_threads = [threading.Thread(target=run_slot, name=f"slot-{i}", daemon=True)
+                    for i in range(1, slots + 1)]
+    for thread in slot_threads:
+        thread.start()
+
+    dispatch()
+    for thread in slot_threads:
+        thread.join()
+
+    stop_event.set()
+    pinger_thread.join()
 
 
 # --------------- Entry Point ----------------
@@ -21,6 +21,8 @@ job_server = config["job_server"]
 port = config["port"]
 # htc always prefers on process per machine
 num_processes = config["number_of_parallel_process"] if config["machine_type"] != "htc" else 1
+# One runner process running all jobs in parallel instead of one process per job
+single_agent = str(config.get("single_agent", False)).lower() in ("true", "1", "yes", "on")
 
 
 exp_dir = os.path.join(exp_id)
@@ -75,14 +77,15 @@ signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
 # ---------------- Launch Runners ----------------
-logger.info(f"Starting {num_processes} runners for experiment '{exp_id}'")
-
-for i in range(1, num_processes + 1):
-    cmd = [
-        "python", "runner.py",
-        "--process_id", str(i)
-    ]
-
+if single_agent:
+    logger.info(f"Starting one runner with {num_processes} slots for experiment '{exp_id}'")
+    commands = [["python", "runner.py", "--process_id", "1", "--slots", str(num_processes)]]
+else:
+    logger.info(f"Starting {num_processes} runners for experiment '{exp_id}'")
+    commands = [["python", "runner.py", "--process_id", str(i)]
+                for i in range(1, num_processes + 1)]
+
+for i, cmd in enumerate(commands, start=1):
     logger.info(f"Launching runner {i}: {' '.join(cmd)}")
 
     if IS_WINDOWS:
@@ -0,0 +1,152 @@
+"""Load test for a running job server: many simulated runners claim, ping and finish jobs.
+
+Each simulated runner repeats request_job -> ping (x --pings) -> update_job_status DONE
+against a live server, opening a new connection per request, or keeping one open per
+runner like client/runner.py with --keepAlive.
+Point it at a throwaway experiment with plenty of PENDING jobs, e.g.
+
+    python src/create_job_db.py --expId=bench --jobDB=jobs.db --virtualGrid \\
+        --parameters='{"a": [...1000 values...], "b": [...1000 values...]}'
+    python src/server.py --expId=bench --wsgiServer=waitress --port=5077 &
+    python benchmark.py --url=http://127.0.0.1:5077 --runners=1000 --duration=30
+"""
+import argparse
+import http.client
+import json
+import multiprocessing
+import threading
+import time
+from collections import defaultdict
+from urllib.parse import urlparse
+
+ENDPOINTS = ("/request_job", "/ping", "/update_job_status")
+
+
+def connect(url, timeout):
+    conn_class = http.client.HTTPSConnection if url.scheme == "https" else http.client.HTTPConnection
+    return conn_class(url.hostname, url.port, timeout=timeout)
+
+
+def post(conn, path, payload):
+    """POST JSON on `conn`. Returns (status, decoded body or None)."""
+    conn.request("POST", path, json.dumps(payload), {"Content-Type": "application/json"})
+    response = conn.getresponse()
+    body = response.read()
+    try:
+        return response.status, json.loads(body)
+    except ValueError:
+        return response.status, None
+
+
+def run_runner(runner_id, args, url, deadline, stats, lock):
+    """One simulated runner: claim, ping and finish jobs until the deadline."""
+    local = defaultdict(list)
+    errors = 0
+    conn = None
+
+    def call(path, payload):
+        nonlocal errors, conn
+        start = time.perf_counter()
+        if conn is None:
+            conn = connect(url, args.timeout)
+        try:
+            status, body = post(conn, path, payload)
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            status, body = None, None
+        if status is None or not args.keepAlive:
+            conn.close()
+            conn = None
+        if status is not None:
+            local[path].append(time.perf_counter() - start)
+        return status, body
+
+    while time.time() < deadline:
+        status, body = call("/request_job", {"requested_by": runner_id})
+        if status != 200:
+            time.sleep(args.idleWait)
+            continue
+        job_id = body["job_id"]
+        for _ in range(args.pings):
+            if time.time() >= deadline:
+                break
+            time.sleep(args.thinkTime)
+            call("/ping", {"id": job_id})
+        time.sleep(args.thinkTime)
+        call("/update_job_status", {"job_id": job_id, "status": "DONE",
+                                    "message": "benchmark", "requested_by": runner_id})
+
+    with lock:
+        for path, latencies in local.items():
+            stats[path].extend(latencies)
+        stats["errors"].append(errors)
+
+
+def run_process(index, args, deadline, queue):
+    """Run this process's share of the simulated runners in threads."""
+    url = urlparse(args.url)
+    stats, lock = defaultdict(list), threading.Lock()
+    count = args.runners // args.processes + (1 if index < args.runners % args.processes else 0)
+    threads = [threading.Thread(target=run_runner, daemon=True,
+                                args=(f"bench-{index}-{i}", args, url, deadline, stats, lock))
+               for i in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=max(0.0, deadline - time.time()) + args.timeout + 5)
+    with lock:
+        queue.put(dict(stats))
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test a running job server")
+    parser.add_argument("--url", default="http://127.0.0.1:5000", help="Job server base URL")
+    parser.add_argument("--runners", type=int, default=1000, help="Simulated concurrent runners")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count(),
+                        help="Client processes the runners are spread over")
+    parser.add_argument("--duration", type=float, default=30, help="Seconds to run")
+    parser.add_argument("--pings", type=int, default=2, help="Heartbeats per job")
+    parser.add_argument("--thinkTime", type=float, default=0.0,
+                        help="Seconds a runner waits between its requests for a job")
+    parser.add_argument("--idleWait", type=float, default=1.0,
+                        help="Seconds a runner waits after a failed /request_job")
+    parser.add_argument("--timeout", type=float, default=30, help="Per-request timeout in seconds")
+    parser.add_argument("--keepAlive", action="store_true",
+                        help="Reuse one connection per runner instead of connecting for every request")
+    args = parser.parse_args()
+    args.processes = max(1, min(args.processes, args.runners))
+
+    deadline = time.time() + args.duration
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=run_process, args=(i, args, deadline, queue))
+               for i in range(args.processes)]
+    started = time.time()
+    for worker in workers:
+        worker.start()
+    results = [queue.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    elapsed = time.time() - started
+
+    stats = defaultdict(list)
+    for result in results:
+        for key, values in result.items():
+            stats[key].extend(values)
+    total = sum(len(stats[path]) for path in ENDPOINTS)
+
+    print(f"{args.runners} runners in {args.processes} process(es), {elapsed:.1f} s")
+    print(f"{'endpoint':<20}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for path in ENDPOINTS:
+        latencies = sorted(stats[path])
+        print(f"{path:<20}{len(latencies):>10}{len(latencies) / elapsed:>10.1f}"
+              f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.99) * 1000:>10.1f}")
+    print(f"{'total':<20}{total:>10}{total / elapsed:>10.1f}")
+    print(f"connection errors: {sum(stats['errors'])}")
+
+
+if __name__ == "__main__":
+    main()
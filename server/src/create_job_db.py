@@ -4,7 +4,7 @@ import logging
 import json
 import shutil
 from datetime import datetime
-from itertools import product
+import samplers
 from database import JobDatabase
 
 BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
@@ -33,20 +33,34 @@ def backup_existing_db(db_path):
         return backup_path
     return None
 
-def generate_db(db_path, parameters_dict):
+def generate_db(db_path, parameters_dict, virtual_grid=False, sampler=None):
+    sampler = sampler or {"type": samplers.SAMPLER_GRID}
+    kind = sampler.get("type", samplers.SAMPLER_GRID)
+    if kind not in samplers.SAMPLERS:
+        raise ValueError(f"Unknown sampler type: {kind}")
+    if virtual_grid and kind != samplers.SAMPLER_GRID:
+        raise ValueError("A virtual grid can only be used with the grid sampler")
+
     # Backup existing database if it exists
     backup_path = backup_existing_db(db_path)
     
-    parameters_keys = list(parameters_dict.keys())
-    parameters_values = list(parameters_dict.values())
-    parameters_list = [
-        json.dumps(dict(zip(parameters_keys, combination)))
-        for combination in product(*parameters_values)
-    ]
-    
     # Initialize database and create jobs
     db = JobDatabase(db_path)
-    total_jobs = db.create_jobs(parameters_list)
+    if virtual_grid:
+        # Only the grid is stored; job rows are written as jobs are handed out
+        total_jobs = db.create_virtual_jobs(parameters_dict)
+    elif kind == samplers.SAMPLER_HYPERBAND:
+        # First rung of every bracket; later rungs are created as results come in
+        trials = samplers.Hyperband.from_spec(parameters_dict, sampler).initial_trials()
+        total_jobs = db.create_jobs(json.dumps(params) for params, _, _, _ in trials)
+        db.set_sampler(sampler, parameters_dict, [
+            (job_id, bracket, rung, config) for job_id, (_, config, bracket, rung) in enumerate(trials)
+        ])
+    else:
+        # Generated lazily; create_jobs inserts the parameters in fixed-size chunks
+        parameters_list = (json.dumps(params) for params in samplers.sample_parameters(parameters_dict, sampler))
+        total_jobs = db.create_jobs(parameters_list)
+        db.set_sampler(sampler, parameters_dict)
     
     logging.info(f"SQLite database '{db_path}' generated with {total_jobs} jobs.")
     if backup_path:
@@ -57,6 +71,9 @@ if __name__ == "__main__":
     parser.add_argument("--jobDB", default="jobs.db", help="SQLite database file (<filename>.db) placed in the same directory as server.py")
     parser.add_argument("--expId", type=str, default="sim1", help="Give a unique name")
     parser.add_argument('--parameters', type=str, required=True)
+    parser.add_argument("--virtualGrid", action="store_true", help="Store only the parameter grid and create job rows on demand")
+    parser.add_argument("--sampler", type=str, default='{"type": "grid"}',
+                        help="JSON sampler spec: grid, random, lhs or hyperband (see README)")
     args = parser.parse_args()
 
     createExpBaseDirectory(args)
@@ -64,7 +81,7 @@ if __name__ == "__main__":
 
     parameters_dict = json.loads(args.parameters)
     DB_FILE = os.path.join(BASE_DIR, args.expId, args.jobDB)
-    generate_db(DB_FILE, parameters_dict)
+    generate_db(DB_FILE, parameters_dict, args.virtualGrid, json.loads(args.sampler))
 
     logging.info("Job database setup complete.")
     
@@ -1,13 +1,17 @@
 import argparse
+import atexit
 import json
 import logging
 import os
+import signal
+import sys
 from collections import defaultdict
 from datetime import datetime, timedelta
 from pathlib import Path
 
 import pytz
 from database import JobDatabase
+from request_stats import RequestStatsRecorder
 from flask import Flask, jsonify, render_template_string, request
 
 # Load .env if available (place .env in the server project root)
@@ -123,9 +127,14 @@ STATUS_PENDING = "PENDING"
 STATUS_SERVED = "SERVED"
 STATUS_DONE = "DONE"
 STATUS_ABORTED = "ABORTED"
+STATUS_QUARANTINED = "QUARANTINED"
+
+RESULTS_TOP_K = 10  # rows of the results leaderboard
 
 # Initialize database connection
 db = None
+# Request counters and latency histograms, flushed to api_stats periodically
+request_stats = RequestStatsRecorder()
 
 # Load configuration
 
@@ -146,22 +155,11 @@ config = load_config()
 # --------------------- HELPER FUNCTIONS -----------------------
 
 
-def load_jobs():
-    """Load jobs from the SQLite database."""
-    try:
-        jobs = db.get_all_jobs()
-
-        # Add machine field for compatibility
-        for job in jobs:
-            if not job["requested_by"] or job["requested_by"].strip() == "":
-                job["machine"] = "Unassigned"
-            else:
-                job["machine"] = job["requested_by"].split("_")[0]
-
-        return jobs
-    except Exception as e:
-        logging.error(f"Error loading jobs from database: {e}")
-        return []
+def machine_name(requested_by):
+    """Machine group of a requester, as shown in the dashboard."""
+    if not requested_by or requested_by.strip() == "":
+        return "Unassigned"
+    return requested_by.split("_")[0]
 
 
 def format_timestamp(timestamp):
@@ -182,20 +180,18 @@ def format_time(seconds):
     return str(timedelta(seconds=round(seconds)))
 
 
-def calculate_machine_stats(jobs):
-    """Calculate statistics for each machine group."""
+def calculate_machine_stats(done_stats):
+    """Calculate statistics for each machine group from per-requester DONE totals."""
     machine_stats = defaultdict(
         lambda: {"count": 0, "total_time": 0, "instances": set()})
-    total_completed = len(
-        [job for job in jobs if job["status"] == STATUS_DONE])
+    total_completed = sum(row["job_count"] for row in done_stats)
 
-    for job in jobs:
-        if job["status"] == STATUS_DONE:
-            machine_name = job["requested_by"].split(
-                "_")[0]  # Extract machine prefix
-            machine_stats[machine_name]["count"] += 1
-            machine_stats[machine_name]["total_time"] += job["required_time"]
-            machine_stats[machine_name]["instances"].add(job["requested_by"])
+    for row in done_stats:
+        machine_name = row["requested_by"].split(
+            "_")[0]  # Extract machine prefix
+        machine_stats[machine_name]["count"] += row["job_count"]
+        machine_stats[machine_name]["total_time"] += row["total_time"]
+        machine_stats[machine_name]["instances"].add(row["requested_by"])
 
     for machine, data in machine_stats.items():
         data["average_time"] = format_time(
@@ -211,81 +207,110 @@ def calculate_machine_stats(jobs):
 
 
 @app.route("/job_stats", methods=["GET"])
+@request_stats.track("Job Statistics", "GET")
 def job_stats():
-    # Track API request
-    db.track_api_request("Job Statistics", "GET")
-
-    jobs = load_jobs()
     interval = request.args.get("interval", "hourly")
     machine = request.args.get("machine", "all")
     # Use UTC for server-side calculations, let client handle timezone conversion
     now = datetime.now(pytz.utc).timestamp()
-    job_counts = defaultdict(int)
-    total_jobs_completed = 0
 
-    filtered_jobs = [job for job in jobs if job["status"] == STATUS_DONE and (
-        machine == "all" or job["machine"] == machine)]
+    # Resolve the machine filter to its requesters so SQL can use the requester index
+    requesters = None
+    if machine != "all":
+        requesters = [row["requested_by"] for row in db.get_done_stats()
+                      if machine_name(row["requested_by"]) == machine]
 
     if interval == "minutely":
         start_time = now - 1800
+        bucket_seconds = 60
         # Return timestamps for client-side formatting
         x_labels = [start_time + i * 60 for i in range(30)]
-        for job in filtered_jobs:
-            if job["completion_timestamp"] >= start_time:
-                minute = int((job["completion_timestamp"] - start_time) // 60)
-                job_counts[minute] += 1
-                total_jobs_completed += 1
     elif interval == "hourly":
         start_time = now - 86400
+        bucket_seconds = 3600
         # Return timestamps for client-side formatting
         x_labels = [start_time + i * 3600 for i in range(24)]
-        for job in filtered_jobs:
-            if job["completion_timestamp"] >= start_time:
-                hour = int((job["completion_timestamp"] - start_time) // 3600)
-                job_counts[hour] += 1
-                total_jobs_completed += 1
     else:
-        if not filtered_jobs:
+        first_day = db.get_first_completion_timestamp(requesters)
+        if first_day is None:
             return jsonify({"labels": [], "values": [], "total_jobs": 0, "timestamps": True})
-        first_day = min(job["completion_timestamp"] for job in filtered_jobs)
+        start_time = first_day
+        bucket_seconds = 86400
         days_elapsed = int((now - first_day) // 86400 + 1)
         # Return timestamps for client-side formatting
         x_labels = [first_day + i * 86400 for i in range(days_elapsed)]
-        for job in filtered_jobs:
-            day = int((job["completion_timestamp"] - first_day) // 86400)
-            job_counts[day] += 1
-            total_jobs_completed += 1
 
-    y_values = [job_counts[i] for i in range(len(x_labels))]
+    job_counts = db.get_completion_histogram(start_time, bucket_seconds, requesters)
+    total_jobs_completed = sum(job_counts.values())
+
+    y_values = [job_counts.get(i, 0) for i in range(len(x_labels))]
     return jsonify({"labels": x_labels, "values": y_values, "total_jobs": total_jobs_completed, "timestamps": True})
 
 
 @app.route("/api_stats", methods=["GET"])
+@request_stats.track("API Statistics", "GET")
 def api_stats():
     """Return API statistics in JSON format."""
-    # Track API request
-    db.track_api_request("API Statistics", "GET")
-
-    stats = db.get_api_stats()
+    # Include this process's own unflushed requests
+    stats = db.get_api_stats(*request_stats.pending())
     return jsonify({"api_stats": stats})
 
 
 @app.route("/database_info", methods=["GET"])
+@request_stats.track("Database Info", "GET")
 def get_database_info():
     """Get database information including indexes and table sizes."""
-    # Track API request
-    db.track_api_request("Database Info", "GET")
-
     info = db.get_database_info()
     return jsonify(info)
 
 
+@app.route("/results_summary", methods=["GET"])
+@request_stats.track("Results Summary", "GET")
+def results_summary():
+    """Leaderboard and per-parameter marginals of one reported metric.
+
+    Both come from incrementally maintained data (the job_results index and
+    the result_stats sums), so the cost does not grow with the number of
+    results. Parameters are ranked by the spread of their marginal means.
+    """
+    metrics = db.get_result_metrics()
+    sampler = db.get_sampler()
+    sampler_spec = sampler['spec'] if sampler else {}
+
+    metric = request.args.get("metric")
+    if not metric:
+        metric = sampler_spec.get("metric") if sampler_spec.get("metric") in metrics else None
+        metric = metric or (metrics[0] if metrics else None)
+    mode = request.args.get("mode") or sampler_spec.get("mode", "max")
+    if mode not in ("max", "min"):
+        return jsonify({"error": "mode must be 'max' or 'min'"}), 400
+    if metric is None:
+        return jsonify({"metrics": [], "metric": None, "mode": mode, "top": [], "parameters": []})
+
+    by_param = defaultdict(list)
+    for row in db.get_result_marginals(metric):
+        by_param[row["param"]].append(
+            {"value": row["value"], "count": row["count"], "mean": row["mean"], "std": row["std"]})
+    parameters = []
+    for param, values in by_param.items():
+        values.sort(key=lambda v: v["mean"], reverse=(mode == "max"))
+        means = [v["mean"] for v in values]
+        parameters.append({"param": param, "spread": max(means) - min(means), "values": values})
+    parameters.sort(key=lambda p: p["spread"], reverse=True)
+
+    return jsonify({
+        "metrics": metrics,
+        "metric": metric,
+        "mode": mode,
+        "top": db.get_top_results(metric, RESULTS_TOP_K, mode),
+        "parameters": parameters,
+    })
+
+
 @app.route("/change_job_status", methods=["POST"])
+@request_stats.track("Change Job Status", "POST")
 def change_job_status():
-    """Change job status for DONE, ABORTED, or PENDING jobs."""
-    # Track API request
-    db.track_api_request("Change Job Status", "POST")
-
+    """Change job status for DONE, ABORTED, PENDING or QUARANTINED jobs."""
     try:
         data = request.get_json()
         job_id = data.get('job_id')
@@ -314,17 +339,28 @@ def change_job_status():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/job_history/<int:job_id>", methods=["GET"])
+@request_stats.track("Job History", "GET")
+def get_job_history(job_id):
+    """Return the parameters, status and history of a single job, oldest entry first."""
+    job = db.get_job_by_id(job_id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify({"job_id": job_id, "status": job["status"],
+                    "parameters": job["parameters"], "message": job["message"]})
+
+
 @app.route("/jobs_paginated", methods=["GET"])
+@request_stats.track("Jobs Paginated", "GET")
 def get_jobs_paginated():
     """Get jobs with pagination support."""
-    # Track API request
-    db.track_api_request("Jobs Paginated", "GET")
-
     try:
         page = int(request.args.get("page", 1))
         per_page = int(request.args.get("per_page", 50))
         status = request.args.get("status", None)
         search_job_id = request.args.get("search_job_id", None)
+        after_id = request.args.get("after_id", None, type=int)
+        before_id = request.args.get("before_id", None, type=int)
 
         # Validate parameters
         if page < 1:
@@ -333,14 +369,12 @@ def get_jobs_paginated():
             per_page = 50
 
         result = db.get_jobs_paginated(
-            page=page, per_page=per_page, status=status, search_job_id=search_job_id)
+            page=page, per_page=per_page, status=status, search_job_id=search_job_id,
+            after_id=after_id, before_id=before_id)
 
         # Add machine field for compatibility
         for job in result['jobs']:
-            if not job["requested_by"] or job["requested_by"].strip() == "":
-                job["machine"] = "Unassigned"
-            else:
-                job["machine"] = job["requested_by"].split("_")[0]
+            job["machine"] = machine_name(job["requested_by"])
 
         return jsonify(result)
 
@@ -351,11 +385,9 @@ def get_jobs_paginated():
 
 # ------------------------ DASHBOARD ROUTE ---------------------
 @app.route("/", methods=["GET"])
+@request_stats.track("Dashboard", "GET")
 def dashboard():
     """Display job statistics and job details in an HTML page with column-based sorting icons."""
-    # Track API request
-    db.track_api_request("Dashboard", "GET")
-
     expId = EXP_ID
 
     # Use efficient data loading instead of loading all jobs
@@ -364,15 +396,15 @@ def dashboard():
     total_jobs_served = job_counts.get(STATUS_SERVED, 0)
     total_jobs_completed = job_counts.get(STATUS_DONE, 0)
     total_jobs_aborted = job_counts.get(STATUS_ABORTED, 0)
+    total_jobs_quarantined = job_counts.get(STATUS_QUARANTINED, 0)
 
-    # Get machine names efficiently (only from completed jobs for stats)
-    completed_jobs = db.get_jobs_by_status(STATUS_DONE)
-    machine_names = sorted(set(job["requested_by"].split(
-        "_")[0] if job["requested_by"] else "Unassigned" for job in completed_jobs))
+    # Per-requester DONE totals are maintained incrementally in the database
+    done_stats = db.get_done_stats()
+    machine_names = sorted(set(machine_name(row["requested_by"]) for row in done_stats))
 
     # Calculate machine stats efficiently
-    machine_stats = calculate_machine_stats(completed_jobs)
-    api_stats = db.get_api_stats()
+    machine_stats = calculate_machine_stats(done_stats)
+    api_stats = db.get_api_stats(*request_stats.pending())
 
     # Calculate total API requests
     total_api_requests = sum(stat['request_count'] for stat in api_stats)
@@ -380,7 +412,7 @@ def dashboard():
     # Calculate average completion time efficiently
     avg_completion_time = ""
     if total_jobs_completed > 0:
-        total_time = sum(j["required_time"] for j in completed_jobs)
+        total_time = sum(row["total_time"] for row in done_stats)
         avg_completion_time = format_time(total_time / total_jobs_completed)
 
     # ---------------------- HTML TEMPLATE ----------------------
@@ -962,6 +994,63 @@ def dashboard():
                 color: #333;
             }
             
+            /* Results Panel */
+            .results-panel {
+                margin-top: 20px;
+                height: auto;
+            }
+            
+            .results-controls {
+                display: flex;
+                gap: 10px;
+            }
+            
+            .results-controls .form-select {
+                width: auto;
+                padding: 6px 10px;
+                font-size: 0.875rem;
+            }
+            
+            .results-body {
+                display: grid;
+                grid-template-columns: 3fr 2fr;
+                gap: 20px;
+                padding: 15px 20px;
+            }
+            
+            .results-body h4 {
+                margin: 0 0 10px 0;
+                color: #495057;
+            }
+            
+            .param-importance {
+                margin-bottom: 14px;
+                font-size: 0.85rem;
+            }
+            
+            .param-importance-title {
+                display: flex;
+                justify-content: space-between;
+                font-weight: 600;
+                color: #333;
+                margin-bottom: 4px;
+            }
+            
+            .param-value-row {
+                display: grid;
+                grid-template-columns: 90px 1fr 130px;
+                align-items: center;
+                gap: 8px;
+                color: #495057;
+                margin: 2px 0;
+            }
+            
+            .param-value-bar {
+                height: 8px;
+                background: #3498db;
+                border-radius: 4px;
+            }
+            
             .search-section {
                 display: flex;
                 align-items: center;
@@ -1487,104 +1576,27 @@ def dashboard():
                 'SERVED': 1,
                 'DONE': 1,
                 'ABORTED': 1,
-                'PENDING': 1
+                'PENDING': 1,
+                'QUARANTINED': 1
+            };
+            // Keyset cursor that loaded the current page of each tab, and the id range it showed
+            let pageCursors = {
+                'SERVED': null,
+                'DONE': null,
+                'ABORTED': null,
+                'PENDING': null,
+                'QUARANTINED': null
+            };
+            let pageBounds = {
+                'SERVED': null,
+                'DONE': null,
+                'ABORTED': null,
+                'PENDING': null,
+                'QUARANTINED': null
             };
             let currentSearchJobId = null;
             let currentStatus = 'SERVED';
 
-            // Enhanced encoding with validation - Define these functions first
-            function encodeForHtmlAttribute(text) {
-                try {
-                    console.log('encodeForHtmlAttribute input:', text);
-                    console.log('encodeForHtmlAttribute input type:', typeof text);
-                    
-                    if (typeof text !== 'string') {
-                        text = safeStringify(text);
-                        console.log('After safeStringify:', text);
-                    }
-                    
-                    if (!text || text === 'null' || text === 'undefined') {
-                        console.log('Empty/null/undefined, returning empty string');
-                        return '';
-                    }
-                    
-                    // Handle essential characters for onclick + preserve newlines
-                    const result = text
-                        .replace(/"/g, '&quot;')          // Double quote
-                        .replace(/'/g, '&#39;')           // Single quote
-                        .replace(/&/g, '&amp;')           // Ampersand
-                        .replace(/</g, '&lt;')            // Less than
-                        .replace(/>/g, '&gt;')            // Greater than
-                        .replace(/\\n/g, '&#10;')          // Newline
-                        .replace(/\\r/g, '&#13;');         // Carriage return
-                    
-                    console.log('encodeForHtmlAttribute result:', result);
-                    return result;
-                } catch (error) {
-                    console.error('Error in encodeForHtmlAttribute:', error);
-                    return '';
-                }
-            }
-
-            function decodeFromHtmlAttribute(text) {
-                console.log('decodeFromHtmlAttribute input:', text);
-                console.log('decodeFromHtmlAttribute input type:', typeof text);
-                
-                if (typeof text !== 'string') {
-                    console.log('Not a string, returning as-is');
-                    return text;
-                }
-                
-                const result = text
-                    .replace(/&quot;/g, '"')          // Double quote
-                    .replace(/&#39;/g, "'")            // Single quote
-                    .replace(/&amp;/g, '&')           // Ampersand
-                    .replace(/&lt;/g, '<')            // Less than
-                    .replace(/&gt;/g, '>')            // Greater than
-                    .replace(/&#10;/g, '\\n')          // Newline
-                    .replace(/&#13;/g, '\\r');         // Carriage return
-                
-                console.log('decodeFromHtmlAttribute result:', result);
-                return result;
-            }
-
-            function safeStringify(obj, fallback = '{}') {
-                try {
-                    return JSON.stringify(obj);
-                } catch (error) {
-                    console.error('Error stringifying object:', error);
-                    return fallback;
-                }
-            }
-
-            function safeJsonParse(jsonString, fallback = null) {
-                try {
-                    console.log('safeJsonParse input:', jsonString);
-                    console.log('safeJsonParse input type:', typeof jsonString);
-                    
-                    // First decode HTML entities
-                    const decoded = decodeFromHtmlAttribute(jsonString);
-                    console.log('After decodeFromHtmlAttribute:', decoded);
-                    
-                    // Clean up control characters that break JSON parsing
-                    const cleaned = decoded
-                        .replace(/\\n/g, '\\\\n')      // Escape newlines for JSON
-                        .replace(/\\r/g, '\\\\r')      // Escape carriage returns for JSON
-                        .replace(/\\t/g, '\\\\t');     // Escape tabs for JSON
-                    
-                    console.log('After cleaning control characters:', cleaned);
-                    
-                    // Then parse JSON
-                    const result = JSON.parse(cleaned);
-                    console.log('After JSON.parse:', result);
-                    return result;
-                } catch (error) {
-                    console.error('JSON parsing error:', error);
-                    console.error('Original string:', jsonString);
-                    return fallback;
-                }
-            }
-
             function formatMessageForDisplay(message) {
                 if (typeof message === 'string') {
                     // Convert newlines to HTML line breaks
@@ -1594,7 +1606,7 @@ def dashboard():
             }
 
             // Load jobs for a specific status and page
-            function loadJobs(status, page = 1, searchJobId = null) {
+            function loadJobs(status, page = 1, searchJobId = null, cursor = null) {
                 const tbody = document.getElementById(`tbody-${status}`);
                 const loadingRow = `<tr><td colspan="7" class="loading-message"><i class="fas fa-spinner fa-spin"></i> Loading jobs...</td></tr>`;
                 tbody.innerHTML = loadingRow;
@@ -1608,6 +1620,11 @@ def dashboard():
                 if (searchJobId) {
                     params.append('search_job_id', searchJobId);
                 }
+                if (cursor) {
+                    for (const key in cursor) {
+                        params.append(key, cursor[key]);
+                    }
+                }
 
                 fetch(`/jobs_paginated?${params}`)
                     .then(response => response.json())
@@ -1627,10 +1644,16 @@ def dashboard():
                             return;
                         }
 
+                        // Remember where this page starts and ends for the prev/next cursors
+                        pageCursors[status] = cursor;
+                        pageBounds[status] = data.jobs.length > 0
+                            ? {first: data.jobs[0].id, last: data.jobs[data.jobs.length - 1].id}
+                            : null;
+
                         // Update pagination info
-                        document.getElementById(`page-info-${status}`).textContent = `Page ${data.current_page} of ${data.total_pages}`;
-                        document.getElementById(`prev-${status}`).disabled = data.current_page <= 1;
-                        document.getElementById(`next-${status}`).disabled = data.current_page >= data.total_pages;
+                        document.getElementById(`page-info-${status}`).textContent = `Page ${data.current_page} of ${Math.max(data.total_pages, data.current_page)}`;
+                        document.getElementById(`prev-${status}`).disabled = !data.has_prev;
+                        document.getElementById(`next-${status}`).disabled = !data.has_next;
 
                         // Update pagination info for this status
                         document.getElementById(`paginationInfo-${status}`).textContent = 
@@ -1659,10 +1682,6 @@ def dashboard():
                             const completionTime = job.completion_timestamp ? new Date(job.completion_timestamp * 1000).toLocaleString() : '';
                             const duration = job.required_time ? formatTime(job.required_time) : '';
 
-                            // Use comprehensive encoding for all special characters
-                            const messageJson = encodeForHtmlAttribute(job.message);
-                            const parametersJson = encodeForHtmlAttribute(job.parameters);
-
                             html += `
                                 <tr>
                                     <td style="font-weight: bold;">${job.id}</td>
@@ -1672,7 +1691,7 @@ def dashboard():
                                     <td data-timestamp="${job.completion_timestamp || ''}">${completionTime}</td>
                                     <td>${duration}</td>
                                     <td>
-                                        <button class="view-details-btn" onclick="showMessageModalWithRecovery(${job.id}, '${messageJson}', '${parametersJson}', '${job.status}')" title="View Details">
+                                        <button class="view-details-btn" onclick="showMessageModalWithRecovery(${job.id}, '${job.status}')" title="View Details">
                                             <i class="fas fa-eye"></i>
                                         </button>
                                     </td>
@@ -1700,12 +1719,15 @@ def dashboard():
             // Change page for a specific status
             function changePage(status, direction) {
                 const newPage = currentPages[status] + direction;
-                if (newPage >= 1) {
+                const bounds = pageBounds[status];
+                if (newPage >= 1 && bounds) {
                     currentPages[status] = newPage;
                     // Get current search value for this status
                     const searchInput = document.getElementById(`jobSearch-${status}`);
                     const searchJobId = searchInput.value.trim() || null;
-                    loadJobs(status, newPage, searchJobId);
+                    // Seek from the edge of the current page instead of counting an offset
+                    const cursor = direction > 0 ? {after_id: bounds.last} : {before_id: bounds.first};
+                    loadJobs(status, newPage, searchJobId, cursor);
                 }
             }
 
@@ -1765,13 +1787,13 @@ def dashboard():
                 // Get current search value for this status
                 const searchInput = document.getElementById(`jobSearch-${tabName}`);
                 const searchJobId = searchInput ? searchInput.value.trim() || null : null;
-                loadJobs(tabName, currentPages[tabName], searchJobId);
+                loadJobs(tabName, currentPages[tabName], searchJobId, pageCursors[tabName]);
             }
 
             // Load initial data when page loads
             document.addEventListener('DOMContentLoaded', function() {
                 // Load jobs for all tabs initially
-                const statuses = ['SERVED', 'DONE', 'ABORTED', 'PENDING'];
+                const statuses = ['SERVED', 'DONE', 'ABORTED', 'PENDING', 'QUARANTINED'];
                 statuses.forEach(status => {
                     loadJobs(status, 1);
                     
@@ -1787,7 +1809,35 @@ def dashboard():
                 });
             });
 
-            function showMessageModal(jobId, message, parameters, currentStatus) {
+            // Render job history entries (newest first) into the timeline
+            function renderJobHistory(messageTimeline, entries) {
+                messageTimeline.innerHTML = "";
+                const reversedMessage = entries.slice().reverse();
+
+                reversedMessage.forEach(entry => {
+                    const item = document.createElement("div");
+                    item.classList.add("timeline-item");
+
+                    const timestamp = new Date(entry.timestamp * 1000).toLocaleString("en-US", {
+                        weekday: "long",
+                        year: "numeric",
+                        month: "short",
+                        day: "numeric",
+                        hour: "2-digit",
+                        minute: "2-digit",
+                        second: "2-digit",
+                        hour12: true
+                    });
+
+                    item.innerHTML = `
+                        <div class="message">${formatMessageForDisplay(entry.reason)}</div>
+                        <div class="timestamp">${timestamp}</div>
+                    `;
+                    messageTimeline.appendChild(item);
+                });
+            }
+
+            function showMessageModal(jobId, currentStatus) {
                 const modal = document.getElementById("messageModal");
                 const jobIdSpan = document.getElementById("jobId");
                 const messageTimeline = document.getElementById("messageTimeline");
@@ -1799,14 +1849,14 @@ def dashboard():
                 // Set Job ID
                 jobIdSpan.textContent = jobId;
 
-                // Only show status change for DONE, ABORTED, or PENDING jobs
-                if (currentStatus === 'DONE' || currentStatus === 'ABORTED' || currentStatus === 'PENDING') {
+                // Only show status change for DONE, ABORTED, PENDING or QUARANTINED jobs
+                if (currentStatus === 'DONE' || currentStatus === 'ABORTED' || currentStatus === 'PENDING' || currentStatus === 'QUARANTINED') {
                     statusChangeSection.style.display = 'block';
                     
                     // Set title based on current status
                     if (currentStatus === 'DONE') {
                         statusChangeTitle.textContent = 'Change Job Status to PENDING';
-                    } else if (currentStatus === 'ABORTED') {
+                    } else if (currentStatus === 'ABORTED' || currentStatus === 'QUARANTINED') {
                         statusChangeTitle.textContent = 'Change Job Status to PENDING';
                     } else if (currentStatus === 'PENDING') {
                         statusChangeTitle.textContent = 'Change Job Status to DONE';
@@ -1821,61 +1871,39 @@ def dashboard():
                 parametersTable.classList.add("hidden");
                 toggleBtn.innerHTML = "&#9654; View Parameters"; // ➤ icon
 
-                try {
-                    // Debug: Log the raw data
-                    console.log('Raw message:', message);
-                    console.log('Raw parameters:', parameters);
-                    
-                    // Parse parameters using safe JSON parsing
-                    let parsedParameters = safeJsonParse(parameters, {});
-                    console.log('Parsed parameters:', parsedParameters);
-
-                    // Show parameters table
-                    if (parsedParameters && typeof parsedParameters === "object") {
-                        const table = document.createElement("table");
-                        table.innerHTML = `<tr><th>Key</th><th>Value</th></tr>`;
-                        for (let key in parsedParameters) {
-                            const row = document.createElement("tr");
-                            row.innerHTML = `<td>${key}</td><td>${parsedParameters[key]}</td>`;
-                            table.appendChild(row);
+                // Parameters and history are loaded lazily, only for the job being viewed
+                messageTimeline.innerHTML = `<p class="loading-message"><i class="fas fa-spinner fa-spin"></i> Loading history...</p>`;
+                fetch(`/job_history/${jobId}`)
+                    .then(response => response.json())
+                    .then(data => {
+                        if (document.getElementById("jobId").textContent !== String(jobId)) {
+                            return; // Another job was opened meanwhile
+                        }
+                        if (data.error) {
+                            messageTimeline.innerHTML = `<p>${data.error}</p>`;
+                            return;
                         }
-                        parametersTable.appendChild(table);
-                    }
 
-                    // Parse message using safe JSON parsing
-                    let parsedMessage = safeJsonParse(message, []);
-                    console.log('Parsed message:', parsedMessage);
-
-                    // Show job history (newest first)
-                    const reversedMessage = JSON.parse(JSON.stringify(parsedMessage)).reverse();
-
-                    reversedMessage.forEach(entry => {
-                        const item = document.createElement("div");
-                        item.classList.add("timeline-item");
-
-                        const timestamp = new Date(entry.timestamp * 1000).toLocaleString("en-US", {
-                            weekday: "long",
-                            year: "numeric",
-                            month: "short",
-                            day: "numeric",
-                            hour: "2-digit",
-                            minute: "2-digit",
-                            second: "2-digit",
-                            hour12: true
-                        });
+                        // Show parameters table
+                        const parameters = data.parameters;
+                        if (parameters && typeof parameters === "object") {
+                            const table = document.createElement("table");
+                            table.innerHTML = `<tr><th>Key</th><th>Value</th></tr>`;
+                            for (let key in parameters) {
+                                const row = document.createElement("tr");
+                                row.innerHTML = `<td>${key}</td><td>${parameters[key]}</td>`;
+                                table.appendChild(row);
+                            }
+                            parametersTable.appendChild(table);
+                        }
 
-                        item.innerHTML = `
-                            <div class="message">${formatMessageForDisplay(entry.reason)}</div>
-                            <div class="timestamp">${timestamp}</div>
-                        `;
-                        messageTimeline.appendChild(item);
+                        renderJobHistory(messageTimeline, data.message || []);
+                    })
+                    .catch(error => {
+                        console.error('Error loading job history:', error);
+                        messageTimeline.innerHTML = "<p>Failed to load job history</p>";
                     });
 
-                } catch (e) {
-                    console.error('Error parsing message/parameters:', e);
-                    messageTimeline.innerHTML = "<p>Invalid message format</p>";
-                }
-
                 modal.style.display = "block";
             }
 
@@ -2060,9 +2088,9 @@ def dashboard():
 
 
             // Comprehensive error recovery for message modal
-            function showMessageModalWithRecovery(jobId, message, parameters, currentStatus) {
+            function showMessageModalWithRecovery(jobId, currentStatus) {
                 try {
-                    showMessageModal(jobId, message, parameters, currentStatus);
+                    showMessageModal(jobId, currentStatus);
                 } catch (error) {
                     console.error('Error in showMessageModal, attempting recovery:', error);
                     
@@ -2171,7 +2199,7 @@ def dashboard():
                                 <div class="stat-item">
                                     <div class="stat-icon" style="color: #95a5a6;"><i class="fas fa-pause-circle"></i></div>
                                     <div class="stat-label">Pending</div>
-                                    <div class="stat-value">{{ total_jobs - total_jobs_completed - total_jobs_served - total_jobs_aborted }}</div>
+                                    <div class="stat-value">{{ job_counts.get('PENDING', 0) }}</div>
                                 </div>
                             </div>
                             
@@ -2217,7 +2245,7 @@ def dashboard():
                                 <div class="api-stat-item">
                                     <div>
                                         <div class="api-endpoint">{{ stat.endpoint }}</div>
-                                        <div class="api-method">{{ stat.method }}</div>
+                                        <div class="api-method">{{ stat.method }}{% if stat.p50_ms is not none %} · p50 {{ "%.1f"|format(stat.p50_ms) }} / p95 {{ "%.1f"|format(stat.p95_ms) }} / p99 {{ "%.1f"|format(stat.p99_ms) }} ms{% endif %}</div>
                                     </div>
                                     <div class="api-count">{{ stat.request_count }}</div>
                                 </div>
@@ -2267,10 +2295,15 @@ def dashboard():
                                 PENDING
                                 <span class="tab-count">{{ job_counts.get('PENDING', 0) }}</span>
                             </button>
+                            <button class="tab-button" onclick="openTab(event, 'QUARANTINED')">
+                                <i class="fas fa-ban"></i>
+                                QUARANTINED
+                                <span class="tab-count">{{ total_jobs_quarantined }}</span>
+                            </button>
                         </div>
                         
                         <!-- Tab Contents -->
-                        {% for status in ['SERVED', 'DONE', 'ABORTED', 'PENDING'] %}
+                        {% for status in ['SERVED', 'DONE', 'ABORTED', 'PENDING', 'QUARANTINED'] %}
                             <div id="{{ status }}" class="tabcontent {% if status == 'SERVED' %}active{% endif %}">
                                 <div class="table-container">
                                     <!-- Table Header with Search -->
@@ -2329,6 +2362,43 @@ def dashboard():
                             </div>
                         {% endfor %}
                         
+                        <!-- Results: leaderboard and per-parameter marginals of a reported metric -->
+                        <div class="table-container results-panel">
+                            <div class="table-header">
+                                <div class="table-title">
+                                    <h3><i class="fas fa-trophy"></i> Results</h3>
+                                    <span id="resultsInfo" class="pagination-info">Loading...</span>
+                                </div>
+                                <div class="results-controls">
+                                    <select class="form-select" id="resultsMetric" onchange="loadResults()"></select>
+                                    <select class="form-select" id="resultsMode" onchange="resultsModeChosen = true; loadResults()">
+                                        <option value="max">Higher is better</option>
+                                        <option value="min">Lower is better</option>
+                                    </select>
+                                </div>
+                            </div>
+                            <div class="results-body">
+                                <div>
+                                    <h4>Top Configurations</h4>
+                                    <table class="myTable">
+                                        <thead>
+                                            <tr>
+                                                <th style="width: 50px;">#</th>
+                                                <th style="width: 80px;">Job ID</th>
+                                                <th style="width: 110px;">Value</th>
+                                                <th>Parameters</th>
+                                            </tr>
+                                        </thead>
+                                        <tbody id="resultsTop"></tbody>
+                                    </table>
+                                </div>
+                                <div>
+                                    <h4>Parameter Importance</h4>
+                                    <div id="resultsParams"></div>
+                                </div>
+                            </div>
+                        </div>
+
 
                     </div>
                 </div>
@@ -2395,6 +2465,81 @@ def dashboard():
             updateChart();
         </script>
         
+        <script>
+            const RESULTS_REFRESH_MS = 15000;
+            let resultsModeChosen = false;
+
+            function formatMetric(value) {
+                return Number(value).toPrecision(4);
+            }
+
+            // Metric names and parameter values come from the workers
+            function escapeHtml(value) {
+                const div = document.createElement("div");
+                div.textContent = String(value);
+                return div.innerHTML;
+            }
+
+            function loadResults() {
+                const metricSelect = document.getElementById("resultsMetric");
+                const modeSelect = document.getElementById("resultsMode");
+                const params = new URLSearchParams();
+                if (metricSelect.value) params.set("metric", metricSelect.value);
+                if (resultsModeChosen) params.set("mode", modeSelect.value);
+
+                fetch(`/results_summary?` + params.toString())
+                    .then(response => response.json())
+                    .then(data => {
+                        const info = document.getElementById("resultsInfo");
+                        const topBody = document.getElementById("resultsTop");
+                        const paramsDiv = document.getElementById("resultsParams");
+                        if (!data.metric) {
+                            info.textContent = "No metrics reported yet";
+                            topBody.innerHTML = `<tr><td colspan="4" class="loading-message">Jobs report metrics through metrics.json</td></tr>`;
+                            paramsDiv.innerHTML = "";
+                            return;
+                        }
+
+                        metricSelect.innerHTML = data.metrics.map(m =>
+                            `<option value="${escapeHtml(m)}" ${m === data.metric ? "selected" : ""}>${escapeHtml(m)}</option>`).join("");
+                        modeSelect.value = data.mode;
+                        const counted = data.parameters.length ? data.parameters[0].values.reduce((sum, v) => sum + v.count, 0) : 0;
+                        info.textContent = `${counted} results for ${data.metric}`;
+
+                        topBody.innerHTML = data.top.map((row, i) => `
+                            <tr>
+                                <td>${i + 1}</td>
+                                <td><a href="#" onclick="showMessageModal(${row.job_id}, 'DONE'); return false;">${row.job_id}</a></td>
+                                <td>${formatMetric(row.value)}</td>
+                                <td style="white-space: normal;">${Object.entries(row.parameters).map(([k, v]) => escapeHtml(`${k}=${JSON.stringify(v)}`)).join(", ")}</td>
+                            </tr>`).join("");
+
+                        paramsDiv.innerHTML = data.parameters.map(p => {
+                            const means = p.values.map(v => v.mean);
+                            const low = Math.min(...means);
+                            const range = Math.max(...means) - low || 1;
+                            const rows = p.values.map(v => `
+                                <div class="param-value-row" title="${v.count} results, std ${formatMetric(v.std)}">
+                                    <span>${escapeHtml(JSON.stringify(v.value))}</span>
+                                    <div class="param-value-bar" style="width: ${5 + 95 * (v.mean - low) / range}%;"></div>
+                                    <span>${formatMetric(v.mean)} (n=${v.count})</span>
+                                </div>`).join("");
+                            return `
+                                <div class="param-importance">
+                                    <div class="param-importance-title">
+                                        <span>${escapeHtml(p.param)}</span>
+                                        <span>spread ${formatMetric(p.spread)}</span>
+                                    </div>
+                                    ${rows}
+                                </div>`;
+                        }).join("");
+                    })
+                    .catch(error => console.error("Failed to load results:", error));
+            }
+            loadResults();
+            setInterval(loadResults, RESULTS_REFRESH_MS);
+        </script>
+        
         <!-- Modal -->
         <div id="messageModal" class="modal">
             <div class="modal-content">
@@ -2493,6 +2638,7 @@ def dashboard():
         total_jobs_served=total_jobs_served,
         total_jobs_completed=total_jobs_completed,
         total_jobs_aborted=total_jobs_aborted,
+        total_jobs_quarantined=total_jobs_quarantined,
         job_counts=job_counts,
         avg_completion_time=avg_completion_time,
         format_timestamp=format_timestamp,
@@ -2528,6 +2674,11 @@ if __name__ == "__main__":
     # Initialize database connection
     db = JobDatabase(DB_FILE)
 
+    request_stats.start(db)
+    atexit.register(request_stats.stop)
+    # Write buffered request counters before exiting (stop.py sends SIGTERM)
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+
     # Start ngrok only if requested and authtoken is set
     if args.enableNgrok:
         # token = os.getenv("NGROK_AUTHTOKEN") or os.getenv("NGROK_TOKEN")
@@ -1,27 +1,130 @@
 import sqlite3
 import json
 import logging
+import math
+import os
+import queue
 import threading
 import time
+from collections import defaultdict
 from contextlib import contextmanager
-from typing import List, Dict, Any, Optional
+from itertools import islice
+from typing import Callable, List, Dict, Any, Iterable, Iterator, Optional, Tuple
+
+from samplers import grid_point, grid_size
 
 # Constants for job statuses
 STATUS_PENDING = "PENDING"
 STATUS_SERVED = "SERVED"
 STATUS_DONE = "DONE"
 STATUS_ABORTED = "ABORTED"
+STATUS_QUARANTINED = "QUARANTINED"
+
+# Kinds of entries in the job_events history table
+EVENT_REQUESTED = "REQUESTED"
+EVENT_DONE = "DONE"
+EVENT_ABORTED = "ABORTED"
+EVENT_STATUS_CHANGE = "STATUS_CHANGE"
+EVENT_RESET_ABORTED = "RESET_ABORTED"
+EVENT_RESET_STALE = "RESET_STALE"
+EVENT_QUARANTINED = "QUARANTINED"
+EVENT_MIGRATED = "MIGRATED"
+EVENT_CREATED = "CREATED"
+EVENT_SPECULATED = "SPECULATED"
+EVENT_RENEWED = "RENEWED"
+
+# Heartbeats are buffered in the server for at most this many seconds before
+# they reach the database, so stale-job checks allow this much extra silence
+HEARTBEAT_FLUSH_INTERVAL = 5
+
+# Bumped whenever _init_database learns a new migration (stored in PRAGMA user_version)
+SCHEMA_VERSION = 5
+
+# Upper bound (seconds) of the exponential backoff before an ABORTED job is retried
+MAX_RETRY_BACKOFF = 60 * 60
+
+# Summary columns of a job row; history lives in job_events
+JOB_COLUMNS = """id, requested_by, request_timestamp, completion_timestamp, required_time,
+    last_ping_timestamp, status, parameters, attempts, not_before"""
+
+# Secondary indexes of the jobs table; create_jobs drops them during bulk loads
+JOB_INDEXES = [
+    ('idx_jobs_status', 'status'),
+    ('idx_jobs_status_id', 'status, id'),
+    ('idx_jobs_last_ping', 'last_ping_timestamp'),
+    ('idx_jobs_status_ping', 'status, last_ping_timestamp'),
+    ('idx_jobs_requested_by', 'requested_by'),
+    ('idx_jobs_request_timestamp', 'request_timestamp'),
+    ('idx_jobs_completion_timestamp', 'completion_timestamp'),
+    # Completion-time histograms, overall and per requester
+    ('idx_jobs_status_completion', 'status, completion_timestamp'),
+    ('idx_jobs_status_requester_completion', 'status, requested_by, completion_timestamp'),
+    # Claimable PENDING jobs: not_before has passed, lowest id first
+    ('idx_jobs_status_not_before', 'status, not_before, id'),
+]
+
+# Rows per executemany batch when create_jobs loads a job grid
+CREATE_CHUNK_SIZE = 10000
+
+# Columns shown in the paginated job tables
+PAGE_COLUMNS = "id, requested_by, request_timestamp, completion_timestamp, required_time, status"
+
+# Seconds a cached per-status job count may be reused for pagination totals
+COUNTS_CACHE_TTL = 5
+
+# A parameter value from json_each(jobs.parameters) as JSON text, the key of result_stats
+PARAM_VALUE_SQL = """CASE p.type WHEN 'true' THEN 'true' WHEN 'false' THEN 'false'
+    WHEN 'object' THEN p.value WHEN 'array' THEN p.value ELSE json_quote(p.value) END"""
+
+# Connection pool and per-connection tuning
+DEFAULT_POOL_SIZE = 8
+BUSY_TIMEOUT = 30.0  # seconds to wait on a locked database before failing
+MMAP_SIZE = 256 * 1024 * 1024  # bytes of the database file to memory-map
+CACHE_SIZE_KB = 64 * 1024  # page cache per connection (negative PRAGMA value = KiB)
+
+def _histogram_percentile(buckets: List[Tuple[float, int]], fraction: float) -> Optional[float]:
+    """Estimate a percentile from (upper bound, count) buckets sorted by bound.
+
+    Interpolates linearly inside the bucket that holds the percentile; the
+    open-ended last bucket reports its lower bound.
+    """
+    total = sum(count for _, count in buckets)
+    if total == 0:
+        return None
+    target = fraction * total
+    seen = 0
+    lower = 0.0
+    for upper, count in buckets:
+        if count and seen + count >= target:
+            if upper == float("inf"):
+                return lower
+            return round(lower + (upper - lower) * (target - seen) / count, 3)
+        seen += count
+        lower = upper
+    return lower
+
 
 class JobDatabase:
     """SQLite database handler for job distribution system."""
     
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, pool_size: int = DEFAULT_POOL_SIZE):
         self.db_path = db_path
         self.lock = threading.Lock()
+        self.pool_size = pool_size
+        self._counts_cache = (0.0, {})
+        self._reset_pool()
         self._init_database()
+
+    def _reset_pool(self):
+        """Start with an empty connection pool owned by the current process."""
+        self._pid = os.getpid()
+        self._pool = queue.LifoQueue()
+        self._pool_lock = threading.Lock()
+        self._connections = []
+        self._local = threading.local()
     
     def _init_database(self):
-        """Initialize the database with the jobs and api_stats tables."""
+        """Initialize the database with the jobs, job_events, api_stats and api_latency tables."""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
@@ -33,10 +136,89 @@ class JobDatabase:
                     required_time REAL DEFAULT 0,
                     last_ping_timestamp REAL DEFAULT 0,
                     status TEXT DEFAULT 'PENDING',
-                    message TEXT DEFAULT '[]',
+                    message TEXT DEFAULT '[]',  -- legacy history blob, migrated to job_events
+                    parameters TEXT NOT NULL,
+                    attempts INTEGER DEFAULT 0,  -- failed executions so far
+                    not_before REAL DEFAULT 0,  -- retry backoff: not claimable before this time
+                    progress REAL  -- fraction of the current run done, as last reported by the runner
+                )
+            ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_events (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    job_id INTEGER NOT NULL,
+                    ts REAL NOT NULL,
+                    kind TEXT NOT NULL,
+                    text TEXT DEFAULT ''
+                )
+            ''')
+            # Per-requester totals over DONE jobs, kept current by triggers so the
+            # dashboard never scans completed jobs
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS done_stats (
+                    requested_by TEXT PRIMARY KEY,
+                    job_count INTEGER DEFAULT 0,
+                    total_time REAL DEFAULT 0
+                )
+            ''')
+            # Optional virtual grid: jobs next_id..total-1 exist only as points of
+            # the spec and get a row when they are first handed out
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS virtual_grid (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    spec TEXT NOT NULL,
+                    total INTEGER NOT NULL,
+                    next_id INTEGER NOT NULL
+                )
+            ''')
+            # Numeric results reported with DONE, one row per (job, metric)
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_results (
+                    job_id INTEGER NOT NULL,
+                    metric TEXT NOT NULL,
+                    value REAL NOT NULL,
+                    PRIMARY KEY (job_id, metric)
+                )
+            ''')
+            # Running sums of every metric per parameter value, kept current by
+            # triggers on job_results so the dashboard never scans the results
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS result_stats (
+                    metric TEXT NOT NULL,
+                    param TEXT NOT NULL,
+                    value TEXT NOT NULL,  -- parameter value as JSON
+                    count INTEGER DEFAULT 0,
+                    total REAL DEFAULT 0,
+                    total_sq REAL DEFAULT 0,
+                    PRIMARY KEY (metric, param, value)
+                )
+            ''')
+            # Speculative second copies of SERVED jobs, at most one per job
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS job_copies (
+                    job_id INTEGER PRIMARY KEY,
+                    requested_by TEXT NOT NULL,
+                    request_timestamp REAL NOT NULL
+                )
+            ''')
+            # Sampler that generated the jobs (see samplers.py); adaptive
+            # samplers keep one trials row per job they created
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS sampler (
+                    id INTEGER PRIMARY KEY CHECK (id = 0),
+                    spec TEXT NOT NULL,
                     parameters TEXT NOT NULL
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS trials (
+                    job_id INTEGER PRIMARY KEY,
+                    bracket INTEGER NOT NULL,
+                    rung INTEGER NOT NULL,
+                    config TEXT NOT NULL,
+                    score REAL  -- objective oriented so that higher is better
+                )
+            ''')
             cursor.execute('''
                 CREATE TABLE IF NOT EXISTS api_stats (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -47,140 +229,599 @@ class JobDatabase:
                     UNIQUE(endpoint, method)
                 )
             ''')
+            cursor.execute('''
+                CREATE TABLE IF NOT EXISTS api_latency (
+                    endpoint TEXT NOT NULL,
+                    method TEXT NOT NULL,
+                    le_ms REAL NOT NULL,
+                    count INTEGER DEFAULT 0,
+                    PRIMARY KEY (endpoint, method, le_ms)
+                )
+            ''')
             
-            # Create indexes for optimal query performance
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_id ON jobs(status, id)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_last_ping ON jobs(last_ping_timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_status_ping ON jobs(status, last_ping_timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_requested_by ON jobs(requested_by)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_request_timestamp ON jobs(request_timestamp)')
-            cursor.execute('CREATE INDEX IF NOT EXISTS idx_jobs_completion_timestamp ON jobs(completion_timestamp)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_events_job_id ON job_events(job_id, id)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_trials_rung ON trials(bracket, rung, score)')
+            cursor.execute('CREATE INDEX IF NOT EXISTS idx_job_results_metric_value ON job_results(metric, value, job_id)')
+
+            # Rows are only deleted by create_jobs, which clears done_stats itself
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_done_stats_insert
+                AFTER INSERT ON jobs WHEN NEW.status = '{STATUS_DONE}'
+                BEGIN
+                    INSERT INTO done_stats (requested_by, job_count, total_time)
+                    VALUES (NEW.requested_by, 1, NEW.required_time)
+                    ON CONFLICT(requested_by) DO UPDATE SET
+                        job_count = job_count + 1,
+                        total_time = total_time + excluded.total_time;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_done_stats_update
+                AFTER UPDATE OF status, requested_by, required_time ON jobs
+                WHEN OLD.status = '{STATUS_DONE}' OR NEW.status = '{STATUS_DONE}'
+                BEGIN
+                    UPDATE done_stats
+                    SET job_count = job_count - 1, total_time = total_time - OLD.required_time
+                    WHERE OLD.status = '{STATUS_DONE}' AND requested_by = OLD.requested_by;
+                    INSERT INTO done_stats (requested_by, job_count, total_time)
+                    SELECT NEW.requested_by, 1, NEW.required_time WHERE NEW.status = '{STATUS_DONE}'
+                    ON CONFLICT(requested_by) DO UPDATE SET
+                        job_count = job_count + 1,
+                        total_time = total_time + excluded.total_time;
+                END
+            ''')
+            # Results belong to a completion; drop them when a job leaves DONE
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_job_results_reset
+                AFTER UPDATE OF status ON jobs
+                WHEN OLD.status = '{STATUS_DONE}' AND NEW.status != '{STATUS_DONE}'
+                BEGIN
+                    DELETE FROM job_results WHERE job_id = OLD.id;
+                END
+            ''')
+            # A copy only lives as long as its job is SERVED
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_job_copies_reset
+                AFTER UPDATE OF status ON jobs
+                WHEN OLD.status = '{STATUS_SERVED}' AND NEW.status != '{STATUS_SERVED}'
+                BEGIN
+                    DELETE FROM job_copies WHERE job_id = OLD.id;
+                END
+            ''')
+            job_params = f"SELECT p.key, {PARAM_VALUE_SQL} FROM jobs j, json_each(j.parameters) p"
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_result_stats_insert
+                AFTER INSERT ON job_results
+                BEGIN
+                    INSERT INTO result_stats (metric, param, value, count, total, total_sq)
+                    SELECT NEW.metric, p.key, {PARAM_VALUE_SQL}, 1, NEW.value, NEW.value * NEW.value
+                    FROM jobs j, json_each(j.parameters) p WHERE j.id = NEW.job_id
+                    ON CONFLICT(metric, param, value) DO UPDATE SET
+                        count = count + 1,
+                        total = total + excluded.total,
+                        total_sq = total_sq + excluded.total_sq;
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_result_stats_update
+                AFTER UPDATE OF value ON job_results
+                BEGIN
+                    UPDATE result_stats
+                    SET total = total + NEW.value - OLD.value,
+                        total_sq = total_sq + NEW.value * NEW.value - OLD.value * OLD.value
+                    WHERE metric = NEW.metric AND (param, value) IN ({job_params} WHERE j.id = NEW.job_id);
+                END
+            ''')
+            cursor.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS trg_result_stats_delete
+                AFTER DELETE ON job_results
+                BEGIN
+                    UPDATE result_stats
+                    SET count = count - 1,
+                        total = total - OLD.value,
+                        total_sq = total_sq - OLD.value * OLD.value
+                    WHERE metric = OLD.metric AND (param, value) IN ({job_params} WHERE j.id = OLD.job_id);
+                END
+            ''')
             
+            self._migrate(cursor)
+            # Progress belongs to one run; a status change starts over (after _migrate adds the column)
+            cursor.execute('''
+                CREATE TRIGGER IF NOT EXISTS trg_jobs_progress_reset
+                AFTER UPDATE OF status ON jobs
+                WHEN OLD.status != NEW.status AND OLD.progress IS NOT NULL
+                BEGIN
+                    UPDATE jobs SET progress = NULL WHERE id = NEW.id;
+                END
+            ''')
+            self._create_job_indexes(cursor)
             conn.commit()
             logging.info(f"Database initialized with indexes at {self.db_path}")
     
+    def _migrate(self, cursor: sqlite3.Cursor):
+        """Bring an existing database up to SCHEMA_VERSION."""
+        version = cursor.execute("PRAGMA user_version").fetchone()[0]
+
+        if version < 1:
+            # Move the JSON message arrays into job_events, one row per entry
+            cursor.execute('''
+                INSERT INTO job_events (job_id, ts, kind, text)
+                SELECT jobs.id,
+                       COALESCE(json_extract(entry.value, '$.timestamp'), 0),
+                       ?,
+                       COALESCE(json_extract(entry.value, '$.reason'), '')
+                FROM jobs,
+                     json_each(CASE WHEN json_valid(jobs.message) THEN jobs.message ELSE '[]' END) AS entry
+                WHERE jobs.message != '[]'
+                ORDER BY jobs.id, entry.key
+            ''', (EVENT_MIGRATED,))
+            migrated = cursor.rowcount
+            cursor.execute("UPDATE jobs SET message = '[]' WHERE message != '[]'")
+            if migrated > 0:
+                logging.info(f"Migrated {migrated} job history entries to job_events")
+
+        if version < 2:
+            # Seed the DONE aggregates that the triggers maintain from now on
+            cursor.execute("DELETE FROM done_stats")
+            cursor.execute('''
+                INSERT INTO done_stats (requested_by, job_count, total_time)
+                SELECT requested_by, COUNT(*), SUM(required_time)
+                FROM jobs WHERE status = ?
+                GROUP BY requested_by
+            ''', (STATUS_DONE,))
+
+        if version < 3:
+            # Retry bookkeeping for the backoff/quarantine of failing jobs
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(jobs)")}
+            if 'attempts' not in columns:
+                cursor.execute("ALTER TABLE jobs ADD COLUMN attempts INTEGER DEFAULT 0")
+            if 'not_before' not in columns:
+                cursor.execute("ALTER TABLE jobs ADD COLUMN not_before REAL DEFAULT 0")
+
+        if version < 4:
+            # Seed the per-parameter result sums that the triggers maintain from now on
+            cursor.execute("DELETE FROM result_stats")
+            cursor.execute(f'''
+                INSERT INTO result_stats (metric, param, value, count, total, total_sq)
+                SELECT r.metric, p.key, {PARAM_VALUE_SQL}, COUNT(*), SUM(r.value), SUM(r.value * r.value)
+                FROM job_results r JOIN jobs j ON j.id = r.job_id, json_each(j.parameters) p
+                GROUP BY 1, 2, 3
+            ''')
+
+        if version < 5:
+            columns = {row[1] for row in cursor.execute("PRAGMA table_info(jobs)")}
+            if 'progress' not in columns:
+                cursor.execute("ALTER TABLE jobs ADD COLUMN progress REAL")
+
+        if version < SCHEMA_VERSION:
+            cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    @staticmethod
+    def _create_job_indexes(cursor: sqlite3.Cursor):
+        """Create the secondary indexes of the jobs table (see JOB_INDEXES)."""
+        for name, columns in JOB_INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON jobs({columns})')
+
+    @staticmethod
+    def _row_to_job(row: sqlite3.Row) -> Dict[str, Any]:
+        """Convert a jobs row to a dict with decoded parameters."""
+        job = dict(row)
+        try:
+            job['parameters'] = json.loads(job['parameters'])
+        except json.JSONDecodeError:
+            job['parameters'] = {}
+        return job
+
+    @staticmethod
+    def _add_event(cursor: sqlite3.Cursor, job_id: int, kind: str, text: str, ts: float):
+        """Append one entry to a job's history."""
+        cursor.execute(
+            "INSERT INTO job_events (job_id, ts, kind, text) VALUES (?, ?, ?, ?)",
+            (job_id, ts, kind, text)
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open a new connection and apply the tuning PRAGMAs once."""
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
+        # WAL lets the server, dashboard and job_cleaner read while one of them writes
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(f"PRAGMA busy_timeout={int(BUSY_TIMEOUT * 1000)}")
+        conn.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        conn.execute(f"PRAGMA cache_size=-{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        return conn
+
+    def _acquire_connection(self) -> sqlite3.Connection:
+        """Borrow an idle pooled connection, opening one if the pool is not full."""
+        if os.getpid() != self._pid:
+            # Connections must never cross a fork; start a fresh pool in the child
+            self._reset_pool()
+        try:
+            return self._pool.get_nowait()
+        except queue.Empty:
+            pass
+        with self._pool_lock:
+            if len(self._connections) < self.pool_size:
+                conn = self._connect()
+                self._connections.append(conn)
+                return conn
+        return self._pool.get(timeout=BUSY_TIMEOUT)
+
+    def _release_connection(self, conn: sqlite3.Connection):
+        """Return a borrowed connection to the pool in a clean state."""
+        if conn.in_transaction:
+            conn.rollback()
+        self._pool.put(conn)
+
     @contextmanager
     def get_connection(self):
-        """Get a database connection with proper error handling."""
-        conn = None
+        """Get a pooled database connection with proper error handling.
+
+        Nested calls on the same thread reuse the connection already borrowed.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and getattr(self._local, "pid", None) == os.getpid():
+            yield conn
+            return
+
+        conn = self._acquire_connection()
+        self._local.conn = conn
+        self._local.pid = self._pid
         try:
-            conn = sqlite3.connect(self.db_path, timeout=30.0)
-            conn.row_factory = sqlite3.Row  # Enable dict-like access to rows
             yield conn
         except Exception as e:
-            if conn:
-                conn.rollback()
+            conn.rollback()
             logging.error(f"Database error: {e}")
             raise
         finally:
-            if conn:
-                conn.close()
+            self._local.conn = None
+            self._release_connection(conn)
+
+    def close(self):
+        """Close every pooled connection."""
+        with self._pool_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._connections = []
+            self._pool = queue.LifoQueue()
     
-    def create_jobs(self, parameters_list: List[str], clear_api_stats: bool = True) -> int:
-        """Create multiple jobs from a list of parameter strings."""
+    def create_jobs(self, parameters_list: Iterable[str], clear_api_stats: bool = True,
+                    chunk_size: int = CREATE_CHUNK_SIZE) -> int:
+        """Create jobs from an iterable of parameter strings, replacing all existing jobs.
+
+        The parameters are consumed lazily in batches of `chunk_size` rows,
+        so a generator keeps memory flat however large the grid is. The load
+        runs in one transaction with the secondary indexes dropped, and the
+        indexes are rebuilt once at the end.
+        """
         with self.lock:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                
-                # Clear existing jobs
-                cursor.execute("DELETE FROM jobs")
-                
-                # Clear API stats if requested (for fresh starts)
-                if clear_api_stats:
-                    cursor.execute("DELETE FROM api_stats")
-                    logging.info("API stats cleared for fresh start")
-                
-                # Insert new jobs
-                jobs_data = []
-                for i, params in enumerate(parameters_list):
-                    jobs_data.append((
-                        i,  # id
-                        '',  # requested_by
-                        0,   # request_timestamp
-                        0,   # completion_timestamp
-                        0,   # required_time
-                        0,   # last_ping_timestamp
-                        STATUS_PENDING,  # status
-                        '[]',  # message
-                        params  # parameters
-                    ))
-                
-                cursor.executemany('''
-                    INSERT INTO jobs 
-                    (id, requested_by, request_timestamp, completion_timestamp, 
-                     required_time, last_ping_timestamp, status, message, parameters)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
-                ''', jobs_data)
-                
+                cursor.execute("BEGIN IMMEDIATE")
+                for name, _ in JOB_INDEXES:
+                    cursor.execute(f"DROP INDEX IF EXISTS {name}")
+                self._clear_jobs(cursor, clear_api_stats)
+
+                # Insert new jobs; the other columns take their defaults
+                total_jobs = 0
+                jobs = enumerate(parameters_list)
+                while True:
+                    chunk = list(islice(jobs, chunk_size))
+                    if not chunk:
+                        break
+                    cursor.executemany(
+                        "INSERT INTO jobs (id, status, parameters) VALUES (?, ?, ?)",
+                        ((job_id, STATUS_PENDING, params) for job_id, params in chunk)
+                    )
+                    total_jobs += len(chunk)
+
+                # Let the index builds sort in temporary files rather than in memory
+                cursor.execute("PRAGMA temp_store=FILE")
+                self._create_job_indexes(cursor)
+                cursor.execute("PRAGMA temp_store=MEMORY")
                 conn.commit()
-                total_jobs = len(parameters_list)
+                self._counts_cache = (0.0, {})
                 logging.info(f"Created {total_jobs} jobs in database")
                 return total_jobs
-    
-    def get_all_jobs(self) -> List[Dict[str, Any]]:
-        """Get all jobs from the database."""
-        with self.get_connection() as conn:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM jobs ORDER BY id")
-            rows = cursor.fetchall()
-            
-            jobs = []
-            for row in rows:
-                job = dict(row)
-                # Parse JSON fields
-                try:
-                    job['message'] = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    job['message'] = []
-                try:
-                    job['parameters'] = json.loads(job['parameters'])
-                except json.JSONDecodeError:
-                    job['parameters'] = {}
-                jobs.append(job)
-            
-            return jobs
-    
-    def track_api_request(self, endpoint: str, method: str):
-        """Track an API request by incrementing the counter."""
+
+    def create_virtual_jobs(self, parameters_dict: Dict[str, List[Any]], clear_api_stats: bool = True) -> int:
+        """Replace all jobs with a virtual grid over `parameters_dict` without writing job rows.
+
+        Job ids number the points of the Cartesian product in
+        itertools.product order; a job's row (with its decoded parameters) is
+        only written when it is first handed out, see _take_grid_jobs.
+        """
+        total_jobs = grid_size(parameters_dict)
         with self.lock:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
-                now = time.time()
-                
-                # Insert or update the API stats
-                cursor.execute('''
-                    INSERT INTO api_stats (endpoint, method, request_count, last_updated)
-                    VALUES (?, ?, 1, ?)
-                    ON CONFLICT(endpoint, method) 
-                    DO UPDATE SET 
-                        request_count = request_count + 1,
-                        last_updated = ?
-                ''', (endpoint, method, now, now))
-                
+                cursor.execute("BEGIN IMMEDIATE")
+                self._clear_jobs(cursor, clear_api_stats)
+                cursor.execute(
+                    "INSERT INTO virtual_grid (id, spec, total, next_id) VALUES (0, ?, ?, 0)",
+                    (json.dumps(parameters_dict), total_jobs)
+                )
                 conn.commit()
+                self._counts_cache = (0.0, {})
+                logging.info(f"Created a virtual grid of {total_jobs} jobs in database")
+                return total_jobs
+
+    @staticmethod
+    def _clear_jobs(cursor: sqlite3.Cursor, clear_api_stats: bool):
+        """Delete all jobs, their history and any virtual grid."""
+        cursor.execute("DELETE FROM jobs")
+        cursor.execute("DELETE FROM job_events")
+        cursor.execute("DELETE FROM done_stats")
+        cursor.execute("DELETE FROM job_results")
+        cursor.execute("DELETE FROM result_stats")
+        cursor.execute("DELETE FROM job_copies")
+        cursor.execute("DELETE FROM virtual_grid")
+        cursor.execute("DELETE FROM sampler")
+        cursor.execute("DELETE FROM trials")
+
+        # Clear API stats if requested (for fresh starts)
+        if clear_api_stats:
+            cursor.execute("DELETE FROM api_stats")
+            cursor.execute("DELETE FROM api_latency")
+            logging.info("API stats cleared for fresh start")
+
+    @staticmethod
+    def _take_grid_jobs(cursor: sqlite3.Cursor, count: int, status: str, requested_by: str = '',
+                        timestamp: float = 0) -> List[Dict[str, Any]]:
+        """Materialize the next `count` untouched grid points as rows with `status`.
+
+        Must run inside the caller's BEGIN IMMEDIATE transaction. Returns the
+        new jobs (empty without a virtual grid or once it is used up).
+        """
+        cursor.execute("SELECT spec, total, next_id FROM virtual_grid WHERE id = 0")
+        grid = cursor.fetchone()
+        if not grid or grid['next_id'] >= grid['total'] or count <= 0:
+            return []
+        spec = json.loads(grid['spec'])
+        first_id = grid['next_id']
+        last_id = min(first_id + count, grid['total'])
+
+        jobs = [{
+            'id': job_id, 'requested_by': requested_by, 'request_timestamp': timestamp,
+            'completion_timestamp': 0, 'required_time': 0, 'last_ping_timestamp': timestamp,
+            'status': status, 'parameters': grid_point(spec, job_id),
+            'attempts': 0, 'not_before': 0,
+        } for job_id in range(first_id, last_id)]
+        cursor.executemany('''
+            INSERT INTO jobs (id, requested_by, request_timestamp, last_ping_timestamp, status, parameters)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [(job['id'], requested_by, timestamp, timestamp, status, json.dumps(job['parameters']))
+              for job in jobs])
+        cursor.execute("UPDATE virtual_grid SET next_id = ? WHERE id = 0", (last_id,))
+        return jobs
+
+    def materialize_virtual_jobs(self, count: int) -> List[int]:
+        """Write PENDING rows for the next `count` untouched grid points and return their ids."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            jobs = self._take_grid_jobs(cursor, count, STATUS_PENDING)
+            conn.commit()
+            return [job['id'] for job in jobs]
+
+    def get_virtual_grid(self) -> Optional[Dict[str, Any]]:
+        """Get the virtual grid's spec, total and next untouched id, or None without one."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT spec, total, next_id FROM virtual_grid WHERE id = 0")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'spec': json.loads(row['spec']), 'total': row['total'], 'next_id': row['next_id']}
+
+    def set_sampler(self, spec: Dict[str, Any], parameters_dict: Dict[str, List[Any]],
+                    trials: List[Tuple[int, int, int, Dict[str, Any]]] = ()):
+        """Record the sampler that generated the jobs, with (job_id, bracket, rung, config) trials."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(
+                "INSERT OR REPLACE INTO sampler (id, spec, parameters) VALUES (0, ?, ?)",
+                (json.dumps(spec), json.dumps(parameters_dict))
+            )
+            cursor.executemany(
+                "INSERT INTO trials (job_id, bracket, rung, config) VALUES (?, ?, ?, ?)",
+                [(job_id, bracket, rung, json.dumps(config)) for job_id, bracket, rung, config in trials]
+            )
+            conn.commit()
+
+    def get_sampler(self) -> Optional[Dict[str, Any]]:
+        """Get the sampler spec and parameter spec of the jobs, or None if none was recorded."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT spec, parameters FROM sampler WHERE id = 0")
+            row = cursor.fetchone()
+            if not row:
+                return None
+            return {'spec': json.loads(row['spec']), 'parameters': json.loads(row['parameters'])}
+
+    def get_trial(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get the bracket, rung, config and score of the trial run by `job_id`."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT * FROM trials WHERE job_id = ?", (job_id,))
+            row = cursor.fetchone()
+            if not row:
+                return None
+            trial = dict(row)
+            trial['config'] = json.loads(trial['config'])
+            return trial
+
+    def set_trial_score(self, job_id: int, score: Optional[float]) -> bool:
+        """Store the objective a finished trial reported."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE trials SET score = ? WHERE job_id = ?", (score, job_id))
+            conn.commit()
+            return cursor.rowcount > 0
+
+    def has_open_trials(self) -> bool:
+        """Whether an adaptive sampler may still create jobs.
+
+        True while a trial has not finished (DONE or QUARANTINED) or a scored
+        rung below its bracket's top has not been promoted yet.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT 1 FROM trials t JOIN jobs j ON j.id = t.job_id
+                WHERE j.status NOT IN (?, ?)
+                   OR (t.rung < t.bracket AND t.score IS NOT NULL AND NOT EXISTS (
+                       SELECT 1 FROM trials n WHERE n.bracket = t.bracket AND n.rung = t.rung + 1))
+                LIMIT 1
+            ''', (STATUS_DONE, STATUS_QUARANTINED))
+            return cursor.fetchone() is not None
+
+    def promote_trials(self, bracket: int, rung: int, keep: int,
+                       make_parameters: Callable[[Dict[str, Any]], Dict[str, Any]]) -> List[int]:
+        """Create PENDING jobs for the best `keep` configs of a finished rung.
+
+        Does nothing (and returns []) until every trial of the rung is DONE or
+        QUARANTINED, or once the next rung exists, so concurrent callers
+        promote a rung exactly once. `make_parameters` turns a config into the
+        job parameters of the next rung. Returns the new job ids.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute("SELECT 1 FROM trials WHERE bracket = ? AND rung = ? LIMIT 1", (bracket, rung + 1))
+            if cursor.fetchone():
+                conn.rollback()
+                return []
+            cursor.execute('''
+                SELECT COUNT(*) AS total, COALESCE(SUM(j.status IN (?, ?)), 0) AS finished
+                FROM trials t JOIN jobs j ON j.id = t.job_id
+                WHERE t.bracket = ? AND t.rung = ?
+            ''', (STATUS_DONE, STATUS_QUARANTINED, bracket, rung))
+            row = cursor.fetchone()
+            if row['total'] == 0 or row['finished'] < row['total']:
+                conn.rollback()
+                return []
+
+            cursor.execute('''
+                SELECT t.config FROM trials t JOIN jobs j ON j.id = t.job_id
+                WHERE t.bracket = ? AND t.rung = ? AND j.status = ? AND t.score IS NOT NULL
+                ORDER BY t.score DESC, t.job_id
+                LIMIT ?
+            ''', (bracket, rung, STATUS_DONE, keep))
+            configs = [json.loads(row['config']) for row in cursor.fetchall()]
+            if not configs:
+                conn.rollback()
+                return []
+
+            cursor.execute("SELECT COALESCE(MAX(id), -1) + 1 AS next_id FROM jobs")
+            first_id = cursor.fetchone()['next_id']
+            job_ids = list(range(first_id, first_id + len(configs)))
+            now = time.time()
+            cursor.executemany(
+                "INSERT INTO jobs (id, status, parameters) VALUES (?, ?, ?)",
+                [(job_id, STATUS_PENDING, json.dumps(make_parameters(config)))
+                 for job_id, config in zip(job_ids, configs)]
+            )
+            cursor.executemany(
+                "INSERT INTO trials (job_id, bracket, rung, config) VALUES (?, ?, ?, ?)",
+                [(job_id, bracket, rung + 1, json.dumps(config)) for job_id, config in zip(job_ids, configs)]
+            )
+            # The event lets the server's pending queue pick the new jobs up
+            cursor.executemany(
+                "INSERT INTO job_events (job_id, ts, kind, text) VALUES (?, ?, ?, ?)",
+                [(job_id, now, EVENT_CREATED, f"Promoted to rung {rung + 1} of bracket {bracket}")
+                 for job_id in job_ids]
+            )
+            conn.commit()
+            self._counts_cache = (0.0, {})
+            return job_ids
+
+    def get_all_jobs(self) -> List[Dict[str, Any]]:
+        """Get all jobs from the database (without their history)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs ORDER BY id")
+            return [self._row_to_job(row) for row in cursor.fetchall()]
     
-    def get_api_stats(self) -> List[Dict[str, Any]]:
-        """Get API request statistics."""
+    def record_api_stats(self, counts: Dict[Tuple[str, str], Tuple[int, float]],
+                         latency: Dict[Tuple[str, str], Dict[float, int]]):
+        """Add buffered request counts and latency histograms in one transaction.
+
+        `counts` maps (endpoint, method) to (request_count, last_updated) and
+        `latency` maps (endpoint, method) to {bucket upper bound in ms: count}.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
+            cursor.executemany('''
+                INSERT INTO api_stats (endpoint, method, request_count, last_updated)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(endpoint, method) 
+                DO UPDATE SET 
+                    request_count = request_count + excluded.request_count,
+                    last_updated = MAX(last_updated, excluded.last_updated)
+            ''', [(endpoint, method, count, updated)
+                  for (endpoint, method), (count, updated) in counts.items()])
+            cursor.executemany('''
+                INSERT INTO api_latency (endpoint, method, le_ms, count)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT(endpoint, method, le_ms)
+                DO UPDATE SET count = count + excluded.count
+            ''', [(endpoint, method, le_ms, count)
+                  for (endpoint, method), buckets in latency.items()
+                  for le_ms, count in buckets.items()])
+            conn.commit()
+    
+    def get_api_stats(self, unflushed_counts: Dict[Tuple[str, str], Tuple[int, float]] = None,
+                      unflushed_latency: Dict[Tuple[str, str], Dict[float, int]] = None) -> List[Dict[str, Any]]:
+        """Get API request statistics with p50/p95/p99 latency in milliseconds.
+
+        `unflushed_counts` and `unflushed_latency` (shaped as for
+        record_api_stats) are added to the stored totals, so a caller can
+        include requests it has not written yet without writing them.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT endpoint, method, le_ms, count
+                FROM api_latency
+            ''')
+            histograms = defaultdict(lambda: defaultdict(int))
+            for row in cursor.fetchall():
+                histograms[(row['endpoint'], row['method'])][row['le_ms']] += row['count']
+
             cursor.execute('''
                 SELECT endpoint, method, request_count, last_updated 
-                FROM api_stats 
-                ORDER BY request_count DESC
+                FROM api_stats
             ''')
-            rows = cursor.fetchall()
-            
-            stats = []
-            for row in rows:
-                stats.append({
-                    'endpoint': row['endpoint'],
-                    'method': row['method'],
-                    'request_count': row['request_count'],
-                    'last_updated': row['last_updated']
-                })
-            
-            return stats
+            totals = {(row['endpoint'], row['method']): (row['request_count'], row['last_updated'])
+                      for row in cursor.fetchall()}
+
+        for key, (count, updated) in (unflushed_counts or {}).items():
+            stored_count, stored_updated = totals.get(key, (0, 0))
+            totals[key] = (stored_count + count, max(stored_updated or 0, updated))
+        for key, buckets in (unflushed_latency or {}).items():
+            for le_ms, count in buckets.items():
+                histograms[key][le_ms] += count
+
+        stats = []
+        for (endpoint, method), (count, updated) in sorted(totals.items(), key=lambda item: -item[1][0]):
+            buckets = sorted(histograms.get((endpoint, method), {}).items())
+            stats.append({
+                'endpoint': endpoint,
+                'method': method,
+                'request_count': count,
+                'last_updated': updated,
+                'p50_ms': _histogram_percentile(buckets, 0.50),
+                'p95_ms': _histogram_percentile(buckets, 0.95),
+                'p99_ms': _histogram_percentile(buckets, 0.99)
+            })
+        return stats
     
     def clear_api_stats(self) -> bool:
         """Clear all API request statistics."""
@@ -188,6 +829,7 @@ class JobDatabase:
             with self.get_connection() as conn:
                 cursor = conn.cursor()
                 cursor.execute("DELETE FROM api_stats")
+                cursor.execute("DELETE FROM api_latency")
                 conn.commit()
                 logging.info("API stats cleared")
                 return True
@@ -224,38 +866,55 @@ class JobDatabase:
             }
     
     def get_job_by_id(self, job_id: int) -> Optional[Dict[str, Any]]:
-        """Get a specific job by ID."""
+        """Get a specific job by ID, including its history as `message`."""
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM jobs WHERE id = ?", (job_id,))
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,))
             row = cursor.fetchone()
             
             if row:
-                job = dict(row)
-                # Parse JSON fields
-                try:
-                    job['message'] = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    job['message'] = []
-                try:
-                    job['parameters'] = json.loads(job['parameters'])
-                except json.JSONDecodeError:
-                    job['parameters'] = {}
+                job = self._row_to_job(row)
+                job['message'] = self.get_job_events(job_id)
                 return job
-            return None
 
-    def get_jobs_paginated(self, page: int = 1, per_page: int = 50, status: str = None, search_job_id: str = None) -> Dict[str, Any]:
+        grid = self.get_virtual_grid()
+        if grid and grid['next_id'] <= job_id < grid['total']:
+            # Untouched virtual job: decode it without writing a row
+            return {'id': job_id, 'requested_by': '', 'request_timestamp': 0, 'completion_timestamp': 0,
+                    'required_time': 0, 'last_ping_timestamp': 0, 'status': STATUS_PENDING,
+                    'parameters': grid_point(grid['spec'], job_id), 'attempts': 0,
+                    'not_before': 0, 'message': []}
+        return None
+
+    def get_job_events(self, job_id: int) -> List[Dict[str, Any]]:
+        """Get the history of a job, oldest first."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT ts, kind, text FROM job_events WHERE job_id = ? ORDER BY id",
+                (job_id,)
+            )
+            return [
+                {'kind': row['kind'], 'reason': row['text'], 'timestamp': row['ts']}
+                for row in cursor.fetchall()
+            ]
+
+    def get_jobs_paginated(self, page: int = 1, per_page: int = 50, status: str = None, search_job_id: str = None,
+                           after_id: int = None, before_id: int = None) -> Dict[str, Any]:
         """
-        Get jobs with pagination support.
+        Get one page of job summaries using keyset pagination on (status, id).
         
         Args:
-            page: Page number (1-based)
+            page: Page number (1-based); only used as an OFFSET when no cursor is given
             per_page: Number of jobs per page
             status: Filter by status (optional)
             search_job_id: Search by job ID (optional)
+            after_id: Return the page right after this job ID (optional)
+            before_id: Return the page right before this job ID (optional)
         
         Returns:
-            Dict with jobs, total_count, total_pages, current_page
+            Dict with jobs, total_count, total_pages, current_page, per_page,
+            has_prev and has_next. Totals come from the cached status counts.
         """
         with self.get_connection() as conn:
             cursor = conn.cursor()
@@ -271,323 +930,600 @@ class JobDatabase:
             if search_job_id:
                 where_conditions.append("id = ?")
                 params.append(int(search_job_id))
-            
-            where_clause = " WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-            
-            # Get total count
-            count_query = f"SELECT COUNT(*) as count FROM jobs{where_clause}"
-            cursor.execute(count_query, params)
-            total_count = cursor.fetchone()['count']
-            
-            # Calculate pagination
-            total_pages = (total_count + per_page - 1) // per_page
-            offset = (page - 1) * per_page
-            
-            # Get jobs for current page
-            jobs_query = f"""
-                SELECT * FROM jobs{where_clause}
-                ORDER BY id
-                LIMIT ? OFFSET ?
-            """
-            cursor.execute(jobs_query, params + [per_page, offset])
-            rows = cursor.fetchall()
-            
-            jobs = []
-            for row in rows:
-                job = dict(row)
-                # Parse JSON fields
-                try:
-                    job['message'] = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    job['message'] = []
-                try:
-                    job['parameters'] = json.loads(job['parameters'])
-                except json.JSONDecodeError:
-                    job['parameters'] = {}
-                jobs.append(job)
-            
-            return {
-                'jobs': jobs,
-                'total_count': total_count,
-                'total_pages': total_pages,
-                'current_page': page,
-                'per_page': per_page
-            }
+
+            def where(*extra):
+                conditions = where_conditions + list(extra)
+                return " WHERE " + " AND ".join(conditions) if conditions else ""
+
+            # Seek straight to the page through idx_jobs_status_id (or the primary key)
+            if before_id is not None:
+                cursor.execute(f"""
+                    SELECT {PAGE_COLUMNS} FROM jobs{where("id < ?")}
+                    ORDER BY id DESC
+                    LIMIT ?
+                """, params + [before_id, per_page])
+                rows = cursor.fetchall()[::-1]
+            elif after_id is not None:
+                cursor.execute(f"""
+                    SELECT {PAGE_COLUMNS} FROM jobs{where("id > ?")}
+                    ORDER BY id
+                    LIMIT ?
+                """, params + [after_id, per_page])
+                rows = cursor.fetchall()
+            else:
+                cursor.execute(f"""
+                    SELECT {PAGE_COLUMNS} FROM jobs{where()}
+                    ORDER BY id
+                    LIMIT ? OFFSET ?
+                """, params + [per_page, (page - 1) * per_page])
+                rows = cursor.fetchall()
+            jobs = [dict(row) for row in rows]
+
+            has_prev = has_next = False
+            if jobs:
+                cursor.execute(f"SELECT EXISTS(SELECT 1 FROM jobs{where('id < ?')}) AS found",
+                               params + [jobs[0]['id']])
+                has_prev = bool(cursor.fetchone()['found'])
+                cursor.execute(f"SELECT EXISTS(SELECT 1 FROM jobs{where('id > ?')}) AS found",
+                               params + [jobs[-1]['id']])
+                has_next = bool(cursor.fetchone()['found'])
+
+        # Get total count
+        if search_job_id:
+            total_count = len(jobs)
+        else:
+            counts = self.get_job_counts_by_status(max_age=COUNTS_CACHE_TTL)
+            total_count = counts.get(status, 0) if status else sum(counts.values())
+        
+        # Calculate pagination
+        total_pages = (total_count + per_page - 1) // per_page
+        
+        return {
+            'jobs': jobs,
+            'total_count': total_count,
+            'total_pages': total_pages,
+            'current_page': page,
+            'per_page': per_page,
+            'has_prev': has_prev,
+            'has_next': has_next
+        }
     
     def request_job(self, requested_by: str) -> Optional[Dict[str, Any]]:
         """Assign a PENDING job to a requester and mark it as SERVED."""
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Find first PENDING job
-                cursor.execute(
-                    "SELECT * FROM jobs WHERE status = ? ORDER BY id LIMIT 1",
-                    (STATUS_PENDING,)
+        jobs = self.request_jobs(requested_by, 1)
+        return jobs[0] if jobs else None
+
+    def request_jobs(self, requested_by: str, count: int) -> List[Dict[str, Any]]:
+        """Lease up to `count` PENDING jobs to a requester and mark them as SERVED.
+
+        The claim is a single UPDATE ... RETURNING inside BEGIN IMMEDIATE, so
+        concurrent claimers in any number of threads or processes can never be
+        handed the same job. The lease starts at claim time, so jobs a runner
+        has prefetched but not started yet are not reset as stale. Jobs still
+        in retry backoff are skipped through idx_jobs_status_not_before, which
+        hands out never-failed jobs (not_before = 0) first.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            timestamp = time.time()
+            reason = f"{requested_by} requests this job for execution"
+
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f'''
+                UPDATE jobs
+                SET requested_by = ?, status = ?, request_timestamp = ?, last_ping_timestamp = ?
+                WHERE id IN (
+                    SELECT id FROM jobs WHERE status = ? AND not_before <= ?
+                    ORDER BY not_before, id LIMIT ?
                 )
-                row = cursor.fetchone()
-                
-                if not row:
-                    return None
-                
-                job = dict(row)
-                timestamp = time.time()
-                
-                # Parse existing messages
+                RETURNING {JOB_COLUMNS}
+            ''', (requested_by, STATUS_SERVED, timestamp, timestamp, STATUS_PENDING, timestamp, count))
+            jobs = [self._row_to_job(row) for row in cursor.fetchall()]
+            # RETURNING does not guarantee order; hand jobs out in claim order
+            jobs.sort(key=lambda job: (job['not_before'], job['id']))
+            # Top up from the untouched points of a virtual grid, if there is one
+            if len(jobs) < count:
+                jobs += self._take_grid_jobs(cursor, count - len(jobs), STATUS_SERVED, requested_by, timestamp)
+
+            cursor.executemany(
+                "INSERT INTO job_events (job_id, ts, kind, text) VALUES (?, ?, ?, ?)",
+                [(job['id'], timestamp, EVENT_REQUESTED, reason) for job in jobs]
+            )
+            conn.commit()
+            return jobs
+    
+    def get_pending_jobs(self, job_ids: List[int] = None) -> Dict[int, float]:
+        """Get {job_id: not_before} of PENDING jobs, all of them or only those in `job_ids`."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if job_ids is None:
+                cursor.execute("SELECT id, not_before FROM jobs WHERE status = ?", (STATUS_PENDING,))
+            else:
+                cursor.execute('''
+                    SELECT id, not_before FROM jobs
+                    WHERE status = ? AND id IN (SELECT value FROM json_each(?))
+                ''', (STATUS_PENDING, json.dumps(job_ids)))
+            return {row['id']: row['not_before'] for row in cursor.fetchall()}
+
+    def get_job_parameters(self, job_ids: List[int]) -> Dict[int, Any]:
+        """Get the decoded parameters of several jobs by id."""
+        if not job_ids:
+            return {}
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, parameters FROM jobs WHERE id IN (SELECT value FROM json_each(?))",
+                (json.dumps(job_ids),)
+            )
+            parameters = {}
+            for row in cursor.fetchall():
                 try:
-                    messages = json.loads(job['message'])
+                    parameters[row['id']] = json.loads(row['parameters'])
                 except json.JSONDecodeError:
-                    messages = []
-                
-                # Add new message
-                messages.append({
-                    "reason": f"{requested_by} requests this job for execution",
-                    "timestamp": timestamp
-                })
-                
-                # Update job
-                cursor.execute('''
-                    UPDATE jobs 
-                    SET requested_by = ?, status = ?, request_timestamp = ?, message = ?
-                    WHERE id = ?
-                ''', (requested_by, STATUS_SERVED, timestamp, json.dumps(messages), job['id']))
-                
-                conn.commit()
-                
-                # Return updated job
-                job['requested_by'] = requested_by
-                job['status'] = STATUS_SERVED
-                job['request_timestamp'] = timestamp
-                job['message'] = messages
+                    parameters[row['id']] = {}
+            return parameters
+
+    def iter_pending_parameters(self) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """Yield (job_id, parameters) of every PENDING job, streaming rather than loading them all."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, parameters FROM jobs WHERE status = ?", (STATUS_PENDING,))
+            for row in cursor:
                 try:
-                    job['parameters'] = json.loads(job['parameters'])
+                    yield row['id'], json.loads(row['parameters'])
                 except json.JSONDecodeError:
-                    job['parameters'] = {}
-                
-                return job
-    
-    def update_job_status(self, job_id: int, status: str, message: str = "") -> bool:
-        """Update job status to DONE or ABORTED."""
+                    yield row['id'], {}
+
+    def persist_claims(self, claims: List[Tuple[int, str, float]]) -> List[int]:
+        """Write a batch of in-memory claims (job_id, requested_by, timestamp) in one transaction.
+
+        A claim is only applied while the job is still PENDING. Returns the ids
+        that were written.
+        """
+        if not claims:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            persisted = []
+            for job_id, requested_by, timestamp in claims:
+                cursor.execute('''
+                    UPDATE jobs
+                    SET requested_by = ?, status = ?, request_timestamp = ?, last_ping_timestamp = ?
+                    WHERE id = ? AND status = ?
+                ''', (requested_by, STATUS_SERVED, timestamp, timestamp, job_id, STATUS_PENDING))
+                if cursor.rowcount:
+                    persisted.append((job_id, requested_by, timestamp))
+            cursor.executemany(
+                "INSERT INTO job_events (job_id, ts, kind, text) VALUES (?, ?, ?, ?)",
+                [(job_id, timestamp, EVENT_REQUESTED, f"{requested_by} requests this job for execution")
+                 for job_id, requested_by, timestamp in persisted]
+            )
+            conn.commit()
+            return [job_id for job_id, _, _ in persisted]
+
+    def get_last_event_id(self) -> int:
+        """Get the id of the newest job_events row (0 if there is none)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), 0) AS last_id FROM job_events")
+            return cursor.fetchone()['last_id']
+
+    def get_job_changes_since(self, event_id: int) -> Tuple[int, Dict[int, str]]:
+        """Get the current status of every job with history newer than `event_id`.
+
+        Lets a process follow transitions made by other processes (cleaner
+        resets, manual status changes) by tailing job_events. Returns the id
+        of the newest event seen and a {job_id: status} map.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT COALESCE(MAX(id), ?) AS last_id FROM job_events", (event_id,))
+            last_id = cursor.fetchone()['last_id']
+            cursor.execute('''
+                SELECT DISTINCT e.job_id, j.status
+                FROM job_events e JOIN jobs j ON j.id = e.job_id
+                WHERE e.id > ? AND e.id <= ?
+            ''', (event_id, last_id))
+            changes = {row['job_id']: row['status'] for row in cursor.fetchall()}
+            return last_id, changes
+
+    def get_served_leases(self, job_ids: List[int] = None) -> Dict[int, float]:
+        """Get the last ping time of SERVED jobs, all of them or only those in `job_ids`."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            if job_ids is None:
+                cursor.execute(
+                    "SELECT id, last_ping_timestamp FROM jobs WHERE status = ?", (STATUS_SERVED,))
+            else:
+                cursor.execute('''
+                    SELECT id, last_ping_timestamp FROM jobs
+                    WHERE status = ? AND id IN (SELECT value FROM json_each(?))
+                ''', (STATUS_SERVED, json.dumps(job_ids)))
+            return {row['id']: row['last_ping_timestamp'] for row in cursor.fetchall()}
+
+    def update_job_status(self, job_id: int, status: str, message: str = "",
+                          metrics: Optional[Dict[str, float]] = None, requested_by: str = None) -> bool:
+        """Update job status to DONE or ABORTED, storing the numeric `metrics` of a DONE job.
+
+        With a speculative copy running, `requested_by` says which copy
+        reports: a DONE from the copy credits the copy's requester, and an
+        ABORTED from either copy only drops that copy while the other keeps
+        the job SERVED.
+        """
         if status not in [STATUS_DONE, STATUS_ABORTED]:
             return False
         
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get current job
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+
+            if requested_by and self._resolve_copy(cursor, job_id, status, requested_by, now):
+                conn.commit()
+                return True
+
+            cursor.execute('''
+                UPDATE jobs 
+                SET status = ?, completion_timestamp = ?, required_time = ? - request_timestamp
+                WHERE id = ? AND status = ?
+            ''', (status, now, now, job_id, STATUS_SERVED))
+
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+
+            if status == STATUS_DONE and metrics:
+                # job_results.value is REAL NOT NULL: a bad metric must not roll back the status change
+                finite = {metric: value for metric, value in metrics.items()
+                          if isinstance(value, (int, float)) and not isinstance(value, bool)
+                          and math.isfinite(value)}
+                if len(finite) < len(metrics):
+                    logging.warning(
+                        f"Job {job_id}: not storing non-finite metrics {sorted(set(metrics) - set(finite))}")
+                cursor.executemany('''
+                    INSERT INTO job_results (job_id, metric, value) VALUES (?, ?, ?)
+                    ON CONFLICT(job_id, metric) DO UPDATE SET value = excluded.value
+                ''', [(job_id, metric, value) for metric, value in finite.items()])
+
+            kind = EVENT_DONE if status == STATUS_DONE else EVENT_ABORTED
+            self._add_event(cursor, job_id, kind, message if message else "No reason provided", now)
+            conn.commit()
+            return True
+
+    @classmethod
+    def _resolve_copy(cls, cursor: sqlite3.Cursor, job_id: int, status: str, requested_by: str,
+                      now: float) -> bool:
+        """Apply a report from one copy of a speculatively duplicated job.
+
+        Returns True if the report was fully handled here (a failed copy was
+        dropped), False if the job's status should be updated as usual.
+        """
+        cursor.execute('''
+            SELECT c.requested_by AS copy_requester, c.request_timestamp AS copy_timestamp,
+                   j.requested_by
+            FROM job_copies c JOIN jobs j ON j.id = c.job_id
+            WHERE c.job_id = ? AND j.status = ?
+        ''', (job_id, STATUS_SERVED))
+        row = cursor.fetchone()
+        if not row or requested_by not in (row['copy_requester'], row['requested_by']):
+            return False
+        from_copy = requested_by == row['copy_requester']
+
+        if status == STATUS_DONE:
+            if from_copy:
+                # The copy won: the job's run is the copy's
                 cursor.execute(
-                    "SELECT * FROM jobs WHERE id = ? AND status = ?",
-                    (job_id, STATUS_SERVED)
+                    "UPDATE jobs SET requested_by = ?, request_timestamp = ? WHERE id = ?",
+                    (row['copy_requester'], row['copy_timestamp'], job_id)
                 )
-                row = cursor.fetchone()
-                
-                if not row:
-                    return False
-                
-                job = dict(row)
-                now = time.time()
-                required_time = now - job['request_timestamp']
-                
-                # Parse existing messages
-                try:
-                    messages = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    messages = []
-                
-                # Add new message
-                messages.append({
-                    "reason": message if message else "No reason provided",
-                    "timestamp": now
+            return False
+
+        if not from_copy:
+            # The original failed: the copy carries on as the job's only run
+            cursor.execute(
+                "UPDATE jobs SET requested_by = ?, request_timestamp = ? WHERE id = ?",
+                (row['copy_requester'], row['copy_timestamp'], job_id)
+            )
+        cursor.execute("DELETE FROM job_copies WHERE job_id = ?", (job_id,))
+        cls._add_event(cursor, job_id, EVENT_ABORTED,
+                       f"Copy on {requested_by} failed; the other copy keeps running", now)
+        return True
+
+    def get_served_jobs(self) -> List[Dict[str, Any]]:
+        """Get id, requester, claim time, parameters, progress and copy requester of every SERVED job."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT j.id, j.requested_by, j.request_timestamp, j.parameters, j.progress,
+                       c.requested_by AS copy_requested_by
+                FROM jobs j LEFT JOIN job_copies c ON c.job_id = j.id
+                WHERE j.status = ?
+            ''', (STATUS_SERVED,))
+            return [self._row_to_job(row) for row in cursor.fetchall()]
+
+    def add_job_copy(self, job_id: int, requested_by: str) -> bool:
+        """Lease a speculative second copy of a SERVED job to `requested_by`."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            now = time.time()
+            cursor.execute('''
+                INSERT INTO job_copies (job_id, requested_by, request_timestamp)
+                SELECT id, ?, ? FROM jobs WHERE id = ? AND status = ? AND requested_by != ?
+                ON CONFLICT(job_id) DO NOTHING
+            ''', (requested_by, now, job_id, STATUS_SERVED, requested_by))
+            if cursor.rowcount == 0:
+                conn.rollback()
+                return False
+            self._add_event(cursor, job_id, EVENT_SPECULATED,
+                            f"{requested_by} runs a speculative copy of this job", now)
+            conn.commit()
+            return True
+
+    def get_result_metrics(self) -> List[str]:
+        """Get the names of all metrics reported by DONE jobs."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT DISTINCT metric FROM result_stats WHERE count > 0 ORDER BY metric")
+            return [row['metric'] for row in cursor.fetchall()]
+
+    def get_result_marginals(self, metric: str) -> List[Dict[str, Any]]:
+        """Get count, mean and standard deviation of `metric` for every parameter value.
+
+        Read from the result_stats sums, so the cost depends on the number of
+        distinct parameter values, not on the number of results.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT param, value, count, total, total_sq FROM result_stats
+                WHERE metric = ? AND count > 0
+                ORDER BY param
+            ''', (metric,))
+            marginals = []
+            for row in cursor.fetchall():
+                mean = row['total'] / row['count']
+                variance = max(row['total_sq'] / row['count'] - mean * mean, 0.0)
+                marginals.append({
+                    'param': row['param'], 'value': json.loads(row['value']), 'count': row['count'],
+                    'mean': mean, 'std': variance ** 0.5,
                 })
-                
-                # Update job
-                cursor.execute('''
-                    UPDATE jobs 
-                    SET status = ?, completion_timestamp = ?, required_time = ?, message = ?
-                    WHERE id = ?
-                ''', (status, now, required_time, json.dumps(messages), job_id))
-                
-                conn.commit()
-                return True
+            return marginals
+
+    def get_top_results(self, metric: str, k: int = 10, mode: str = "max") -> List[Dict[str, Any]]:
+        """Get the `k` DONE jobs with the highest (mode="max") or lowest (mode="min") `metric`.
+
+        Walks the (metric, value) index from the best end, so the cost only
+        depends on `k`, not on the number of results.
+        """
+        order = "DESC" if mode == "max" else "ASC"
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT r.job_id, r.value, j.parameters, j.requested_by, j.required_time,
+                       j.completion_timestamp
+                FROM job_results r JOIN jobs j ON j.id = r.job_id
+                WHERE r.metric = ?
+                ORDER BY r.value {order}, r.job_id {order}
+                LIMIT ?
+            ''', (metric, k))
+            results = []
+            for row in cursor.fetchall():
+                result = dict(row)
+                result['parameters'] = json.loads(result['parameters'])
+                results.append(result)
+            return results
     
     def change_job_status(self, job_id: int, new_status: str, reason: str = "") -> bool:
-        """Change job status for DONE, ABORTED, or PENDING jobs."""
+        """Change job status for DONE, ABORTED, PENDING or QUARANTINED jobs.
+
+        Moving a job to PENDING by hand also clears its retry count and backoff.
+        """
         if new_status not in [STATUS_DONE, STATUS_ABORTED, STATUS_PENDING]:
             return False
         
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Get current job
-                cursor.execute(
-                    "SELECT * FROM jobs WHERE id = ? AND status IN (?, ?, ?)",
-                    (job_id, STATUS_DONE, STATUS_ABORTED, STATUS_PENDING)
-                )
-                row = cursor.fetchone()
-                
-                if not row:
-                    return False
-                
-                job = dict(row)
-                now = time.time()
-                old_status = job['status']
-                
-                # Parse existing messages
-                try:
-                    messages = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    messages = []
-                
-                # Add status change message
-                status_change_message = f"Manual Status Change: {old_status} → {new_status}"
-                if reason:
-                    status_change_message += f" | Reason: {reason}"
-                else:
-                    status_change_message += " | No reason provided"
-                
-                messages.append({
-                    "reason": status_change_message,
-                    "timestamp": now
-                })
-                
-                        # Update job status and reset timestamps if going to PENDING
-                if new_status == STATUS_PENDING:
-                    cursor.execute('''
-                        UPDATE jobs 
-                        SET status = ?, message = ?, request_timestamp = 0, 
-                            completion_timestamp = 0, required_time = 0, 
-                            last_ping_timestamp = 0, requested_by = ''
-                        WHERE id = ?
-                    ''', (new_status, json.dumps(messages), job_id))
-                else:
-                    cursor.execute('''
-                        UPDATE jobs 
-                        SET status = ?, message = ?
-                        WHERE id = ?
-                    ''', (new_status, json.dumps(messages), job_id))
-                
-                conn.commit()
-                return True
-    
-    def ping_job(self, job_id: int) -> bool:
-        """Update last_ping_timestamp for a SERVED job."""
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                
-                # Check if job exists and is SERVED
-                cursor.execute(
-                    "SELECT id FROM jobs WHERE id = ? AND status = ?",
-                    (job_id, STATUS_SERVED)
-                )
-                row = cursor.fetchone()
-                
-                if not row:
-                    return False
-                
-                now = round(time.time())
-                cursor.execute(
-                    "UPDATE jobs SET last_ping_timestamp = ? WHERE id = ?",
-                    (now, job_id)
-                )
-                
-                conn.commit()
-                return True
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            
+            # Get current job
+            cursor.execute(
+                "SELECT status FROM jobs WHERE id = ? AND status IN (?, ?, ?, ?)",
+                (job_id, STATUS_DONE, STATUS_ABORTED, STATUS_PENDING, STATUS_QUARANTINED)
+            )
+            row = cursor.fetchone()
+            
+            if not row:
+                conn.rollback()
+                return False
+            
+            now = time.time()
+            old_status = row['status']
+            
+            # Add status change message
+            status_change_message = f"Manual Status Change: {old_status} → {new_status}"
+            if reason:
+                status_change_message += f" | Reason: {reason}"
+            else:
+                status_change_message += " | No reason provided"
+            
+            # Update job status and reset timestamps if going to PENDING
+            if new_status == STATUS_PENDING:
+                cursor.execute('''
+                    UPDATE jobs 
+                    SET status = ?, request_timestamp = 0, 
+                        completion_timestamp = 0, required_time = 0, 
+                        last_ping_timestamp = 0, requested_by = '',
+                        attempts = 0, not_before = 0
+                    WHERE id = ?
+                ''', (new_status, job_id))
+            else:
+                cursor.execute('''
+                    UPDATE jobs 
+                    SET status = ?
+                    WHERE id = ?
+                ''', (new_status, job_id))
+            
+            self._add_event(cursor, job_id, EVENT_STATUS_CHANGE, status_change_message, now)
+            conn.commit()
+            return True
     
-    def reset_aborted_jobs(self) -> int:
-        """Reset all ABORTED jobs to PENDING."""
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                current_time = time.time()
-                
-                # Get all aborted jobs
-                cursor.execute("SELECT * FROM jobs WHERE status = ?", (STATUS_ABORTED,))
-                aborted_jobs = cursor.fetchall()
-                
-                count = 0
-                for row in aborted_jobs:
-                    job = dict(row)
-                    prev_requester = job['requested_by']
-                    
-                    # Parse existing messages
-                    try:
-                        messages = json.loads(job['message'])
-                    except json.JSONDecodeError:
-                        messages = []
-                    
-                    # Add reset message
-                    messages.append({
-                        "reason": f"Job Cleaner: Reset job to PENDING status. Previous execution failed on machine '{prev_requester}'. Job is now available for reassignment.",
-                        "timestamp": current_time
-                    })
-                    
-                    # Reset job
-                    cursor.execute('''
-                        UPDATE jobs 
-                        SET status = ?, requested_by = '', request_timestamp = 0, 
-                            completion_timestamp = 0, required_time = 0, 
-                            last_ping_timestamp = 0, message = ?
-                        WHERE id = ?
-                    ''', (STATUS_PENDING, json.dumps(messages), job['id']))
-                    
-                    count += 1
-                
-                conn.commit()
-                return count
+    def record_pings(self, pings: List[Tuple[int, float, Optional[float]]]) -> int:
+        """Write a batch of buffered heartbeats (job_id, timestamp, progress or None) in one transaction."""
+        if not pings:
+            return 0
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """
+                UPDATE jobs SET last_ping_timestamp = ?, progress = COALESCE(?, progress)
+                WHERE id = ? AND status = ? AND last_ping_timestamp < ?
+                """,
+                [(timestamp, progress, job_id, STATUS_SERVED, timestamp) for job_id, timestamp, progress in pings]
+            )
+            conn.commit()
+            return cursor.rowcount
+
+    def get_lease_states(self, job_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+        """Get status, requester, copy requester and not_before of the given jobs that exist."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT j.id, j.status, j.requested_by, j.not_before, c.requested_by AS copy_requested_by
+                FROM jobs j LEFT JOIN job_copies c ON c.job_id = j.id
+                WHERE j.id IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(job_ids),))
+            return {row['id']: dict(row) for row in cursor.fetchall()}
+
+    def renew_leases(self, job_ids: List[int], requested_by: str) -> List[int]:
+        """Lease PENDING jobs back to the runner that is still running them.
+
+        For jobs reset as stale while their runner was in fact still alive;
+        jobs in retry backoff are left alone. Returns the renewed ids.
+        """
+        if not job_ids:
+            return []
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            timestamp = time.time()
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute('''
+                UPDATE jobs
+                SET requested_by = ?, status = ?, request_timestamp = ?, last_ping_timestamp = ?
+                WHERE id IN (SELECT value FROM json_each(?)) AND status = ? AND not_before <= ?
+                RETURNING id
+            ''', (requested_by, STATUS_SERVED, timestamp, timestamp, json.dumps(job_ids),
+                  STATUS_PENDING, timestamp))
+            renewed = [row['id'] for row in cursor.fetchall()]
+            cursor.executemany(
+                "INSERT INTO job_events (job_id, ts, kind, text) VALUES (?, ?, ?, ?)",
+                [(job_id, timestamp, EVENT_RENEWED, f"{requested_by} is still running this job; lease renewed")
+                 for job_id in renewed]
+            )
+            conn.commit()
+            return renewed
+
+    def get_job_status(self, job_id: int) -> Optional[str]:
+        """Get the status of a job, or None if it does not exist."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT status FROM jobs WHERE id = ?", (job_id,))
+            row = cursor.fetchone()
+            return row['status'] if row else None
     
-    def reset_stale_served_jobs(self, idle_timeout: int) -> int:
-        """Reset SERVED jobs that haven't pinged within the timeout."""
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                current_time = time.time()
-                cutoff_time = current_time - idle_timeout
-                
-                # Get stale served jobs
-                cursor.execute(
-                    "SELECT * FROM jobs WHERE status = ? AND last_ping_timestamp < ?",
-                    (STATUS_SERVED, cutoff_time)
+    @staticmethod
+    def _bulk_reset(cursor: sqlite3.Cursor, condition: str, params: tuple, kind: str, text_sql: str,
+                    text_params: tuple, current_time: float, status: str = STATUS_PENDING,
+                    extra_set: str = "", extra_params: tuple = ()) -> int:
+        """Release every job matching `condition` with two set-based statements.
+
+        The history entries are written first with one INSERT ... SELECT so
+        `text_sql` can still refer to the previous requester and attempts;
+        the caller runs both inside one BEGIN IMMEDIATE transaction.
+        """
+        cursor.execute(f'''
+            INSERT INTO job_events (job_id, ts, kind, text)
+            SELECT id, ?, ?, {text_sql} FROM jobs WHERE {condition}
+            ORDER BY id
+        ''', (current_time, kind) + text_params + params)
+        cursor.execute(f'''
+            UPDATE jobs 
+            SET status = ?, requested_by = '', request_timestamp = 0, 
+                completion_timestamp = 0, required_time = 0, 
+                last_ping_timestamp = 0{extra_set}
+            WHERE {condition}
+        ''', (status,) + extra_params + params)
+        return cursor.rowcount
+
+    def reset_aborted_jobs(self, max_retries: int = None, retry_backoff: float = 0) -> int:
+        """Reset ABORTED jobs to PENDING after an exponential backoff.
+
+        Each reset counts one failed attempt and keeps the job unclaimable for
+        `retry_backoff` * 2^(attempts - 1) seconds (at most MAX_RETRY_BACKOFF).
+        Jobs that already used `max_retries` retries are QUARANTINED instead;
+        None allows unlimited retries. Returns the number reset to PENDING.
+        """
+        current_time = time.time()
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            quarantined = 0
+            if max_retries is not None:
+                quarantined = self._bulk_reset(
+                    cursor, "status = ? AND attempts >= ?", (STATUS_ABORTED, max_retries), EVENT_QUARANTINED,
+                    "'Job Cleaner: Quarantined job after ' || (attempts + 1) || ' failed attempts, the last one"
+                    " on machine ''' || requested_by || '''. Change its status to PENDING to retry it.'",
+                    (), current_time, STATUS_QUARANTINED, ", attempts = attempts + 1"
                 )
-                stale_jobs = cursor.fetchall()
-                
-                count = 0
-                for row in stale_jobs:
-                    job = dict(row)
-                    prev_requester = job['requested_by']
-                    last_ping = job['last_ping_timestamp']
-                    minutes_silent = round((current_time - last_ping) / 60)
-                    
-                    # Parse existing messages
-                    try:
-                        messages = json.loads(job['message'])
-                    except json.JSONDecodeError:
-                        messages = []
-                    
-                    # Add reset message
-                    messages.append({
-                        "reason": f"Job Cleaner: Reset job to PENDING status. Machine '{prev_requester}' stopped responding ({minutes_silent} minutes of inactivity). Job is now available for reassignment.",
-                        "timestamp": current_time
-                    })
-                    
-                    # Reset job
-                    cursor.execute('''
-                        UPDATE jobs 
-                        SET status = ?, requested_by = '', request_timestamp = 0, 
-                            completion_timestamp = 0, required_time = 0, 
-                            last_ping_timestamp = 0, message = ?
-                        WHERE id = ?
-                    ''', (STATUS_PENDING, json.dumps(messages), job['id']))
-                    
-                    count += 1
-                
-                conn.commit()
-                return count
+            count = self._bulk_reset(
+                cursor, "status = ?", (STATUS_ABORTED,), EVENT_RESET_ABORTED,
+                "'Job Cleaner: Reset job to PENDING status. Previous execution failed on machine ''' || requested_by"
+                " || ''' (failed attempt ' || (attempts + 1) || '). Job is now available for reassignment.'",
+                (), current_time, STATUS_PENDING,
+                ", attempts = attempts + 1, not_before = ? + MIN(? * (1 << MIN(attempts, 30)), ?)",
+                (current_time, retry_backoff, MAX_RETRY_BACKOFF)
+            )
+            conn.commit()
+        if quarantined > 0:
+            logging.warning(f"Quarantined {quarantined} jobs that exceeded {max_retries} retries")
+        return count
     
-    def get_job_counts_by_status(self) -> Dict[str, int]:
-        """Get job counts by status efficiently."""
+    def reset_stale_served_jobs(self, idle_timeout: int, job_ids: List[int] = None) -> int:
+        """Reset SERVED jobs that haven't pinged within the timeout.
+
+        The cutoff allows HEARTBEAT_FLUSH_INTERVAL extra seconds for pings the
+        server has received but not yet written. With `job_ids` only those
+        jobs are checked. A lost runner is not counted as a failed attempt.
+        """
+        current_time = time.time()
+        cutoff_time = current_time - idle_timeout - HEARTBEAT_FLUSH_INTERVAL
+        condition = "status = ? AND last_ping_timestamp < ?"
+        params = (STATUS_SERVED, cutoff_time)
+        if job_ids is not None:
+            condition += " AND id IN (SELECT value FROM json_each(?))"
+            params += (json.dumps(job_ids),)
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            count = self._bulk_reset(
+                cursor, condition, params, EVENT_RESET_STALE,
+                "'Job Cleaner: Reset job to PENDING status. Machine ''' || requested_by || ''' stopped responding ('"
+                " || CAST(ROUND((? - last_ping_timestamp) / 60.0) AS INTEGER)"
+                " || ' minutes of inactivity). Job is now available for reassignment.'",
+                (current_time,), current_time
+            )
+            conn.commit()
+            return count
+    
+    def get_job_counts_by_status(self, max_age: float = 0) -> Dict[str, int]:
+        """Get job counts by status efficiently.
+
+        With `max_age` > 0 a cached result up to that many seconds old may be
+        returned instead of recounting.
+        """
+        cached_at, cached_counts = self._counts_cache
+        if max_age > 0 and time.time() - cached_at < max_age:
+            return dict(cached_counts)
+
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute("""
@@ -597,72 +1533,96 @@ class JobDatabase:
             """)
             rows = cursor.fetchall()
             
-            counts = {STATUS_PENDING: 0, STATUS_SERVED: 0, STATUS_DONE: 0, STATUS_ABORTED: 0}
+            counts = {STATUS_PENDING: 0, STATUS_SERVED: 0, STATUS_DONE: 0, STATUS_ABORTED: 0,
+                      STATUS_QUARANTINED: 0}
             for row in rows:
                 counts[row['status']] = row['count']
+
+            # Untouched points of a virtual grid are PENDING without having a row
+            cursor.execute("SELECT total - next_id AS untouched FROM virtual_grid WHERE id = 0")
+            grid = cursor.fetchone()
+            if grid:
+                counts[STATUS_PENDING] += grid['untouched']
             
+            self._counts_cache = (time.time(), dict(counts))
             return counts
     
-    def get_jobs_by_status(self, status: str) -> List[Dict[str, Any]]:
-        """Get all jobs with a specific status."""
+    def get_done_stats(self) -> List[Dict[str, Any]]:
+        """Get the number and total run time of DONE jobs per requester.
+
+        Reads the trigger-maintained done_stats table, so the cost depends on
+        the number of runner instances, not on the number of completed jobs.
+        """
         with self.get_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT * FROM jobs WHERE status = ? ORDER BY id", (status,))
-            rows = cursor.fetchall()
-            
-            jobs = []
-            for row in rows:
-                job = dict(row)
-                # Parse JSON fields
-                try:
-                    job['message'] = json.loads(job['message'])
-                except json.JSONDecodeError:
-                    job['message'] = []
-                try:
-                    job['parameters'] = json.loads(job['parameters'])
-                except json.JSONDecodeError:
-                    job['parameters'] = {}
-                jobs.append(job)
-            
-            return jobs
-    
-    def track_api_request(self, endpoint: str, method: str):
-        """Track an API request by incrementing the counter."""
-        with self.lock:
-            with self.get_connection() as conn:
-                cursor = conn.cursor()
-                now = time.time()
-                
-                # Insert or update the API stats
-                cursor.execute('''
-                    INSERT INTO api_stats (endpoint, method, request_count, last_updated)
-                    VALUES (?, ?, 1, ?)
-                    ON CONFLICT(endpoint, method) 
-                    DO UPDATE SET 
-                        request_count = request_count + 1,
-                        last_updated = ?
-                ''', (endpoint, method, now, now))
-                
-                conn.commit()
-    
-    def get_api_stats(self) -> List[Dict[str, Any]]:
-        """Get API request statistics."""
+            cursor.execute('''
+                SELECT requested_by, job_count, total_time
+                FROM done_stats WHERE job_count > 0
+                ORDER BY requested_by
+            ''')
+            return [dict(row) for row in cursor.fetchall()]
+
+    def get_done_job(self, job_id: int) -> Optional[Dict[str, Any]]:
+        """Get requester, run time, completion time and parameters of a DONE job, without its history."""
         with self.get_connection() as conn:
             cursor = conn.cursor()
             cursor.execute('''
-                SELECT endpoint, method, request_count, last_updated 
-                FROM api_stats 
-                ORDER BY request_count DESC
-            ''')
-            rows = cursor.fetchall()
-            
-            stats = []
-            for row in rows:
-                stats.append({
-                    'endpoint': row['endpoint'],
-                    'method': row['method'],
-                    'request_count': row['request_count'],
-                    'last_updated': row['last_updated']
-                })
-            
-            return stats
+                SELECT requested_by, required_time, completion_timestamp, parameters FROM jobs
+                WHERE id = ? AND status = ?
+            ''', (job_id, STATUS_DONE))
+            row = cursor.fetchone()
+            return self._row_to_job(row) if row else None
+
+    def get_recent_done_jobs(self, limit: int) -> List[Dict[str, Any]]:
+        """Get requester, run time, completion time and parameters of the `limit` latest DONE jobs."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT requested_by, required_time, completion_timestamp, parameters FROM jobs
+                WHERE status = ?
+                ORDER BY completion_timestamp DESC
+                LIMIT ?
+            ''', (STATUS_DONE, limit))
+            return [self._row_to_job(row) for row in cursor.fetchall()]
+
+    def get_first_completion_timestamp(self, requesters: Optional[List[str]] = None) -> Optional[float]:
+        """Get the earliest completion time of a DONE job, optionally for some requesters only."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            query = "SELECT MIN(completion_timestamp) AS first FROM jobs WHERE status = ?"
+            params = [STATUS_DONE]
+            if requesters is not None:
+                query += f" AND requested_by IN ({','.join('?' * len(requesters))})"
+                params.extend(requesters)
+            cursor.execute(query, params)
+            return cursor.fetchone()['first']
+
+    def get_completion_histogram(self, start_time: float, bucket_seconds: float,
+                                 requesters: Optional[List[str]] = None) -> Dict[int, int]:
+        """Count DONE jobs per time bucket since `start_time`.
+
+        Bucket i covers [start_time + i * bucket_seconds, start_time + (i + 1) * bucket_seconds).
+        The aggregation runs in SQL over the (status, completion_timestamp)
+        indexes, so only the bucket counts come back to Python.
+        """
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            query = '''
+                SELECT CAST((completion_timestamp - ?) / ? AS INTEGER) AS bucket, COUNT(*) AS count
+                FROM jobs
+                WHERE status = ? AND completion_timestamp >= ?
+            '''
+            params = [start_time, bucket_seconds, STATUS_DONE, start_time]
+            if requesters is not None:
+                query += f" AND requested_by IN ({','.join('?' * len(requesters))})"
+                params.extend(requesters)
+            query += " GROUP BY bucket"
+            cursor.execute(query, params)
+            return {row['bucket']: row['count'] for row in cursor.fetchall()}
+
+    def get_jobs_by_status(self, status: str) -> List[Dict[str, Any]]:
+        """Get all jobs with a specific status (without their history)."""
+        with self.get_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE status = ? ORDER BY id", (status,))
+            return [self._row_to_job(row) for row in cursor.fetchall()]
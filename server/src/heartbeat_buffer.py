@@ -0,0 +1,67 @@
+import logging
+import threading
+from typing import Dict, Optional
+
+from database import JobDatabase, HEARTBEAT_FLUSH_INTERVAL
+
+
+class HeartbeatBuffer:
+    """Coalesces /ping heartbeats in memory and writes them in batches.
+
+    Each ping only records the latest time a job was seen. A background
+    thread writes all recorded times with one executemany every
+    `flush_interval` seconds, so thousands of runners cost one small
+    transaction per interval instead of one per ping. The latest progress
+    a runner reported for a job is written along with it. The job cleaner allows
+    HEARTBEAT_FLUSH_INTERVAL extra seconds of silence to cover the delay.
+    """
+
+    def __init__(self, db: JobDatabase, flush_interval: float = HEARTBEAT_FLUSH_INTERVAL):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        self._last_seen: Dict[int, float] = {}
+        self._progress: Dict[int, float] = {}
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the background flusher."""
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="heartbeat-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write what is left."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def record(self, job_id: int, timestamp: float, progress: Optional[float] = None):
+        """Remember that `job_id` was alive at `timestamp`, `progress` of the way through."""
+        with self.lock:
+            if timestamp > self._last_seen.get(job_id, 0):
+                self._last_seen[job_id] = timestamp
+            if progress is not None:
+                self._progress[job_id] = progress
+
+    def flush(self) -> int:
+        """Write every buffered heartbeat in one transaction."""
+        with self.lock:
+            pings, self._last_seen = self._last_seen, {}
+            progress, self._progress = self._progress, {}
+        if not pings:
+            return 0
+        try:
+            return self.db.record_pings([(job_id, timestamp, progress.get(job_id))
+                                         for job_id, timestamp in pings.items()])
+        except Exception as e:
+            logging.error(f"Failed to write {len(pings)} heartbeats, will retry: {e}")
+            for job_id, timestamp in pings.items():
+                self.record(job_id, timestamp, progress.get(job_id))
+            return 0
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
@@ -3,6 +3,8 @@ import os
 import logging
 import argparse
 from database import JobDatabase
+from lease_tracker import LeaseTracker
+from samplers import load_sampler
 
 # ---------------- Constants ----------------
 BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
@@ -15,8 +17,10 @@ STATUS_DONE = "DONE"
 STATUS_ABORTED = "ABORTED"
 
 ABORTED_JOB_RESET_TIMEOUT = 30 * 60 # ideal time out for aborted jobs
+MAX_RETRIES = 3  # failed attempts retried before a job is QUARANTINED (None = no limit)
+RETRY_BACKOFF = 60  # seconds before the first retry, doubled on every further failure
 IDLE_TIMEOUT = 60
-POLLING_INTERVAL = 60  # Default polling interval
+POLLING_INTERVAL = 60  # Default interval for picking up newly claimed jobs
 
 # ---------------- Setup ----------------
 
@@ -37,33 +41,34 @@ def setup_log(args):
 # ---------------- Main Cleanup Loop ----------------
 
 def cleanup_loop(db):
-    last_aborted_reset_time = 0
-    last_idle_check_time = 0
+    leases = LeaseTracker(db, IDLE_TIMEOUT)
+    leases.load()
+    sampler = load_sampler(db)
+    next_aborted_reset_time = 0
+    # A lease cannot expire sooner than IDLE_TIMEOUT after the claim is seen
+    sync_interval = min(POLLING_INTERVAL, IDLE_TIMEOUT)
 
     while True:
         now = time.time()
-        jobs_updated = False
 
-        if now - last_aborted_reset_time >= ABORTED_JOB_RESET_TIMEOUT:
+        if now >= next_aborted_reset_time:
             logging.info("Running aborted job cleanup...")
-            count = db.reset_aborted_jobs()
+            count = db.reset_aborted_jobs(MAX_RETRIES, RETRY_BACKOFF)
             if count > 0:
                 logging.info(f"Reset {count} ABORTED jobs to PENDING.")
-                jobs_updated = True
-            last_aborted_reset_time = now
+            if sampler is not None:
+                # Rungs whose last open trial was just quarantined
+                sampler.advance(db)
+            next_aborted_reset_time = now + ABORTED_JOB_RESET_TIMEOUT
 
-        if now - last_idle_check_time >= IDLE_TIMEOUT:
-            logging.info("Running stale SERVED job timeout...")
-            count = db.reset_stale_served_jobs(IDLE_TIMEOUT)
-            if count > 0:
-                logging.info(f"Reset {count} SERVED jobs due to no ping.")
-                jobs_updated = True
-            last_idle_check_time = now
-
-        if not jobs_updated:
-            logging.info("No updates made in this cycle.")
+        leases.sync()
+        count = leases.expire()
+        if count > 0:
+            logging.info(f"Reset {count} SERVED jobs due to no ping.")
 
-        time.sleep(POLLING_INTERVAL)
+        # Sleep until the earliest lease expires, the next aborted reset or the next sync
+        wake_time = min(leases.next_deadline(), next_aborted_reset_time, time.time() + sync_interval)
+        time.sleep(max(0, wake_time - time.time()))
 
 # ---------------- Entry Point ----------------
 
@@ -72,8 +77,10 @@ if __name__ == "__main__":
     parser.add_argument("--jobDB", default="jobs.db", help="SQLite database file (<filename>.db) placed in the same directory as server.py")
     parser.add_argument("--expId", type=str, default="sim1", help="Give a unique name of your experiment")
     parser.add_argument("--abortedJobResetTimeout", type=int, default=1800, help="How often to reset aborted jobs (in seconds)")
+    parser.add_argument("--maxRetries", type=int, default=3, help="Retries of a failing job before it is QUARANTINED (-1 for no limit)")
+    parser.add_argument("--retryBackoff", type=int, default=60, help="Backoff before the first retry of an aborted job, doubled per failure (in seconds)")
     parser.add_argument("--idleTimeout", type=int, default=60, help="Max silence period for SERVED jobs (in seconds)")
-    parser.add_argument("--pollingInterval", type=int, default=60, help="How often to poll for cleanup (in seconds)")
+    parser.add_argument("--pollingInterval", type=int, default=60, help="How often to look for newly claimed jobs (in seconds)")
     args = parser.parse_args()
 
     createExpBaseDirectory(args)
@@ -81,6 +88,8 @@ if __name__ == "__main__":
 
     DB_FILE = os.path.join(BASE_DIR, args.expId, args.jobDB)
     ABORTED_JOB_RESET_TIMEOUT = args.abortedJobResetTimeout
+    MAX_RETRIES = args.maxRetries if args.maxRetries >= 0 else None
+    RETRY_BACKOFF = args.retryBackoff
     IDLE_TIMEOUT = args.idleTimeout
     POLLING_INTERVAL = args.pollingInterval
 
@@ -0,0 +1,331 @@
+import heapq
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from database import JobDatabase, STATUS_PENDING
+from scheduler import CostBuckets, SpeedModel
+
+# ---------------- Constants ----------------
+FLUSH_INTERVAL = 0.5  # seconds between background retries of claim writes that failed
+SYNC_INTERVAL = 1.0  # seconds between scans of job_events for changes made elsewhere
+GRID_BATCH = 1000  # untouched virtual grid points written as PENDING rows per refill
+
+
+class PendingJobQueue:
+    """In-memory queue of PENDING job ids with group-committed persistence.
+
+    Claims are answered from a min-heap of (not_before, job id), the same
+    order as JobDatabase.request_jobs, so jobs in retry backoff stay queued
+    until their time has come. Claims are recorded in a buffer that is
+    written before the claim is answered, and concurrent claims share one
+    transaction. A claim the database refuses because the job changed state
+    meanwhile is dropped from the answer. A background thread retries failed
+    writes every FLUSH_INTERVAL seconds. Jobs that become PENDING in other processes
+    (cleaner resets, manual status changes) are picked up by tailing the
+    job_events table. The database stays the source of truth: a claim that
+    was never flushed leaves the job PENDING, so a restart loses no jobs.
+    With a virtual grid, the queue materializes GRID_BATCH untouched points
+    as PENDING rows whenever it runs short.
+
+    With a SpeedModel, jobs whose backoff has passed move from the heap into
+    cost classes, and each claim takes the job that matches the requester's
+    speed (the largest jobs for the fastest machines, see SpeedModel.share).
+    Queued jobs are re-priced in the background whenever the model's
+    version changes.
+
+    A claim may wait for work: every push notifies the `_available`
+    condition, so a waiting claim is answered as soon as a job is queued
+    or comes out of backoff.
+
+    Only one process may serve claims from a given queue; with several
+    server processes use JobDatabase.request_jobs instead.
+    """
+
+    def __init__(self, db: JobDatabase, flush_interval: float = FLUSH_INTERVAL,
+                 sync_interval: float = SYNC_INTERVAL, speed_model: Optional[SpeedModel] = None):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.sync_interval = sync_interval
+        self.lock = threading.Lock()
+        # Notified on every push; _pushes tells a wakeup from a timeout
+        self._available = threading.Condition(self.lock)
+        self._pushes = 0
+        # Serializes flushes and syncs so a sync never sees a half-written claim
+        self._io_lock = threading.Lock()
+        self._heap: List[Tuple[float, int]] = []
+        self._pending: Dict[int, float] = {}  # job_id -> not_before
+        self._unflushed: Dict[int, Tuple[str, float]] = {}
+        # Claims the database refused because the job changed state first: job_id -> requester
+        self._conflicts: Dict[int, str] = {}
+        self._last_event_id = 0
+        self._grid_exhausted = False
+        # Speed-aware scheduling: cost class of every queued job, and the claimable ones by class
+        self.speed_model = speed_model
+        self._cost_class: Dict[int, int] = {}
+        self._ready = CostBuckets()
+        self._priced_version = None
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def load(self):
+        """(Re)build the queue from the PENDING jobs in the database."""
+        with self._io_lock:
+            last_event_id = self.db.get_last_event_id()
+            pending = self.db.get_pending_jobs()
+            version, cost_classes = self._price_pending()
+            with self.lock:
+                self._pending = {job_id: not_before for job_id, not_before in pending.items()
+                                 if job_id not in self._unflushed}
+                self._heap = sorted((not_before, job_id) for job_id, not_before in self._pending.items())
+                self._last_event_id = last_event_id
+                self._grid_exhausted = False
+                self._cost_class = {job_id: cost_class for job_id, cost_class in cost_classes.items()
+                                    if job_id in self._pending}
+                self._ready = CostBuckets()
+                self._priced_version = version
+        logging.info(f"Pending job queue loaded with {len(self._pending)} jobs")
+
+    def start(self):
+        """Load the queue and start the background flush/sync thread."""
+        self.load()
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="job-queue-writer", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread and flush outstanding claims."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def __len__(self):
+        with self.lock:
+            return len(self._pending)
+
+    def claim(self, requested_by: str, count: int, wait: float = 0) -> List[Dict[str, Any]]:
+        """Take up to `count` jobs off the queue for `requested_by`.
+
+        With `wait` > 0, a claim that finds nothing blocks for up to that many
+        seconds until a job becomes claimable.
+        """
+        deadline = time.time() + wait
+        while True:
+            with self.lock:
+                pushes = self._pushes
+            timestamp = time.time()
+            if self.speed_model is not None:
+                self.speed_model.note_request(requested_by, timestamp)
+            job_ids = self._pop(requested_by, count, timestamp)
+            if len(job_ids) < count and self._refill():
+                job_ids += self._pop(requested_by, count - len(job_ids), timestamp)
+            if job_ids:
+                self.flush()
+                refused = set(self.pop_conflicts(job_ids, requested_by))
+                job_ids = [job_id for job_id in job_ids if job_id not in refused]
+                if refused and not job_ids:
+                    continue  # refused jobs have left the queue; try the next ones
+            if job_ids or not self._wait_for_push(pushes, deadline):
+                break
+
+        parameters = self.db.get_job_parameters(job_ids)
+        return [{"id": job_id, "parameters": parameters.get(job_id, {}),
+                 "requested_by": requested_by, "request_timestamp": timestamp}
+                for job_id in job_ids]
+
+    def _wait_for_push(self, pushes: int, deadline: float) -> bool:
+        """Sleep until a push after `pushes`, the end of the earliest backoff, or `deadline`.
+
+        Returns False if the deadline had already passed.
+        """
+        with self.lock:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                return False
+            if self._heap:
+                timeout = min(timeout, max(self._heap[0][0] - time.time(), 0))
+            self._available.wait_for(lambda: self._pushes != pushes, timeout)
+        return True
+
+    def _pop(self, requested_by: str, count: int, timestamp: float) -> List[int]:
+        if self.speed_model is not None:
+            return self._pop_by_cost(requested_by, count, timestamp)
+        job_ids = []
+        with self.lock:
+            while self._heap and len(job_ids) < count:
+                not_before, job_id = self._heap[0]
+                if not_before > timestamp:
+                    break  # everything left is still in retry backoff
+                heapq.heappop(self._heap)
+                if self._pending.get(job_id) != not_before:
+                    continue  # lazily deleted
+                del self._pending[job_id]
+                self._unflushed[job_id] = (requested_by, timestamp)
+                self._conflicts.pop(job_id, None)  # from an earlier, refused claim
+                job_ids.append(job_id)
+        return job_ids
+
+    def _pop_by_cost(self, requested_by: str, count: int, timestamp: float) -> List[int]:
+        share = self.speed_model.share(requested_by, timestamp)
+        average_class = self.speed_model.cost_class({})  # for jobs that could not be priced
+        job_ids = []
+        with self.lock:
+            # Jobs whose backoff has passed become claimable
+            while self._heap and self._heap[0][0] <= timestamp:
+                not_before, job_id = heapq.heappop(self._heap)
+                if self._pending.get(job_id) == not_before:
+                    self._ready.add(job_id, self._cost_class.get(job_id, average_class))
+            while len(job_ids) < count:
+                job_id = self._ready.take(share)
+                if job_id is None:
+                    break
+                del self._pending[job_id]
+                self._cost_class.pop(job_id, None)
+                self._unflushed[job_id] = (requested_by, timestamp)
+                self._conflicts.pop(job_id, None)  # from an earlier, refused claim
+                job_ids.append(job_id)
+        return job_ids
+
+    def _price(self, job_ids: List[int]) -> Dict[int, int]:
+        """Cost classes of `job_ids` (empty without a speed model)."""
+        if self.speed_model is None or not job_ids:
+            return {}
+        return {job_id: self.speed_model.cost_class(parameters)
+                for job_id, parameters in self.db.get_job_parameters(job_ids).items()}
+
+    def _price_pending(self) -> Tuple[Optional[int], Dict[int, int]]:
+        """Model version and cost classes of every PENDING job (empty without a speed model)."""
+        if self.speed_model is None:
+            return None, {}
+        version = self.speed_model.version
+        return version, {job_id: self.speed_model.cost_class(parameters)
+                         for job_id, parameters in self.db.iter_pending_parameters()}
+
+    def reprice(self):
+        """Re-estimate the cost class of every queued job with the current speed model."""
+        with self._io_lock:
+            version, cost_classes = self._price_pending()
+            with self.lock:
+                for job_id, cost_class in cost_classes.items():
+                    if job_id in self._pending:
+                        self._cost_class[job_id] = cost_class
+                        if job_id in self._ready:
+                            self._ready.add(job_id, cost_class)
+                self._priced_version = version
+        logging.info(f"Re-priced {len(cost_classes)} pending jobs (speed model version {version})")
+
+    def _refill(self) -> bool:
+        """Queue the next batch of untouched virtual grid points. Returns whether any were added."""
+        if self._grid_exhausted:
+            return False
+        job_ids = self.db.materialize_virtual_jobs(GRID_BATCH)
+        if not job_ids:
+            self._grid_exhausted = True
+            return False
+        cost_classes = self._price(job_ids)
+        with self.lock:
+            for job_id in job_ids:
+                self._push(job_id, 0, cost_classes.get(job_id))
+        return True
+
+    def push(self, job_id: int, not_before: float = 0):
+        """Make a job that is PENDING in the database claimable (again) from `not_before` on."""
+        cost_class = self._price([job_id]).get(job_id)
+        with self.lock:
+            self._push(job_id, not_before, cost_class)
+
+    def _push(self, job_id: int, not_before: float, cost_class: int = None):
+        if cost_class is not None:
+            self._cost_class[job_id] = cost_class
+        if job_id in self._unflushed or self._pending.get(job_id) == not_before:
+            return
+        self._pending[job_id] = not_before
+        self._ready.discard(job_id)  # claimable again only once not_before has passed
+        heapq.heappush(self._heap, (not_before, job_id))
+        self._pushes += 1
+        self._available.notify_all()
+
+    def take(self, job_ids: List[int]) -> List[int]:
+        """Remove specific jobs from the queue, e.g. to lease them back to a runner. Returns those that were queued."""
+        taken = []
+        with self.lock:
+            for job_id in job_ids:
+                if job_id in self._pending:
+                    del self._pending[job_id]  # heap entry is skipped lazily
+                    self._ready.discard(job_id)
+                    self._cost_class.pop(job_id, None)
+                    taken.append(job_id)
+        return taken
+
+    def pop_conflicts(self, job_ids: List[int], requested_by: str) -> List[int]:
+        """Forget and return those of `job_ids` whose claim by `requested_by` was refused."""
+        refused = []
+        with self.lock:
+            for job_id in job_ids:
+                if self._conflicts.get(job_id) == requested_by:
+                    del self._conflicts[job_id]
+                    refused.append(job_id)
+        return refused
+
+    def is_unflushed(self, job_id: int) -> bool:
+        """Whether a claim on this job is still waiting to be written."""
+        with self.lock:
+            return job_id in self._unflushed
+
+    def flush(self) -> int:
+        """Persist buffered claims in one transaction. Returns the number written."""
+        with self._io_lock:
+            with self.lock:
+                claims = [(job_id, requested_by, timestamp)
+                          for job_id, (requested_by, timestamp) in self._unflushed.items()]
+            if not claims:
+                return 0
+            try:
+                persisted = set(self.db.persist_claims(claims))
+            except Exception as e:
+                logging.error(f"Failed to persist {len(claims)} claims, will retry: {e}")
+                return 0
+            with self.lock:
+                for job_id, requested_by, _ in claims:
+                    self._unflushed.pop(job_id, None)
+                    if job_id not in persisted:
+                        self._conflicts[job_id] = requested_by
+            for job_id, requested_by, _ in claims:
+                if job_id not in persisted:
+                    logging.warning(
+                        f"Job {job_id} changed state before the claim by {requested_by} was persisted.")
+            return len(persisted)
+
+    def sync(self):
+        """Apply job transitions made by other processes since the last sync."""
+        with self._io_lock:
+            last_event_id, changes = self.db.get_job_changes_since(self._last_event_id)
+            pending = self.db.get_pending_jobs(
+                [job_id for job_id, status in changes.items() if status == STATUS_PENDING])
+            cost_classes = self._price([job_id for job_id in pending if job_id not in self._cost_class])
+            with self.lock:
+                self._last_event_id = last_event_id
+                for job_id in changes:
+                    if job_id in self._unflushed:
+                        continue
+                    if job_id in pending:
+                        self._push(job_id, pending[job_id], cost_classes.get(job_id))
+                    else:
+                        self._pending.pop(job_id, None)
+                        self._ready.discard(job_id)
+                        self._cost_class.pop(job_id, None)
+
+    def _run(self):
+        last_sync = 0
+        while not self._stop_event.wait(self.flush_interval):
+            try:
+                self.flush()
+                if time.time() - last_sync >= self.sync_interval:
+                    self.sync()
+                    last_sync = time.time()
+                if self.speed_model is not None and self.speed_model.version != self._priced_version:
+                    self.reprice()
+            except Exception as e:
+                logging.error(f"Pending job queue maintenance failed: {e}")
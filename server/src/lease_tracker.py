@@ -0,0 +1,76 @@
+import heapq
+import logging
+import time
+from typing import Dict, List, Tuple
+
+from database import JobDatabase, HEARTBEAT_FLUSH_INTERVAL, STATUS_SERVED
+
+
+class LeaseTracker:
+    """Min-heap of SERVED job lease deadlines for the job cleaner.
+
+    A lease expires `idle_timeout` seconds (plus HEARTBEAT_FLUSH_INTERVAL for
+    buffered pings) after the job's last ping. New claims and other status
+    changes are picked up by tailing job_events. Pings do not create events,
+    so a due lease is re-checked against the job's current last ping: jobs
+    that are still silent are reset, the others are pushed back to their
+    new deadline. Only due jobs are ever read, never the whole table.
+    """
+
+    def __init__(self, db: JobDatabase, idle_timeout: float):
+        self.db = db
+        self.idle_timeout = idle_timeout
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._last_event_id = 0
+
+    def __len__(self):
+        return len(self._deadlines)
+
+    def _schedule(self, job_id: int, last_ping: float):
+        deadline = last_ping + self.idle_timeout + HEARTBEAT_FLUSH_INTERVAL
+        if self._deadlines.get(job_id) != deadline:
+            self._deadlines[job_id] = deadline
+            heapq.heappush(self._heap, (deadline, job_id))
+
+    def load(self):
+        """(Re)build the heap from the SERVED jobs in the database."""
+        self._last_event_id = self.db.get_last_event_id()
+        self._heap = []
+        self._deadlines = {}
+        for job_id, last_ping in self.db.get_served_leases().items():
+            self._schedule(job_id, last_ping)
+        logging.info(f"Tracking {len(self._deadlines)} job leases")
+
+    def sync(self):
+        """Add leases of newly claimed jobs and drop jobs that left SERVED."""
+        self._last_event_id, changes = self.db.get_job_changes_since(self._last_event_id)
+        served = [job_id for job_id, status in changes.items() if status == STATUS_SERVED]
+        for job_id, status in changes.items():
+            if status != STATUS_SERVED:
+                self._deadlines.pop(job_id, None)  # heap entry is skipped lazily
+        for job_id, last_ping in self.db.get_served_leases(served).items():
+            self._schedule(job_id, last_ping)
+
+    def next_deadline(self) -> float:
+        """Time at which the earliest lease expires (inf if there is none)."""
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else float("inf")
+
+    def expire(self, now: float = None) -> int:
+        """Reset every job whose lease has run out. Returns the number reset."""
+        now = time.time() if now is None else now
+        due = []
+        while self.next_deadline() <= now:
+            _, job_id = heapq.heappop(self._heap)
+            del self._deadlines[job_id]
+            due.append(job_id)
+        if not due:
+            return 0
+
+        count = self.db.reset_stale_served_jobs(self.idle_timeout, job_ids=due)
+        # Jobs that pinged since they were scheduled are still SERVED
+        for job_id, last_ping in self.db.get_served_leases(due).items():
+            self._schedule(job_id, last_ping)
+        return count
@@ -0,0 +1,106 @@
+import functools
+import logging
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, Tuple
+
+# ---------------- Constants ----------------
+FLUSH_INTERVAL = 10  # seconds between writes of the counters to api_stats
+
+# Upper bounds (milliseconds) of the latency histogram buckets
+LATENCY_BUCKETS_MS = (0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500,
+                      1000, 2000, 5000, 10000, float("inf"))
+
+
+class RequestStatsRecorder:
+    """Per-endpoint request counters and latency histograms kept in memory.
+
+    Handlers are wrapped with `track`, which only bumps in-process counters.
+    A background thread adds the accumulated counts to the api_stats and
+    api_latency tables every FLUSH_INTERVAL seconds and once more at
+    shutdown, so serving a request never waits on a database write.
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self.db = None
+        self.lock = threading.Lock()
+        self._counts: Dict[Tuple[str, str], int] = defaultdict(int)
+        self._last_updated: Dict[Tuple[str, str], float] = {}
+        self._latency: Dict[Tuple[str, str], Dict[float, int]] = defaultdict(lambda: defaultdict(int))
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self, db):
+        """Start flushing to `db` in the background."""
+        self.db = db
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name="request-stats-flusher", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background flusher and write what is left."""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join()
+        self.flush()
+
+    def record(self, endpoint: str, method: str, seconds: float):
+        """Count one request and its latency."""
+        latency_ms = seconds * 1000
+        bucket = next(bound for bound in LATENCY_BUCKETS_MS if latency_ms <= bound)
+        key = (endpoint, method)
+        with self.lock:
+            self._counts[key] += 1
+            self._last_updated[key] = time.time()
+            self._latency[key][bucket] += 1
+
+    def track(self, endpoint: str, method: str):
+        """Decorator that records every call of a Flask handler under `endpoint`."""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self.record(endpoint, method, time.perf_counter() - start)
+            return wrapper
+        return decorator
+
+    def pending(self) -> Tuple[Dict[Tuple[str, str], Tuple[int, float]], Dict[Tuple[str, str], Dict[float, int]]]:
+        """Copy the counts and latency histograms not yet written, shaped as for record_api_stats."""
+        with self.lock:
+            return ({key: (count, self._last_updated[key]) for key, count in self._counts.items()},
+                    {key: dict(buckets) for key, buckets in self._latency.items()})
+
+    def flush(self) -> int:
+        """Add the accumulated counts to the database in one transaction."""
+        if self.db is None:
+            return 0
+        with self.lock:
+            counts, self._counts = self._counts, defaultdict(int)
+            last_updated, self._last_updated = self._last_updated, {}
+            latency, self._latency = self._latency, defaultdict(lambda: defaultdict(int))
+        if not counts:
+            return 0
+        try:
+            self.db.record_api_stats(
+                {key: (count, last_updated[key]) for key, count in counts.items()},
+                {key: dict(buckets) for key, buckets in latency.items()},
+            )
+        except Exception as e:
+            logging.error(f"Failed to write API statistics, will retry: {e}")
+            with self.lock:
+                for key, count in counts.items():
+                    self._counts[key] += count
+                    self._last_updated[key] = max(self._last_updated.get(key, 0), last_updated[key])
+                    for bucket, bucket_count in latency[key].items():
+                        self._latency[key][bucket] += bucket_count
+            return 0
+        return sum(counts.values())
+
+    def _run(self):
+        while not self._stop_event.wait(self.flush_interval):
+            self.flush()
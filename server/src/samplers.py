@@ -0,0 +1,201 @@
+import json
+import logging
+import math
+import random
+from itertools import product
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# ---------------- Constants ----------------
+SAMPLER_GRID = "grid"
+SAMPLER_RANDOM = "random"
+SAMPLER_LHS = "lhs"
+SAMPLER_HYPERBAND = "hyperband"
+SAMPLERS = (SAMPLER_GRID, SAMPLER_RANDOM, SAMPLER_LHS, SAMPLER_HYPERBAND)
+
+STATUS_DONE = "DONE"
+
+
+# ---------------- Grid ----------------
+
+def grid_size(parameters: Dict[str, List[Any]]) -> int:
+    """Number of points in the Cartesian product of the value lists."""
+    total = 1
+    for values in parameters.values():
+        total *= len(values)
+    return total
+
+
+def grid_point(parameters: Dict[str, List[Any]], index: int) -> Dict[str, Any]:
+    """Parameters of grid point `index`, numbered in itertools.product order.
+
+    Mixed-radix decoding: the last key varies fastest.
+    """
+    values = {}
+    for key in reversed(list(parameters)):
+        index, position = divmod(index, len(parameters[key]))
+        values[key] = parameters[key][position]
+    return {key: values[key] for key in parameters}
+
+
+def grid_search(parameters: Dict[str, List[Any]]) -> Iterator[Dict[str, Any]]:
+    """Every combination of the value lists, lazily."""
+    keys = list(parameters)
+    for combination in product(*parameters.values()):
+        yield dict(zip(keys, combination))
+
+
+# ---------------- Random sampling ----------------
+
+def random_search(parameters: Dict[str, List[Any]], num_samples: int, seed: int = None) -> List[Dict[str, Any]]:
+    """`num_samples` distinct grid points drawn uniformly at random."""
+    rng = random.Random(seed)
+    total = grid_size(parameters)
+    return [grid_point(parameters, index) for index in rng.sample(range(total), min(num_samples, total))]
+
+
+def latin_hypercube(parameters: Dict[str, List[Any]], num_samples: int, seed: int = None) -> List[Dict[str, Any]]:
+    """Latin hypercube sample of `num_samples` grid points.
+
+    Each parameter's axis is cut into `num_samples` equal strata and every
+    stratum is used exactly once, so every value of every parameter is
+    covered as evenly as the sample size allows. Duplicate points are
+    dropped.
+    """
+    rng = random.Random(seed)
+    columns = {}
+    for key, values in parameters.items():
+        strata = list(range(num_samples))
+        rng.shuffle(strata)
+        columns[key] = [values[int((stratum + rng.random()) * len(values) / num_samples)] for stratum in strata]
+
+    samples, seen = [], set()
+    for i in range(num_samples):
+        sample = {key: columns[key][i] for key in parameters}
+        fingerprint = json.dumps(sample, sort_keys=True)
+        if fingerprint not in seen:
+            seen.add(fingerprint)
+            samples.append(sample)
+    return samples
+
+
+def sample_parameters(parameters: Dict[str, List[Any]], spec: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Job parameters for a non-adaptive sampler spec (grid, random or lhs)."""
+    kind = spec.get("type", SAMPLER_GRID)
+    if kind == SAMPLER_GRID:
+        return grid_search(parameters)
+    if kind == SAMPLER_RANDOM:
+        return iter(random_search(parameters, spec["num_samples"], spec.get("seed")))
+    if kind == SAMPLER_LHS:
+        return iter(latin_hypercube(parameters, spec["num_samples"], spec.get("seed")))
+    raise ValueError(f"Unknown sampler type: {kind}")
+
+
+# ---------------- Hyperband ----------------
+
+class Hyperband:
+    """Hyperband over the grid, with successive halving inside each bracket.
+
+    One parameter is the `resource` (e.g. epochs); its smallest and largest
+    values bound the budget a configuration can get. Bracket s starts
+    n = ceil((s_max + 1) / (s + 1) * eta^s) random configurations at
+    max_resource * eta^-s. Once every trial of a rung has finished, the best
+    1/eta of them (by `metric`, reported with the DONE status) are
+    re-enqueued at eta times the resource. Bracket 0 is plain random search
+    at the full budget.
+    """
+
+    def __init__(self, parameters: Dict[str, List[Any]], resource: str, metric: str,
+                 mode: str = "max", eta: int = 3, seed: int = None):
+        if resource not in parameters:
+            raise ValueError(f"Hyperband resource '{resource}' is not one of the parameters")
+        if mode not in ("max", "min"):
+            raise ValueError(f"Hyperband mode must be 'max' or 'min', got '{mode}'")
+        self.parameters = parameters
+        self.resource = resource
+        self.metric = metric
+        self.mode = mode
+        self.eta = eta
+        self.seed = seed
+
+        values = parameters[resource]
+        self.min_resource = min(values)
+        self.max_resource = max(values)
+        self.integer_resource = all(isinstance(value, int) for value in values)
+        ratio = self.max_resource / self.min_resource
+        self.s_max = int(math.floor(math.log(ratio) / math.log(eta) + 1e-9)) if ratio > 1 else 0
+
+    @classmethod
+    def from_spec(cls, parameters: Dict[str, List[Any]], spec: Dict[str, Any]) -> "Hyperband":
+        return cls(parameters, spec["resource"], spec["metric"], spec.get("mode", "max"),
+                   spec.get("eta", 3), spec.get("seed"))
+
+    def brackets(self) -> List[int]:
+        return list(range(self.s_max, -1, -1))
+
+    def rung_size(self, bracket: int, rung: int) -> int:
+        """Number of configurations bracket `bracket` runs at `rung`."""
+        n = math.ceil((self.s_max + 1) / (bracket + 1) * self.eta ** bracket)
+        return max(1, int(n * self.eta ** -rung))
+
+    def rung_resource(self, bracket: int, rung: int) -> Any:
+        """Resource value a configuration gets at `rung` of `bracket`."""
+        value = max(self.min_resource, self.max_resource * self.eta ** (rung - bracket))
+        return int(round(value)) if self.integer_resource else value
+
+    def trial_parameters(self, config: Dict[str, Any], bracket: int, rung: int) -> Dict[str, Any]:
+        """Job parameters of `config` at `rung`, in the order of the parameter spec."""
+        return {key: self.rung_resource(bracket, rung) if key == self.resource else config[key]
+                for key in self.parameters}
+
+    def initial_trials(self) -> List[Tuple[Dict[str, Any], Dict[str, Any], int, int]]:
+        """(job parameters, config, bracket, rung) of the first rung of every bracket."""
+        space = {key: values for key, values in self.parameters.items() if key != self.resource}
+        rng = random.Random(self.seed)
+        trials = []
+        for bracket in self.brackets():
+            for config in random_search(space, self.rung_size(bracket, 0), rng.randrange(2 ** 32)):
+                trials.append((self.trial_parameters(config, bracket, 0), config, bracket, 0))
+        return trials
+
+    def score(self, metrics: Optional[Dict[str, Any]]) -> Optional[float]:
+        """The objective from reported metrics, oriented so that higher is better."""
+        if not metrics or not isinstance(metrics.get(self.metric), (int, float)):
+            return None
+        value = float(metrics[self.metric])
+        return value if self.mode == "max" else -value
+
+    def on_job_finished(self, db, job_id: int, status: str, metrics: Optional[Dict[str, Any]]) -> List[int]:
+        """Record a trial's result and promote its rung if that was the last trial."""
+        trial = db.get_trial(job_id)
+        if trial is None:
+            return []
+        if status == STATUS_DONE:
+            db.set_trial_score(job_id, self.score(metrics))
+        return self._promote(db, trial['bracket'], trial['rung'])
+
+    def advance(self, db) -> List[int]:
+        """Promote every finished rung (e.g. after trials were quarantined)."""
+        job_ids = []
+        for bracket in self.brackets():
+            for rung in range(bracket):
+                job_ids += self._promote(db, bracket, rung)
+        return job_ids
+
+    def _promote(self, db, bracket: int, rung: int) -> List[int]:
+        if rung >= bracket:
+            return []  # top rung of the bracket
+        job_ids = db.promote_trials(
+            bracket, rung, self.rung_size(bracket, rung + 1),
+            lambda config: self.trial_parameters(config, bracket, rung + 1)
+        )
+        if job_ids:
+            logging.info(f"Hyperband bracket {bracket}: promoted {len(job_ids)} configurations to rung {rung + 1}")
+        return job_ids
+
+
+def load_sampler(db) -> Optional[Hyperband]:
+    """The adaptive sampler of the experiment in `db`, or None for a fixed set of jobs."""
+    stored = db.get_sampler()
+    if not stored or stored['spec'].get("type") != SAMPLER_HYPERBAND:
+        return None
+    return Hyperband.from_spec(stored['parameters'], stored['spec'])
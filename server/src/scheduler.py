@@ -0,0 +1,193 @@
+import heapq
+import json
+import logging
+import math
+import threading
+import time
+from collections import defaultdict
+from typing import Any, Dict, List, Optional
+
+# ---------------- Constants ----------------
+LEARN_WINDOW = 10000  # most recent DONE jobs replayed into the model at startup
+ACTIVE_WINDOW = 24 * 3600  # seconds a requester counts as part of the fleet after its last request
+SPEED_TOLERANCE = 0.1  # requesters within this fraction of each other count as equally fast
+CLASSES_PER_DOUBLING = 4  # cost classes per factor of two in estimated job cost
+FIRST_REPRICE = 16  # completions before queued jobs are first re-priced; then at every doubling
+
+
+class SpeedModel:
+    """Online estimates of requester speed and job cost, learned from DONE jobs.
+
+    A job's cost is exp(G + sum of its parameter-value effects), in work
+    units: G is the mean log cost of all finished jobs and the effect of a
+    parameter value is the mean log cost of finished jobs with that value,
+    minus G. A requester's speed is the estimated work of the jobs it
+    finished divided by the time they took. Observed run times are scaled
+    by the requester's speed before they update the cost model, so slow and
+    fast machines train the same model.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._log_total = 0.0
+        self._count = 0
+        self._effects: Dict[tuple, List[float]] = defaultdict(lambda: [0, 0.0])  # (param, value) -> [count, sum log cost]
+        self._work: Dict[str, float] = defaultdict(float)
+        self._time: Dict[str, float] = defaultdict(float)
+        self._last_seen: Dict[str, float] = {}
+        self._next_reprice = FIRST_REPRICE
+        # Bumped whenever queued jobs should be re-priced with the current model
+        self.version = 0
+
+    def load(self, db):
+        """Replay the most recent DONE jobs of `db`."""
+        jobs = db.get_recent_done_jobs(LEARN_WINDOW)
+        for job in reversed(jobs):
+            self.observe(job['requested_by'], job['parameters'], job['required_time'],
+                         job['completion_timestamp'])
+        with self.lock:
+            self.version += 1
+        logging.info(f"Speed model learned from {len(jobs)} completed jobs, "
+                     f"{len(self._work)} requesters")
+
+    @staticmethod
+    def _keys(parameters: Dict[str, Any]) -> List[tuple]:
+        return [(param, json.dumps(value, sort_keys=True)) for param, value in parameters.items()]
+
+    def _log_cost(self, parameters: Dict[str, Any]) -> float:
+        if self._count == 0:
+            return 0.0
+        mean = self._log_total / self._count
+        log_cost = mean
+        for key in self._keys(parameters):
+            count, total = self._effects.get(key, (0, 0.0))
+            if count:
+                log_cost += total / count - mean
+        return log_cost
+
+    def _speed(self, requested_by: str) -> float:
+        if self._time.get(requested_by):
+            return self._work[requested_by] / self._time[requested_by]
+        known = sorted(self._work[r] / self._time[r] for r in self._time if self._time[r])
+        return known[len(known) // 2] if known else 1.0
+
+    def cost(self, parameters: Dict[str, Any]) -> float:
+        """Estimated work of a job with `parameters`."""
+        with self.lock:
+            return math.exp(self._log_cost(parameters))
+
+    def cost_class(self, parameters: Dict[str, Any]) -> int:
+        """Logarithmic cost class of a job (CLASSES_PER_DOUBLING classes per doubling)."""
+        with self.lock:
+            return round(self._log_cost(parameters) / math.log(2) * CLASSES_PER_DOUBLING)
+
+    def speed(self, requested_by: str) -> float:
+        """Work per second of a requester (the median known speed for a new one)."""
+        with self.lock:
+            return self._speed(requested_by)
+
+    def expected_duration(self, requested_by: str, parameters: Dict[str, Any]) -> Optional[float]:
+        """Estimated seconds `requested_by` needs for a job, or None before any job finished."""
+        with self.lock:
+            if self._count == 0:
+                return None
+            return math.exp(self._log_cost(parameters)) / self._speed(requested_by)
+
+    def observe(self, requested_by: str, parameters: Dict[str, Any], required_time: float,
+                timestamp: float = None):
+        """Learn from a job that `requested_by` finished in `required_time` seconds."""
+        if not requested_by or not required_time or required_time <= 0:
+            return
+        with self.lock:
+            self._last_seen[requested_by] = timestamp or time.time()
+            # Work estimate before this job, so a job never explains itself
+            work = math.exp(self._log_cost(parameters))
+            log_cost = math.log(required_time * self._speed(requested_by))
+            self._work[requested_by] += work
+            self._time[requested_by] += required_time
+
+            self._log_total += log_cost
+            self._count += 1
+            for key in self._keys(parameters):
+                effect = self._effects[key]
+                effect[0] += 1
+                effect[1] += log_cost
+            if self._count >= self._next_reprice:
+                self._next_reprice *= 2
+                self.version += 1
+
+    def note_request(self, requested_by: str, timestamp: float = None):
+        """Record that a requester is active."""
+        with self.lock:
+            self._last_seen[requested_by] = timestamp or time.time()
+
+    def share(self, requested_by: str, timestamp: float = None) -> float:
+        """Fraction of the active fleet's speed that is faster than `requested_by`.
+
+        The faster machines are expected to work off that fraction of the
+        queue from its most expensive end, so this requester is served from
+        just after it: 0 (the largest jobs) for the fastest machines, close
+        to 1 (the smallest jobs) for the slowest.
+        """
+        now = timestamp or time.time()
+        with self.lock:
+            speeds = [self._speed(r) for r, seen in self._last_seen.items() if now - seen <= ACTIVE_WINDOW]
+            mine = self._speed(requested_by)
+        total = sum(speeds)
+        if not total:
+            return 0.0
+        return sum(s for s in speeds if s > mine * (1 + SPEED_TOLERANCE)) / total
+
+
+class CostBuckets:
+    """Claimable job ids grouped by cost class, lowest id first within a class."""
+
+    def __init__(self):
+        self._class_of: Dict[int, int] = {}
+        self._heaps: Dict[int, List[int]] = defaultdict(list)
+        self._counts: Dict[int, int] = defaultdict(int)
+
+    def __len__(self):
+        return len(self._class_of)
+
+    def __contains__(self, job_id: int):
+        return job_id in self._class_of
+
+    def add(self, job_id: int, cost_class: int):
+        """Add a job, or move it to another class."""
+        current = self._class_of.get(job_id)
+        if current == cost_class:
+            return
+        if current is not None:
+            self._counts[current] -= 1  # old heap entry is skipped lazily
+        self._class_of[job_id] = cost_class
+        self._counts[cost_class] += 1
+        heapq.heappush(self._heaps[cost_class], job_id)
+
+    def discard(self, job_id: int):
+        cost_class = self._class_of.pop(job_id, None)
+        if cost_class is not None:
+            self._counts[cost_class] -= 1
+
+    def take(self, share: float) -> Optional[int]:
+        """Remove and return a job from just past `share` of the queued work, most expensive first."""
+        classes = sorted((c for c, n in self._counts.items() if n > 0), reverse=True)
+        if not classes:
+            return None
+        work = {c: self._counts[c] * 2 ** (c / CLASSES_PER_DOUBLING) for c in classes}
+        target = share * sum(work.values())
+        chosen, seen = classes[-1], 0.0
+        for cost_class in classes:
+            seen += work[cost_class]
+            if seen > target:
+                chosen = cost_class
+                break
+
+        heap = self._heaps[chosen]
+        while heap:
+            job_id = heapq.heappop(heap)
+            if self._class_of.get(job_id) == chosen:
+                del self._class_of[job_id]
+                self._counts[chosen] -= 1
+                return job_id
+        return None
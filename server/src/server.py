@@ -1,12 +1,24 @@
 import argparse
+import atexit
+import io
 import json
 import logging
+import math
 import os
+import signal
+import sys
+import threading
 import time
+import zlib
 from datetime import datetime
 from pathlib import Path
 
 from database import JobDatabase
+from heartbeat_buffer import HeartbeatBuffer
+from job_queue import PendingJobQueue
+from request_stats import RequestStatsRecorder
+from samplers import load_sampler
+from scheduler import SpeedModel
 from flask import Flask, jsonify, request
 
 
@@ -95,7 +107,35 @@ def _get_ngrok_token() -> str | None:
     return _find_ngrok_token_from_yml()
 
 
+MAX_REQUEST_BODY = 16 * 1024 * 1024  # bytes a gzipped request body may inflate to
+
+
+class GzipRequestMiddleware:
+    """Inflate request bodies sent with Content-Encoding: gzip before Flask reads them."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    def __call__(self, environ, start_response):
+        if environ.get("HTTP_CONTENT_ENCODING", "").lower() == "gzip":
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+            inflater = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                body = inflater.decompress(environ["wsgi.input"].read(length), MAX_REQUEST_BODY)
+            except zlib.error:
+                start_response("400 Bad Request", [("Content-Type", "application/json")])
+                return [b'{"error": "Invalid gzip body"}']
+            if inflater.unconsumed_tail:
+                start_response("413 Request Entity Too Large", [("Content-Type", "application/json")])
+                return [b'{"error": "Request body too large"}']
+            environ["wsgi.input"] = io.BytesIO(body)
+            environ["CONTENT_LENGTH"] = str(len(body))
+            del environ["HTTP_CONTENT_ENCODING"]
+        return self.wsgi_app(environ, start_response)
+
+
 app = Flask(__name__)
+app.wsgi_app = GzipRequestMiddleware(app.wsgi_app)
 
 BASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
 DB_FILE = ""
@@ -117,12 +157,47 @@ def setup_log(args):
 
 # Initialize database connection
 db = None
+# In-memory pending queue; None when claims go straight to the database
+job_queue = None
+# Buffered /ping and /ping_batch heartbeats, flushed to the database in batches
+heartbeats = None
+# Request counters and latency histograms, flushed to api_stats periodically
+request_stats = RequestStatsRecorder()
+# Learned requester speeds and job costs for speed-aware claims; None for lowest-id-first
+speed_model = None
+# Whether idle requesters get speculative copies of the slowest running jobs
+speculative_execution = False
+# Adaptive sampler (Hyperband) that creates jobs from reported metrics; None for a fixed set of jobs
+sampler = None
 
 STATUS_PENDING = "PENDING"
 STATUS_SERVED = "SERVED"
 STATUS_DONE = "DONE"
 STATUS_ABORTED = "ABORTED"
 
+MAX_JOBS_PER_REQUEST = 64  # upper bound on `count` for a single /request_job call
+MAX_PING_BATCH = 1024  # upper bound on `job_ids` for a single /ping_batch call
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 1000  # upper bound on `k` for a single /top_k call
+RETRY_AFTER = 30  # seconds a client waits before asking again after a 503
+MAX_WAIT = 60  # upper bound on `wait` for a single /request_job call
+DB_POLL_INTERVAL = 1.0  # seconds between claim attempts of a waiting request without the in-memory queue
+SERVED_SCAN_INTERVAL = 1.0  # seconds the SERVED jobs scanned for speculative copies are reused
+
+WSGI_SERVERS = ("waitress", "flask")
+DEFAULT_THREADS = 32
+# Open connections waitress serves at once; the rest wait in the listen backlog.
+# Runners keep their connection open, so this bounds the runners served at once.
+CONNECTION_LIMIT = 8192
+LISTEN_BACKLOG = 4096
+
+# Requests parked in a long poll each hold a request thread, so only this many may wait at once
+long_poll_slots = threading.BoundedSemaphore(DEFAULT_THREADS // 2)
+
+# (scan time, SERVED jobs) shared by the idle requesters polling at the end of a run
+_served_cache = (0.0, [])
+_served_cache_lock = threading.Lock()
+
 
 def format_timestamp(timestamp):
     """Convert timestamp to human-readable format."""
@@ -136,65 +211,234 @@ def format_timestamp(timestamp):
     return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S')
 
 
+def claim_jobs(requested_by, count, wait=0):
+    """Lease jobs from the in-memory queue if enabled, otherwise from the database.
+
+    With `wait` > 0, wait up to that many seconds for a job if none is claimable.
+    """
+    if job_queue is not None:
+        return job_queue.claim(requested_by, count, wait)
+    deadline = time.time() + wait
+    while True:
+        jobs = db.request_jobs(requested_by, count)
+        remaining = deadline - time.time()
+        if jobs or remaining <= 0:
+            return jobs
+        time.sleep(min(DB_POLL_INTERVAL, remaining))
+
+
+def ensure_claim_persisted(job_id):
+    """Flush buffered claims if `job_id` was claimed but not yet written."""
+    if job_queue is not None and job_queue.is_unflushed(job_id):
+        job_queue.flush()
+
+
+def pick_speculative_job(requested_by):
+    """Pick the SERVED job expected to finish last, if `requested_by` would finish a copy sooner.
+
+    A job whose runner reports progress is expected to keep its pace so
+    far; otherwise a job that has overrun its estimate is expected to run
+    as long again as it already has. Returns None while the speed model
+    has nothing to go on. The SERVED jobs are read from the database at
+    most once per SERVED_SCAN_INTERVAL, however many requesters poll.
+    """
+    global _served_cache
+    now = time.time()
+    with _served_cache_lock:
+        scanned_at, served = _served_cache
+        if now - scanned_at >= SERVED_SCAN_INTERVAL:
+            if job_queue is not None:
+                job_queue.flush()
+            served = db.get_served_jobs()
+            _served_cache = (now, served)
+    slowest, slowest_finish = None, None
+    for job in served:
+        if job['copy_requested_by'] or job['requested_by'] == requested_by:
+            continue
+        duration = speed_model.expected_duration(job['requested_by'], job['parameters'])
+        if duration is None:
+            return None
+        elapsed = now - job['request_timestamp']
+        if job['progress']:
+            finish = job['request_timestamp'] + elapsed / job['progress']
+        else:
+            finish = job['request_timestamp'] + max(duration, 2 * elapsed)
+        if slowest_finish is None or finish > slowest_finish:
+            slowest, slowest_finish = job, finish
+    if slowest is None:
+        return None
+    if now + speed_model.expected_duration(requested_by, slowest['parameters']) >= slowest_finish:
+        return None
+    return slowest
+
+
 @app.route("/request_job", methods=["POST"])
+@request_stats.track("Job Request", "POST")
 def request_job():
-    """Assign a PENDING job to a requester and mark it as SERVED."""
-    # Track API request
-    db.track_api_request("Job Request", "POST")
-
+    """Assign PENDING jobs to a requester and mark them as SERVED.
+
+    An optional integer `count` leases up to that many jobs in one
+    transaction; the response then carries a `jobs` list. With speculative
+    execution on and nothing PENDING, the requester may instead get a copy
+    of a running job, marked `speculative`.
+
+    An optional `wait` (seconds, at most MAX_WAIT) holds the request open
+    until a job becomes PENDING. The 404 reply then carries `unfinished`,
+    the number of jobs that may still come back (PENDING in backoff,
+    SERVED or ABORTED); a runner can stop asking once it is 0.
+    """
     data = request.json or {}
     requested_by = data.get("requested_by")
+    count = data.get("count", 1)
+    wait = data.get("wait", 0)
 
     if not requested_by:
         logging.warning(
             "Job request failed: No requester identification provided.")
         return jsonify({"error": "Requester identification is required"}), 400
 
-    job = db.request_job(requested_by)
-    if not job:
+    if not isinstance(count, int) or isinstance(count, bool) or count < 1:
+        logging.warning(f"Job request failed: invalid count={count}")
+        return jsonify({"error": "count must be a positive integer"}), 400
+    count = min(count, MAX_JOBS_PER_REQUEST)
+
+    if not isinstance(wait, (int, float)) or isinstance(wait, bool) or wait < 0:
+        logging.warning(f"Job request failed: invalid wait={wait}")
+        return jsonify({"error": "wait must be a non-negative number"}), 400
+    wait = min(wait, MAX_WAIT)
+
+    jobs = claim_jobs(requested_by, count)
+    if not jobs and speculative_execution:
+        job = pick_speculative_job(requested_by)
+        if job and db.add_job_copy(job['id'], requested_by):
+            job['copy_requested_by'] = requested_by  # not a candidate again until the next scan
+            logging.info(
+                f"Speculative copy of job {job['id']} (running on {job['requested_by']}) "
+                f"assigned to {requested_by}.")
+            leased = {"job_id": job['id'], "parameters": job['parameters'],
+                      "status": STATUS_SERVED, "speculative": True}
+            if "count" in data:
+                return jsonify({"jobs": [leased]}), 200
+            return jsonify(leased), 200
+    if not jobs and wait:
+        if not long_poll_slots.acquire(blocking=False):
+            logging.info(f"No free long-poll slot for {requested_by}.")
+            return jsonify({"error": "Too many waiting requests", "retry_after": RETRY_AFTER}), 503
+        try:
+            jobs = claim_jobs(requested_by, count, wait)
+        finally:
+            long_poll_slots.release()
+    if not jobs:
+        if not wait and sampler is not None and db.has_open_trials():
+            logging.info("No PENDING jobs available yet; waiting for running trials.")
+            return jsonify({"error": "No available jobs yet", "retry_after": RETRY_AFTER}), 503
+        counts = db.get_job_counts_by_status(max_age=1)
+        unfinished = counts[STATUS_PENDING] + counts[STATUS_SERVED] + counts[STATUS_ABORTED]
         logging.info("No PENDING jobs available.")
-        return jsonify({"error": "No available jobs"}), 404
+        return jsonify({"error": "No available jobs", "unfinished": unfinished}), 404
 
     logging.info(
-        f"Job {job['id']} assigned to {requested_by} and marked as SERVED.")
-    return jsonify({"job_id": job['id'], "parameters": job['parameters'], "status": STATUS_SERVED}), 200
+        f"Jobs {[job['id'] for job in jobs]} assigned to {requested_by} and marked as SERVED.")
+    leased = [{"job_id": job['id'], "parameters": job['parameters'], "status": STATUS_SERVED}
+              for job in jobs]
+    if "count" in data:
+        return jsonify({"jobs": leased}), 200
+    return jsonify(leased[0]), 200
 
 
 @app.route("/update_job_status", methods=["POST"])
+@request_stats.track("Job Status Update", "POST")
 def update_job_status():
-    """Update job status as DONE or ABORTED."""
-    # Track API request
-    db.track_api_request("Job Status Update", "POST")
+    """Update job status as DONE or ABORTED.
 
+    An optional `metrics` object ({name: number}) carries the results of a
+    DONE job; an adaptive sampler ranks trials by it. `requested_by` tells
+    the two runs of a speculatively copied job apart.
+    """
     data = request.json or {}
     job_id = data.get("job_id")
     status = data.get("status")
     message = data.get("message", "")
+    metrics = data.get("metrics")
+    requested_by = data.get("requested_by")
 
     if not isinstance(job_id, int) or status not in [STATUS_DONE, STATUS_ABORTED]:
         logging.warning(
             f"Invalid job status update request: job_id={job_id}, status={status}")
         return jsonify({"error": "Invalid job_id or status"}), 400
 
-    success = db.update_job_status(job_id, status, message)
+    if metrics is not None and not isinstance(metrics, dict):
+        logging.warning(f"Invalid metrics for job {job_id}: {metrics}")
+        return jsonify({"error": "metrics must be an object"}), 400
+    if metrics:
+        # job_results is typed: keep finite numeric metrics only (JSON parsers accept NaN and Infinity)
+        numeric = {name: float(value) for name, value in metrics.items()
+                   if isinstance(value, (int, float)) and not isinstance(value, bool)
+                   and math.isfinite(value)}
+        if len(numeric) < len(metrics):
+            logging.warning(
+                f"Job {job_id}: ignoring non-numeric or non-finite metrics {sorted(set(metrics) - set(numeric))}")
+        metrics = numeric
+
+    ensure_claim_persisted(job_id)
+    success = db.update_job_status(job_id, status, message, metrics, requested_by)
     if not success:
         return jsonify({"error": "Job not found or not in SERVED status"}), 404
 
+    if status == STATUS_ABORTED and db.get_job_status(job_id) == STATUS_SERVED:
+        logging.info(f"Copy of job {job_id} on {requested_by} failed; the other copy keeps running.")
+        return jsonify({"message": f"Copy of job {job_id} dropped", "job_id": job_id}), 200
+
     if status == STATUS_DONE:
         logging.info(f"Job {job_id} marked as DONE.")
     else:
         logging.info(
             f"Job {job_id} ABORTED. Reason: {message or 'No reason provided'}.")
 
+    if speed_model is not None and status == STATUS_DONE:
+        job = db.get_done_job(job_id)
+        if job:
+            speed_model.observe(job['requested_by'], job['parameters'], job['required_time'],
+                                job['completion_timestamp'])
+
+    if sampler is not None:
+        for new_job_id in sampler.on_job_finished(db, job_id, status, metrics):
+            if job_queue is not None:
+                job_queue.push(new_job_id)
+
     return jsonify({"message": f"Job {job_id} updated to {status}", "job_id": job_id}), 200
 
 
+@app.route("/top_k", methods=["GET"])
+@request_stats.track("Top K Results", "GET")
+def top_k():
+    """Best DONE jobs by a reported metric: /top_k?metric=accuracy&k=10&mode=max."""
+    metric = request.args.get("metric")
+    mode = request.args.get("mode", "max")
+    try:
+        k = int(request.args.get("k", DEFAULT_TOP_K))
+    except ValueError:
+        return jsonify({"error": "k must be an integer"}), 400
+
+    if not metric:
+        return jsonify({"error": "metric is required", "metrics": db.get_result_metrics()}), 400
+    if mode not in ("max", "min"):
+        return jsonify({"error": "mode must be 'max' or 'min'"}), 400
+    if k < 1:
+        return jsonify({"error": "k must be a positive integer"}), 400
+
+    results = db.get_top_results(metric, min(k, MAX_TOP_K), mode)
+    return jsonify({"metric": metric, "mode": mode, "results": results}), 200
+
+
 @app.route("/ping", methods=["POST"])
+@request_stats.track("Job Ping", "POST")
 def ping_job():
-    """Update last_ping_timestamp for a SERVED job."""
-    # Track API request
-    db.track_api_request("Job Ping", "POST")
+    """Record a heartbeat for a SERVED job; it reaches the database in the next batch.
 
+    A job that is already DONE gets 410 with `cancel`: another copy of it
+    finished first and this one can stop.
+    """
     data = request.json or {}
     # Accept both keys for compatibility
     job_id = data.get("job_id", data.get("id"))
@@ -203,16 +447,137 @@ def ping_job():
         logging.warning(f"Invalid ping request: job_id={job_id}")
         return jsonify({"error": "Invalid job_id"}), 400
 
-    success = db.ping_job(job_id)
-    if not success:
+    ensure_claim_persisted(job_id)
+    job_status = db.get_job_status(job_id)
+    if job_status == STATUS_DONE:
+        return jsonify({"error": f"Job {job_id} is already DONE", "cancel": True}), 410
+    if job_status != STATUS_SERVED:
         return jsonify({"error": "Job not found or not in SERVED state"}), 404
 
     now = round(time.time())
+    heartbeats.record(job_id, now)
     logging.info(
-        f"Ping received for job {job_id}. Updated last_ping_timestamp.")
+        f"Ping received for job {job_id}. Heartbeat buffered.")
     return jsonify({"message": f"Ping received for job {job_id}", "timestamp": now}), 200
 
 
+@app.route("/ping_batch", methods=["POST"])
+@request_stats.track("Batch Ping", "POST")
+def ping_batch():
+    """Record heartbeats for all jobs of one runner and tell it what to do with each.
+
+    Takes `requested_by`, `job_ids` and an optional `progress` object
+    ({job_id: fraction done}). `directives` maps every job id to continue
+    (lease renewed), extend (the lease had lapsed and is granted to this
+    runner again) or cancel (the job is DONE or held by another runner;
+    stop it).
+    """
+    data = request.json or {}
+    requested_by = data.get("requested_by")
+    job_ids = data.get("job_ids")
+    progress = data.get("progress") or {}
+
+    if not requested_by:
+        logging.warning("Batch ping failed: No requester identification provided.")
+        return jsonify({"error": "Requester identification is required"}), 400
+    if (not isinstance(job_ids, list) or len(job_ids) > MAX_PING_BATCH
+            or not all(isinstance(job_id, int) and not isinstance(job_id, bool) for job_id in job_ids)):
+        logging.warning(f"Invalid batch ping from {requested_by}: job_ids={job_ids}")
+        return jsonify({"error": f"job_ids must be a list of at most {MAX_PING_BATCH} integers"}), 400
+    if not isinstance(progress, dict):
+        return jsonify({"error": "progress must be an object"}), 400
+    fractions = {}
+    for job_id, fraction in progress.items():
+        if isinstance(fraction, (int, float)) and not isinstance(fraction, bool) and str(job_id).isdigit():
+            fractions[int(job_id)] = min(max(float(fraction), 0.0), 1.0)
+
+    if job_queue is not None and any(job_queue.is_unflushed(job_id) for job_id in job_ids):
+        job_queue.flush()
+    states = db.get_lease_states(job_ids)
+    now = round(time.time())
+    directives, lapsed = {}, []
+    if job_queue is not None:
+        # Claims answered while their write was failing and then refused by the database
+        for job_id in job_queue.pop_conflicts(job_ids, requested_by):
+            directives[job_id] = "cancel"
+    for job_id in job_ids:
+        state = states.get(job_id)
+        if job_id in directives:
+            continue
+        if state is None:
+            directives[job_id] = "cancel"
+        elif state['status'] == STATUS_SERVED and requested_by in (state['requested_by'], state['copy_requested_by']):
+            heartbeats.record(job_id, now, fractions.get(job_id))
+            directives[job_id] = "continue"
+        elif state['status'] == STATUS_PENDING and state['not_before'] <= now:
+            lapsed.append(job_id)
+        else:
+            directives[job_id] = "cancel"
+
+    if lapsed:
+        # Take the jobs out of the in-memory queue first so nobody else claims them meanwhile;
+        # jobs the queue has not seen yet are dropped from it by its next sync
+        queued = []
+        if job_queue is not None:
+            queued = job_queue.take(lapsed)
+            lapsed = [job_id for job_id in lapsed if not job_queue.is_unflushed(job_id)]
+        renewed = set(db.renew_leases(lapsed, requested_by))
+        for job_id in states:
+            if job_id not in directives:
+                directives[job_id] = "extend" if job_id in renewed else "cancel"
+        if job_queue is not None:
+            for job_id in set(queued) - renewed:
+                job_queue.push(job_id, states[job_id]['not_before'])
+        for job_id in renewed:
+            heartbeats.record(job_id, now, fractions.get(job_id))
+        if renewed:
+            logging.info(f"Leases of jobs {sorted(renewed)} renewed for {requested_by}.")
+
+    cancelled = [job_id for job_id, directive in directives.items() if directive == "cancel"]
+    if cancelled:
+        logging.info(f"Batch ping from {requested_by}: cancelling jobs {cancelled}.")
+    return jsonify({"directives": {str(job_id): directive for job_id, directive in directives.items()},
+                    "timestamp": now}), 200
+
+
+def raise_open_file_limit(wanted):
+    """Raise the soft limit on open files to `wanted` where the OS allows it (each connection holds one)."""
+    try:
+        import resource
+    except ImportError:
+        return  # Windows has no such limit on sockets
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if hard != resource.RLIM_INFINITY:
+        wanted = min(wanted, hard)
+    if soft != resource.RLIM_INFINITY and soft < wanted:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (wanted, hard))
+        logging.info(f"Raised the open file limit from {soft} to {wanted}.")
+
+
+def serve(args):
+    """Serve the app with waitress if requested and installed, else with Flask's development server.
+
+    Claims, heartbeats and learned speeds live in this process, so waitress
+    runs one process with a pool of request threads rather than forked workers.
+    """
+    if args.wsgiServer == "waitress":
+        try:
+            from waitress import serve as waitress_serve
+        except ImportError:
+            logging.warning("waitress is not installed (pip install waitress); "
+                            "falling back to Flask's development server.")
+        else:
+            logging.info(f"Serving with waitress, {args.threads} threads.")
+            raise_open_file_limit(CONNECTION_LIMIT + 256)
+            # Queued requests are expected under load; don't log each one
+            logging.getLogger("waitress.queue").setLevel(logging.ERROR)
+            waitress_serve(app, host=args.host, port=args.port, threads=args.threads,
+                           connection_limit=CONNECTION_LIMIT, backlog=LISTEN_BACKLOG,
+                           channel_timeout=120, asyncore_use_poll=True, ident="job-distributor")
+            return
+    app.run(host=args.host, port=args.port, threaded=True)
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Start the Flask server")
     parser.add_argument("--host", default="0.0.0.0",
@@ -225,6 +590,17 @@ if __name__ == "__main__":
                         help="Port number to listen on")
     parser.add_argument("--expId", type=str, default="sim1",
                         help="Give an unique name")
+    parser.add_argument("--disableMemoryQueue", action="store_true",
+                        help="Claim every job straight from the database instead of the in-memory pending queue")
+    parser.add_argument("--speedAwareScheduling", action="store_true",
+                        help="Hand the most expensive jobs to the fastest requesters (needs the in-memory queue)")
+    parser.add_argument("--speculativeExecution", action="store_true",
+                        help="Give idle requesters a copy of the running job expected to finish last")
+    parser.add_argument("--wsgiServer", choices=WSGI_SERVERS, default="waitress",
+                        help="waitress for production (flask if waitress is not installed), "
+                             "flask for Flask's development server")
+    parser.add_argument("--threads", type=int, default=DEFAULT_THREADS,
+                        help="Request threads of the waitress server")
     args = parser.parse_args()
     createExpBaseDirectory(args)
     setup_log(args)
@@ -233,6 +609,32 @@ if __name__ == "__main__":
 
     # Initialize database connection
     db = JobDatabase(DB_FILE)
+    sampler = load_sampler(db)
+    long_poll_slots = threading.BoundedSemaphore(max(1, args.threads // 2))
+
+    request_stats.start(db)
+    atexit.register(request_stats.stop)
+
+    heartbeats = HeartbeatBuffer(db)
+    heartbeats.start()
+    atexit.register(heartbeats.stop)
+
+    speed_aware = args.speedAwareScheduling
+    if speed_aware and args.disableMemoryQueue:
+        logging.warning("Speed-aware scheduling needs the in-memory queue; handing out jobs by id.")
+        speed_aware = False
+    speculative_execution = args.speculativeExecution
+    if speed_aware or speculative_execution:
+        speed_model = SpeedModel()
+        speed_model.load(db)
+
+    if not args.disableMemoryQueue:
+        job_queue = PendingJobQueue(db, speed_model=speed_model if speed_aware else None)
+        job_queue.start()
+        atexit.register(job_queue.stop)
+
+    # Write buffered claims, heartbeats and request counters before exiting (stop.py sends SIGTERM)
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
 
     # Start ngrok only if requested and authtoken is set
     if args.enableNgrok:
@@ -252,6 +654,6 @@ if __name__ == "__main__":
             except Exception as e:
                 logging.error(f"Failed to start ngrok: {e}")
 
-    app.run(host=args.host, port=args.port)
+    serve(args)
 
 # python server.py --expId=sim1 --jobDB=jobs.db --host=0.0.0.0 --port=5000
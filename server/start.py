@@ -70,22 +70,35 @@ def main():
 
     # Build commands from config
     params_arg = quote_json_for_shell(config["parameters"])
+    virtual_grid_flag = "--virtualGrid" if str(config.get(
+        "virtual_grid", False)).lower() in ("true", "1", "yes", "on") else ""
+    sampler_arg = quote_json_for_shell(config.get("sampler", {"type": "grid"}))
 
     create_cmd = (
         f"{sys.executable} src/create_job_db.py "
         f"--expId={config['expId']} "
         f"--jobDB={config['jobDB']} "
+        f"{virtual_grid_flag} "
+        f"--sampler={sampler_arg} "
         f"--parameters={params_arg}"
     )
 
     enable_flag = "--enableNgrok" if str(config.get(
         "enable_ngork", False)).lower() in ("true", "1", "yes", "on") else ""
+    speed_aware_flag = "--speedAwareScheduling" if str(config.get(
+        "speed_aware_scheduling", False)).lower() in ("true", "1", "yes", "on") else ""
+    speculative_flag = "--speculativeExecution" if str(config.get(
+        "speculative_execution", False)).lower() in ("true", "1", "yes", "on") else ""
 
     server_cmd = (
         f"{sys.executable} src/server.py "
         f"--expId={config['expId']} "
         f"--jobDB={config['jobDB']} "
         f"{enable_flag} "
+        f"{speed_aware_flag} "
+        f"{speculative_flag} "
+        f"--wsgiServer={config.get('wsgi_server', 'waitress')} "
+        f"--threads={config.get('server_threads', 32)} "
         f"--host={config['host']} "
         f"--port={config['server_port']}"
     )
@@ -104,6 +117,8 @@ def main():
         f"--expId={config['expId']} "
         f"--jobDB={config['jobDB']} "
         f"--abortedJobResetTimeout={config['abortedJobResetTimeout']} "
+        f"--maxRetries={config.get('maxRetries', 3)} "
+        f"--retryBackoff={config.get('retryBackoff', 60)} "
         f"--idleTimeout={config['idleTimeout']}"
     )
 
@@ -0,0 +1,97 @@
+"""Stress check for JobDatabase.request_jobs: every job is handed out exactly once.
+
+Builds a throwaway job database, then lets --processes processes with --threads
+threads each claim jobs until none are left, all against the same SQLite file.
+Fails (exit status 1) if any job was claimed twice or never claimed.
+
+    python stress_claims.py --processes=5 --threads=40 --jobs=3000
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "src"))
+
+from database import JobDatabase  # noqa: E402
+
+
+def claim_all(db, requested_by, count, claimed):
+    """Claim jobs for `requested_by` until the database has no PENDING job left."""
+    while True:
+        jobs = db.request_jobs(requested_by, count)
+        if not jobs:
+            return
+        claimed.extend(job['id'] for job in jobs)
+
+
+def run_process(index, db_path, threads, count, queue):
+    """Run `threads` claimers against one JobDatabase and report the ids they got."""
+    db = JobDatabase(db_path, pool_size=threads)
+    claimed, errors = [], []
+
+    def claimer(i):
+        try:
+            claim_all(db, f"stress-{index}-{i}", count, claimed)
+        except Exception as e:
+            errors.append(f"{type(e).__name__}: {e}")
+
+    workers = [threading.Thread(target=claimer, args=(i,)) for i in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    queue.put((claimed, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that concurrent claims never hand out a job twice")
+    parser.add_argument("--processes", type=int, default=5, help="Claiming processes")
+    parser.add_argument("--threads", type=int, default=40, help="Claiming threads per process")
+    parser.add_argument("--jobs", type=int, default=3000, help="Jobs in the test database")
+    parser.add_argument("--count", type=int, default=1, help="Jobs leased per request_jobs call")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "jobs.db")
+        JobDatabase(db_path).create_jobs(json.dumps({"i": i}) for i in range(args.jobs))
+
+        queue = multiprocessing.Queue()
+        workers = [multiprocessing.Process(target=run_process,
+                                           args=(i, db_path, args.threads, args.count, queue))
+                   for i in range(args.processes)]
+        started = time.time()
+        for worker in workers:
+            worker.start()
+        results = [queue.get() for _ in workers]
+        for worker in workers:
+            worker.join()
+        elapsed = time.time() - started
+
+        expected = set(JobDatabase(db_path).get_job_parameters(list(range(args.jobs))))
+
+    claimed = [job_id for ids, _ in results for job_id in ids]
+    errors = [error for _, errs in results for error in errs]
+    duplicates = sorted(job_id for job_id, n in Counter(claimed).items() if n > 1)
+    missing = sorted(expected - set(claimed))
+
+    print(f"{args.processes} process(es) x {args.threads} threads claimed "
+          f"{len(claimed)} jobs ({len(set(claimed))} distinct of {len(expected)}) in {elapsed:.1f} s")
+    for error in errors[:10]:
+        print(f"claimer error: {error}")
+    if duplicates:
+        print(f"FAIL: {len(duplicates)} jobs handed out more than once, e.g. {duplicates[:10]}")
+    if missing:
+        print(f"FAIL: {len(missing)} jobs never handed out, e.g. {missing[:10]}")
+    if errors or duplicates or missing:
+        sys.exit(1)
+    print("OK: every job was handed out exactly once")
+
+
+if __name__ == "__main__":
+    main()